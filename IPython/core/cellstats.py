@@ -0,0 +1,153 @@
+# encoding: utf-8
+"""Record the resources used by each cell.
+
+The recorder hooks into the ``pre_run_cell`` and ``post_run_cell`` events, and
+stores its measurements in the history database, next to the input of the
+cell (see :meth:`IPython.core.history.HistoryManager.store_stats`).
+"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import sys
+import time
+import tracemalloc
+
+from traitlets.config.configurable import Configurable
+from traitlets import Bool, Instance, Int, observe
+
+try:
+    import resource
+except ImportError:
+    # Windows: the peak RSS is not recorded
+    resource = None
+
+# Allocations made by IPython itself while running a cell are left out.
+_ipython_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _peak_rss():
+    """Return the peak resident set size of the process in bytes, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class CellStatsRecorder(Configurable):
+    """Measure the wall time, CPU time and memory used by each cell run with
+    ``store_history=True``, and store them in the history database.
+
+    The increase in peak RSS only shows cells which used more memory than any
+    cell before them. Enable :attr:`trace_malloc` for the peak of the memory
+    allocated by each cell, at the price of slower execution.
+    """
+
+    enabled = Bool(False,
+        help="""Record the wall time, CPU time and peak RSS increase of each
+        cell in the history database. Use the %cellstats magic to see them.
+        """
+    ).tag(config=True)
+
+    trace_malloc = Bool(False,
+        help="""Also record the peak of memory allocated by each cell, and
+        where most of it was allocated, with tracemalloc. This slows down the
+        execution of code.
+        """
+    ).tag(config=True)
+
+    top_allocations = Int(3,
+        help="""Number of source lines allocating the most memory to record
+        for each cell, when trace_malloc is enabled.
+        """
+    ).tag(config=True)
+
+    shell = Instance('IPython.core.interactiveshell.InteractiveShellABC',
+                     allow_none=True)
+
+    def __init__(self, shell=None, **kwargs):
+        super(CellStatsRecorder, self).__init__(shell=shell, **kwargs)
+        self._start = None
+        self._started_tracemalloc = False
+        self._registered = False
+        self._update_registration()
+
+    @observe('enabled')
+    def _enabled_changed(self, change):
+        self._update_registration()
+
+    @observe('trace_malloc')
+    def _trace_malloc_changed(self, change):
+        if not change['new']:
+            self._stop_tracemalloc()
+
+    def _update_registration(self):
+        if self.shell is None or self.enabled == self._registered:
+            return
+        if self.enabled:
+            self.shell.events.register('pre_run_cell', self.pre_run_cell)
+            self.shell.events.register('post_run_cell', self.post_run_cell)
+        else:
+            self.shell.events.unregister('pre_run_cell', self.pre_run_cell)
+            self.shell.events.unregister('post_run_cell', self.post_run_cell)
+            self._stop_tracemalloc()
+            self._start = None
+        self._registered = self.enabled
+
+    def _stop_tracemalloc(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def pre_run_cell(self, info):
+        """Take the initial measurements, before a cell runs."""
+        if not info.store_history:
+            self._start = None
+            return
+        if self.trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            elif hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()
+        self._start = (tracemalloc.get_traced_memory()[0], _peak_rss(),
+                       time.process_time(), time.perf_counter())
+
+    def post_run_cell(self, result):
+        """Measure the resources used by the cell, and store them."""
+        if self._start is None or result is None or result.execution_count is None:
+            return
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        traced_start, rss_start, cpu_start, wall_start = self._start
+        self._start = None
+        stats = {
+            'wall': wall - wall_start,
+            'cpu': cpu - cpu_start,
+        }
+        if rss_start is not None:
+            stats['rss_delta'] = _peak_rss() - rss_start
+        if self.trace_malloc and tracemalloc.is_tracing():
+            stats['malloc_peak'] = max(
+                tracemalloc.get_traced_memory()[1] - traced_start, 0)
+            if self.top_allocations:
+                stats['top_allocations'] = self._top_allocations()
+        self.shell.history_manager.store_stats(result.execution_count, stats)
+
+    def _top_allocations(self):
+        """Describe the source lines holding the most allocated memory."""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            tracemalloc.Filter(False, os.path.join(_ipython_dir, '*')),
+        ))
+        lines = []
+        for stat in snapshot.statistics('lineno')[:self.top_allocations]:
+            frame = stat.traceback[0]
+            lines.append('%s:%s: %d B' % (frame.filename, frame.lineno,
+                                          stat.size))
+        return '\n'.join(lines)
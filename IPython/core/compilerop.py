@@ -34,7 +34,10 @@
 import hashlib
 import linecache
 import operator
-import time
+import re
+import types
+import weakref
+from collections import OrderedDict, namedtuple
 from contextlib import contextmanager
 
 #-----------------------------------------------------------------------------
@@ -47,6 +50,15 @@
                              (getattr(__future__, fname).compiler_flag
                               for fname in __future__.all_feature_names))
 
+# Weak references to the code objects compiled from each cached cell, by cell
+# name. Cells with live code are not evicted from linecache.
+_live_code = {}
+
+_cell_name_re = re.compile(r'<ipython-input-(\d+)-([0-9a-f]{12})>\Z')
+
+CodeCacheInfo = namedtuple('CodeCacheInfo', ['hits', 'misses', 'maxsize',
+                                             'currsize'])
+
 #-----------------------------------------------------------------------------
 # Local utilities
 #-----------------------------------------------------------------------------
@@ -62,6 +74,40 @@ def code_name(code, number=0):
     # even with truncated hashes, and the full one makes tracebacks too long
     return '<ipython-input-{0}-{1}>'.format(number, hash_digest[:12])
 
+def parse_cell_name(name):
+    """Return the number and the hash prefix from a name made by code_name(),
+    or None if name was not made by code_name()."""
+    match = _cell_name_re.match(name)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2)
+
+
+def _walk_code(code):
+    """Yield a code object and all the code objects it contains."""
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _walk_code(const)
+
+
+def _has_live_code(name):
+    refs = _live_code.get(name)
+    if refs is None:
+        return False
+    refs[:] = [ref for ref in refs if ref() is not None]
+    if not refs:
+        del _live_code[name]
+    return bool(refs)
+
+
+def _rename_code(code, filename):
+    """Return a copy of a code object, and of the code objects it contains,
+    with co_filename set to filename."""
+    consts = tuple(_rename_code(c, filename) if isinstance(c, types.CodeType)
+                   else c for c in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
 #-----------------------------------------------------------------------------
 # Classes and functions
 #-----------------------------------------------------------------------------
@@ -83,8 +129,11 @@ def __init__(self):
         # separate caches (one in each CachingCompiler instance), any call made
         # by Python itself to linecache.checkcache() would obliterate the
         # cached data from the other IPython instances.
-        if not hasattr(linecache, '_ipython_cache'):
-            linecache._ipython_cache = {}
+        if not isinstance(getattr(linecache, '_ipython_cache', None),
+                          OrderedDict):
+            # Least recently cached first
+            linecache._ipython_cache = OrderedDict(
+                getattr(linecache, '_ipython_cache', {}))
         if not hasattr(linecache, '_checkcache_ori'):
             linecache._checkcache_ori = linecache.checkcache
         # Now, we must monkeypatch the linecache directly so that parts of the
@@ -92,6 +141,32 @@ def __init__(self):
         # (otherwise we'd lose our tracebacks).
         linecache.checkcache = check_linecache_ipython
 
+        # Limits on the cells kept in linecache, 0 for no limit. The least
+        # recently run cells are evicted first, except those whose code is
+        # still alive (functions, tracebacks...).
+        self.linecache_max_entries = 0
+        self.linecache_max_bytes = 0
+
+        # Code objects compiled for recently run cells, most recent last. See
+        # get_cached_code().
+        self.code_cache_size = 128
+        self._code_cache = OrderedDict()
+        self._code_cache_hits = 0
+        self._code_cache_misses = 0
+
+    def __call__(self, *args, **kwargs):
+        code = super().__call__(*args, **kwargs)
+        self._track_code(code)
+        return code
+
+    def _track_code(self, code):
+        """Keep the cell code was compiled from in linecache while it lives."""
+        if not (self.linecache_max_entries or self.linecache_max_bytes):
+            return
+        name = code.co_filename
+        if name in linecache._ipython_cache:
+            refs = _live_code.setdefault(name, [])
+            refs.extend(weakref.ref(c) for c in _walk_code(code))
 
     def ast_parse(self, source, filename='<unknown>', symbol='exec'):
         """Parse code to an AST with the current compiler flags active.
@@ -129,12 +204,79 @@ def cache(self, code, number=0):
         argument to compilation, so that tracebacks are correctly hooked up.
         """
         name = code_name(code, number)
-        entry = (len(code), time.time(),
+        # No mtime: linecache.checkcache() does not look for a file on disk
+        # for entries without one.
+        entry = (len(code), None,
                  [line+'\n' for line in code.splitlines()], name)
         linecache.cache[name] = entry
         linecache._ipython_cache[name] = entry
+        linecache._ipython_cache.move_to_end(name)
+        self._evict_cells()
         return name
 
+    def _evict_cells(self):
+        """Remove the least recently run cells from linecache until they fit
+        in linecache_max_entries and linecache_max_bytes.
+
+        The most recent cell is always kept, and so are cells with live code.
+        """
+        ipython_cache = linecache._ipython_cache
+        max_entries, max_bytes = self.linecache_max_entries, self.linecache_max_bytes
+        n_entries = len(ipython_cache)
+        n_bytes = sum(entry[0] for entry in ipython_cache.values()) if max_bytes else 0
+        if not ((max_entries and n_entries > max_entries) or
+                (max_bytes and n_bytes > max_bytes)):
+            return
+        for name in list(ipython_cache)[:-1]:
+            if not ((max_entries and n_entries > max_entries) or
+                    (max_bytes and n_bytes > max_bytes)):
+                break
+            if _has_live_code(name):
+                continue
+            entry = ipython_cache.pop(name)
+            linecache.cache.pop(name, None)
+            n_entries -= 1
+            n_bytes -= entry[0]
+
+    def code_cache_key(self, source, *context):
+        """Key of the code compiled from source with the current flags, for
+        get_cached_code() and cache_code().
+
+        context are other hashable values the compiled code depends on.
+        """
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return (digest, self.flags) + context
+
+    def get_cached_code(self, key, filename):
+        """Return the code objects cached with cache_code() under key,
+        renamed to filename, or None.
+        """
+        # code.replace() is new in Python 3.8
+        codes = self._code_cache.get(key)
+        if codes is None or not hasattr(types.CodeType, 'replace'):
+            self._code_cache_misses += 1
+            return None
+        self._code_cache_hits += 1
+        self._code_cache.move_to_end(key)
+        codes = [_rename_code(code, filename) for code in codes]
+        for code in codes:
+            self._track_code(code)
+        return codes
+
+    def cache_code(self, key, codes):
+        """Cache a list of code objects under key, evicting the least recently
+        used ones beyond code_cache_size."""
+        if self.code_cache_size > 0:
+            self._code_cache[key] = list(codes)
+            self._code_cache.move_to_end(key)
+        while len(self._code_cache) > max(self.code_cache_size, 0):
+            self._code_cache.popitem(last=False)
+
+    def code_cache_info(self):
+        """Statistics of the code cache, like functools.lru_cache."""
+        return CodeCacheInfo(self._code_cache_hits, self._code_cache_misses,
+                             self.code_cache_size, len(self._code_cache))
+
     @contextmanager
     def extra_flags(self, flags):
         ## bits that we'll set to 1
@@ -156,5 +298,7 @@ def check_linecache_ipython(*args):
     # First call the original checkcache as intended
     linecache._checkcache_ori(*args)
     # Then, update back the cache with our data, so that tracebacks related
-    # to our compiled codes can be produced.
-    linecache.cache.update(linecache._ipython_cache)
+    # to our compiled codes can be produced. Our entries have no mtime, so
+    # only clearcache() removes them.
+    if not linecache._ipython_cache.keys() <= linecache.cache.keys():
+        linecache.cache.update(linecache._ipython_cache)
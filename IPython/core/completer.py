@@ -111,19 +111,24 @@
 
 
 import builtins as builtin_mod
+import bisect
 import glob
 import inspect
 import itertools
 import keyword
 import os
+import queue
 import re
 import string
 import sys
+import threading
 import time
 import unicodedata
 import uuid
 import warnings
+from concurrent.futures import Future, wait
 from contextlib import contextmanager
+from functools import partial
 from importlib import import_module
 from types import SimpleNamespace
 from typing import Iterable, Iterator, List, Tuple, Union, Any, Sequence, Dict, NamedTuple, Pattern, Optional
@@ -132,11 +137,13 @@
 from IPython.core.inputtransformer2 import ESC_MAGIC
 from IPython.core.latex_symbols import latex_symbols, reverse_latex_symbol
 from IPython.core.oinspect import InspectColors
+from IPython.paths import get_ipython_cache_dir
 from IPython.utils import generics
 from IPython.utils.dir2 import dir2, get_real_method
 from IPython.utils.path import ensure_dir_exists
 from IPython.utils.process import arg_split
-from traitlets import Bool, Enum, Int, List as ListTrait, Unicode, default, observe
+from traitlets import (Bool, Dict as DictTrait, Enum, Float, Int,
+                       List as ListTrait, Unicode, default, observe)
 from traitlets.config.configurable import Configurable
 
 import __main__
@@ -352,6 +359,117 @@ def __repr__(self):
         return '<Fake completion object jedi has crashed>'
 
 
+class _MatcherStats:
+    """
+    Timings of a matcher: a histogram of its durations, and how often it went
+    over its time budget.
+    """
+
+    #: Upper bounds of the histogram buckets, in seconds. The last bucket has
+    #: no upper bound.
+    bounds = (0.001, 0.01, 0.1, 1.0)
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(self.bounds) + 1)
+        self.overruns = 0
+        self.skipped = 0
+        # not finished before the deadline of a concurrent completion
+        self.dropped = 0
+        # consecutive overruns, and the request until which it is skipped
+        self.strikes = 0
+        self.skip_until = 0
+
+    def record(self, duration):
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.histogram[bisect.bisect_left(self.bounds, duration)] += 1
+
+
+class _MatcherPool:
+    """
+    A few daemon threads running matchers concurrently.
+
+    Unlike with :class:`concurrent.futures.ThreadPoolExecutor`, a matcher
+    stuck on a slow file system does not prevent Python from exiting.
+    """
+
+    def __init__(self, workers):
+        self._queue = queue.Queue()
+        for i in range(workers):
+            threading.Thread(target=self._work, daemon=True,
+                             name='IPCompleter matcher %d' % i).start()
+
+    def submit(self, func, *args) -> Future:
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def _work(self):
+        while True:
+            future, func, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+class _RequestAttribute:
+    """
+    An attribute of :class:`IPCompleter` describing the completion request,
+    like ``line_buffer``.
+
+    Its value is kept per thread, and the matchers run on the matcher threads
+    get the values of the request they were submitted for. A matcher still
+    running after the deadline of its request (see ``concurrent_matchers``)
+    so doesn't see the values of the next one. Threads which did not set it
+    see the value set last by any thread.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj._request_state, self.name)
+        except AttributeError:
+            pass
+        try:
+            return obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+
+    def __set__(self, obj, value):
+        setattr(obj._request_state, self.name, value)
+        obj.__dict__[self.name] = value
+
+
+class _NarrowedJediCompletion:
+    """
+    A Jedi completion reused for a longer prefix than the one it was computed
+    for. Only ``complete`` differs from the wrapped completion.
+    """
+
+    def __init__(self, completion, typed):
+        if isinstance(completion, _NarrowedJediCompletion):
+            completion = completion._completion
+        self._completion = completion
+        self.complete = completion.name_with_symbols[len(typed):]
+
+    def __getattr__(self, name):
+        return getattr(self._completion, name)
+
+    def __repr__(self):
+        return repr(self._completion)
+
+
 class Completion:
     """
     Completion object used and return by IPython completers.
@@ -1041,6 +1159,9 @@ class IPCompleter(Completer):
 
     __dict_key_regexps: Optional[Dict[bool,Pattern]] = None
 
+    line_buffer = _RequestAttribute()
+    text_until_cursor = _RequestAttribute()
+
     @observe('greedy')
     def _greedy_changed(self, change):
         """update the splitter and readline delims when greedy is changed"""
@@ -1095,6 +1216,63 @@ def _greedy_changed(self, change):
         help="Template for path at which to output profile data for completions."
     ).tag(config=True)
 
+    incremental_completion = Bool(False,
+        help="""Reuse the previous completions when more characters are typed.
+
+        If True, completing again at the same place after typing more
+        characters of a name filters the previous candidates instead of
+        running all the matchers again. The candidates are computed again
+        after code is executed, when the user namespace is modified through
+        the shell, or when the working directory changes.
+        """
+    ).tag(config=True)
+
+    matcher_time_budgets = DictTrait(value_trait=Float(),
+        help="""Time budgets of the completion matchers, in seconds.
+
+        Keys are the qualified names of the matchers, as shown by
+        ``%completer_stats``, e.g. ``{'IPCompleter.file_matches': 0.1}``.
+        Jedi is ``IPCompleter._jedi_matches`` and the completers registered
+        with the ``complete_command`` hook are
+        ``IPCompleter.dispatch_custom_completer``. A matcher which goes over
+        its budget ``matcher_budget_strikes`` times in a row is skipped for
+        the next ``matcher_budget_cooldown`` completion requests.
+        """
+    ).tag(config=True)
+
+    matcher_budget_strikes = Int(3,
+        help="""Number of consecutive completions over its time budget after
+        which a matcher is skipped.
+        """
+    ).tag(config=True)
+
+    matcher_budget_cooldown = Int(20,
+        help="""Number of completion requests for which a matcher over its
+        time budget is skipped, before it is tried again.
+        """
+    ).tag(config=True)
+
+    concurrent_matchers = Bool(False,
+        help="""Run the completion matchers and Jedi concurrently.
+
+        If True, the matchers run on ``matcher_threads`` threads, and those
+        which have not finished ``completion_deadline`` seconds after the
+        completion was requested are left out of the results.
+        """
+    ).tag(config=True)
+
+    matcher_threads = Int(4,
+        help="""Number of threads running matchers when ``concurrent_matchers``
+        is True.
+        """
+    ).tag(config=True)
+
+    completion_deadline = Float(0.5,
+        help="""Time in seconds after which the matchers which are still running
+        are left out of the completions, when ``concurrent_matchers`` is True.
+        """
+    ).tag(config=True)
+
     @observe('limit_to__all__')
     def _limit_to_all_changed(self, change):
         warnings.warn('`IPython.core.IPCompleter.limit_to__all__` configuration '
@@ -1126,6 +1304,8 @@ def __init__(self, shell=None, namespace=None, global_namespace=None,
 
         self.magic_escape = ESC_MAGIC
         self.splitter = CompletionSplitter()
+        # Values of the _RequestAttribute of this completer, per thread
+        self._request_state = threading.local()
 
         if use_readline is not _deprecation_readline_sentinel:
             warnings.warn('The `use_readline` parameter is deprecated and ignored since IPython 6.0.',
@@ -1174,6 +1354,116 @@ def __init__(self, shell=None, namespace=None, global_namespace=None,
         # attribute through the `@unicode_names` property.
         self._unicode_names = None
 
+        # Previous completion results, reused by incremental_completion, and a
+        # counter identifying the state of the namespace they were computed for.
+        self._completion_cache = None
+        self._namespace_version = 0
+
+        # Timings of the matchers, by qualified name, shown by %completer_stats
+        self.matcher_stats = {}
+        self._completion_requests = 0
+
+        # Threads and running calls for concurrent_matchers, by matcher name
+        self._matcher_pool = None
+        self._running_matchers = {}
+
+        # Completions may be requested from several threads (e.g. the
+        # terminal's complete_in_thread), but the matchers share the state of
+        # the completer (matches, the completion cache, the matcher stats...):
+        # only one matcher runs at a time. Jedi isn't thread safe either, but
+        # has its own lock, so that the matchers of a request don't wait for
+        # the Jedi inference of a previous one.
+        self._lock = threading.RLock()
+        self._jedi_lock = threading.RLock()
+
+    def invalidate_completion_cache(self):
+        """Forget the completions reused by :attr:`incremental_completion`.
+
+        Should be called whenever the namespace might have changed.
+        """
+        self._namespace_version += 1
+        self._completion_cache = None
+
+    def _get_matcher_stats(self, name):
+        stats = self.matcher_stats.get(name)
+        if stats is None:
+            stats = self.matcher_stats[name] = _MatcherStats()
+        return stats
+
+    def _run_concurrently(self, calls, is_stale=None):
+        """Run ``calls``, a list of ``(name, func)`` pairs, on the matcher
+        threads, with the state of the current request.
+
+        Yields the futures of the calls in the same order, each once it is
+        finished, with None for the calls which did not finish before the
+        completion deadline. Stops once ``is_stale()`` returns True.
+        """
+        deadline = time.monotonic() + self.completion_deadline
+        state = dict(vars(self._request_state))
+
+        futures = []
+        with self._lock:
+            if self._matcher_pool is None:
+                self._matcher_pool = _MatcherPool(self.matcher_threads)
+            for name, func in calls:
+                running = self._running_matchers.get(name)
+                if running is not None and not running.done():
+                    # Still running for a previous completion: don't pile up
+                    # calls to a matcher which blocks.
+                    futures.append(None)
+                else:
+                    futures.append(self._matcher_pool.submit(
+                        self._in_request, state, self._timed_matcher, name, func))
+                    self._running_matchers[name] = futures[-1]
+
+        for (name, func), future in zip(calls, futures):
+            if is_stale is not None and is_stale():
+                return
+            if future is not None:
+                wait([future], timeout=max(0, deadline - time.monotonic()))
+            if future is None or not future.done():
+                self._get_matcher_stats(name).dropped += 1
+                future = None
+            yield future
+
+    def _in_request(self, state, func, *args):
+        """Call ``func`` with the request state of another thread."""
+        vars(self._request_state).update(state)
+        return func(*args)
+
+    def _matcher_results(self, matcher, text):
+        # Matchers may return iterators: consume them while timing them.
+        return [(m, matcher.__qualname__) for m in matcher(text)]
+
+    def _timed_matcher(self, name, func, *args):
+        """Call ``func``, recording its duration in :attr:`matcher_stats`
+        under the matcher ``name``.
+
+        Returns None, without calling it, while the matcher is skipped for
+        having been over its time budget.
+        """
+        stats = self._get_matcher_stats(name)
+        if stats.skip_until >= self._completion_requests:
+            stats.skipped += 1
+            return None
+
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            duration = time.perf_counter() - start
+            stats.record(duration)
+            budget = self.matcher_time_budgets.get(name)
+            if budget is not None and duration > budget:
+                stats.overruns += 1
+                stats.strikes += 1
+                if stats.strikes >= self.matcher_budget_strikes:
+                    stats.strikes = 0
+                    stats.skip_until = (self._completion_requests
+                                        + self.matcher_budget_cooldown)
+            else:
+                stats.strikes = 0
+
     @property
     def matchers(self) -> List[Any]:
         """All active matcher routines for completion"""
@@ -1833,7 +2123,7 @@ def dispatch_custom_completer(self, text):
 
         return None
 
-    def completions(self, text: str, offset: int)->Iterator[Completion]:
+    def completions(self, text: str, offset: int, *, is_stale=None)->Iterator[Completion]:
         """
         Returns an iterator over the possible completions
 
@@ -1849,6 +2139,11 @@ def completions(self, text: str, offset: int)->Iterator[Completion]:
         offset:int
             Integer representing the position of the cursor in ``text``. Offset
             is 0-based indexed.
+        is_stale:callable, optional
+            Called between matchers. Once it returns True, no more matchers
+            run and no more completions are produced. When given, the
+            completions of each matcher are produced as soon as it finishes,
+            rather than sorted together.
 
         Yields
         ------
@@ -1892,7 +2187,8 @@ def completions(self, text: str, offset: int)->Iterator[Completion]:
             else:
                 profiler = None
 
-            for c in self._completions(text, offset, _timeout=self.jedi_compute_type_timeout/1000):
+            for c in self._completions(text, offset, _timeout=self.jedi_compute_type_timeout/1000,
+                                       is_stale=is_stale):
                 if c and (c in seen):
                     continue
                 yield c
@@ -1909,7 +2205,7 @@ def completions(self, text: str, offset: int)->Iterator[Completion]:
                 print("Writing profiler output to", output_path)
                 profiler.dump_stats(output_path)
 
-    def _completions(self, full_text: str, offset: int, *, _timeout) -> Iterator[Completion]:
+    def _completions(self, full_text: str, offset: int, *, _timeout, is_stale=None) -> Iterator[Completion]:
         """
         Core completion module.Same signature as :any:`completions`, with the
         extra `timeout` parameter (in seconds).
@@ -1941,23 +2237,41 @@ def _completions(self, full_text: str, offset: int, *, _timeout) -> Iterator[Com
         before = full_text[:offset]
         cursor_line, cursor_column = position_to_cursor(full_text, offset)
 
-        matched_text, matches, matches_origin, jedi_matches = self._complete(
-            full_text=full_text, cursor_line=cursor_line, cursor_pos=cursor_column)
+        request = dict(full_text=full_text, cursor_line=cursor_line,
+                       cursor_pos=cursor_column)
+        if is_stale is None:
+            parts = [self._complete(**request)]
+        else:
+            parts = self._complete_parts(is_stale=is_stale, **request)
+        produced = 0
+        for part in parts:
+            for c in self._part_completions(part, before, offset, deadline,
+                                            _timeout, MATCHES_LIMIT - produced):
+                if c._origin != 'jedi':
+                    produced += 1
+                yield c
+
+    def _part_completions(self, part, before, offset, deadline, _timeout,
+                          limit):
+        """The :any:`Completion` objects of a :class:`_CompleteResult`, with
+        at most ``limit`` of its matches."""
+        matched_text, matches, matches_origin, jedi_matches = part
 
         iter_jm = iter(jedi_matches)
         if _timeout:
             for jm in iter_jm:
-                try:
-                    type_ = jm.type
-                except Exception:
-                    if self.debug:
-                        print("Error in Jedi getting type of ", jm)
-                    type_ = None
+                with self._jedi_lock:
+                    try:
+                        type_ = jm.type
+                    except Exception:
+                        if self.debug:
+                            print("Error in Jedi getting type of ", jm)
+                        type_ = None
+                    if type_ == 'function':
+                        signature = _make_signature(jm)
+                    else:
+                        signature = ''
                 delta = len(jm.name_with_symbols) - len(jm.complete)
-                if type_ == 'function':
-                    signature = _make_signature(jm)
-                else:
-                    signature = ''
                 yield Completion(start=offset - delta,
                                  end=offset,
                                  text=jm.name_with_symbols,
@@ -1989,7 +2303,7 @@ def _completions(self, full_text: str, offset: int, *, _timeout) -> Iterator[Com
         # I'm unsure if this is always true, so let's assert and see if it
         # crash
         assert before.endswith(matched_text)
-        for m, t in zip(matches, matches_origin):
+        for m, t in itertools.islice(zip(matches, matches_origin), max(limit, 0)):
             yield Completion(start=start_offset, end=offset, text=m, _origin=t, signature='', type='<unknown>')
 
 
@@ -2057,80 +2371,214 @@ def _complete(self, *, cursor_line, cursor_pos, line_buffer=None, text=None,
         """
 
 
-        # if the cursor position isn't given, the only sane assumption we can
-        # make is that it's at the end of the line (the common case)
-        if cursor_pos is None:
-            cursor_pos = len(line_buffer) if text is None else len(text)
+        parts = list(self._complete_parts(
+            cursor_line=cursor_line, cursor_pos=cursor_pos,
+            line_buffer=line_buffer, text=text, full_text=full_text))
+        matched = [p for p in parts if p.matches]
+        if len(matched) > 1:
+            pairs = self._sort_matches(
+                pair for p in matched
+                for pair in zip(p.matches, p.matches_origin))[:MATCHES_LIMIT]
+            _matches = [m[0] for m in pairs]
+            origins = [m[1] for m in pairs]
+        elif matched:
+            _matches, origins = matched[0].matches, matched[0].matches_origin
+        else:
+            _matches, origins = [], []
+        completions = [c for p in parts for c in p.jedi_matches]
 
-        if self.use_main_ns:
-            self.namespace = __main__.__dict__
+        self.matches = _matches
 
-        # if text is either None or an empty string, rely on the line buffer
-        if (not line_buffer) and full_text:
-            line_buffer = full_text.split('\n')[cursor_line]
-        if not text: # issue #11508: check line_buffer before calling split_line
-            text = self.splitter.split_line(line_buffer, cursor_pos)  if line_buffer else ''
-
-        if self.backslash_combining_completions:
-            # allow deactivation of these on windows.
-            base_text = text if not line_buffer else line_buffer[:cursor_pos]
-
-            for meth in (self.latex_matches,
-                         self.unicode_name_matches,
-                         back_latex_name_matches,
-                         back_unicode_name_matches,
-                         self.fwd_unicode_match):
-                name_text, name_matches = meth(base_text)
-                if name_text:
-                    return _CompleteResult(name_text, name_matches[:MATCHES_LIMIT], \
-                           [meth.__qualname__]*min(len(name_matches), MATCHES_LIMIT), ())
-
-
-        # If no line buffer is given, assume the input text is all there was
-        if line_buffer is None:
-            line_buffer = text
-
-        self.line_buffer = line_buffer
-        self.text_until_cursor = self.line_buffer[:cursor_pos]
-
-        # Do magic arg matches
-        for matcher in self.magic_arg_matchers:
-            matches = list(matcher(line_buffer))[:MATCHES_LIMIT]
-            if matches:
-                origins = [matcher.__qualname__] * len(matches)
-                return _CompleteResult(text, matches, origins, ())
-
-        # Start with a clean slate of completions
-        matches = []
+        return _CompleteResult(parts[0].matched_text, _matches, origins,
+                               completions)
+
+    def _complete_parts(self, *, cursor_line, cursor_pos, line_buffer=None,
+                        text=None, full_text=None, is_stale=None):
+        """
+        The result of :meth:`_complete`, in parts yielded as they are computed.
+
+        Each part is a :class:`_CompleteResult` with the sorted matches of one
+        matcher or the completions of Jedi, unless a single part holds all of
+        them. The lock is released between the parts, and once ``is_stale()``
+        returns True no more are computed.
+        """
+        if is_stale is None:
+            is_stale = lambda: False
+        with self._lock:
+            # if the cursor position isn't given, the only sane assumption we
+            # can make is that it's at the end of the line (the common case)
+            if cursor_pos is None:
+                cursor_pos = len(line_buffer) if text is None else len(text)
+
+            if self.use_main_ns:
+                self.namespace = __main__.__dict__
+
+            # if text is either None or an empty string, rely on the line buffer
+            if (not line_buffer) and full_text:
+                line_buffer = full_text.split('\n')[cursor_line]
+            if not text: # issue #11508: check line_buffer before calling split_line
+                text = self.splitter.split_line(line_buffer, cursor_pos)  if line_buffer else ''
+
+            result = None
+            if self.backslash_combining_completions:
+                # allow deactivation of these on windows.
+                base_text = text if not line_buffer else line_buffer[:cursor_pos]
+
+                for meth in (self.latex_matches,
+                             self.unicode_name_matches,
+                             back_latex_name_matches,
+                             back_unicode_name_matches,
+                             self.fwd_unicode_match):
+                    name_text, name_matches = meth(base_text)
+                    if name_text:
+                        result = _CompleteResult(name_text, name_matches[:MATCHES_LIMIT], \
+                               [meth.__qualname__]*min(len(name_matches), MATCHES_LIMIT), ())
+                        break
+
+            if result is None:
+                # If no line buffer is given, assume the input text is all
+                # there was
+                if line_buffer is None:
+                    line_buffer = text
+
+                self.line_buffer = line_buffer
+                self.text_until_cursor = self.line_buffer[:cursor_pos]
+
+                # Do magic arg matches
+                for matcher in self.magic_arg_matchers:
+                    matches = list(matcher(line_buffer))[:MATCHES_LIMIT]
+                    if matches:
+                        origins = [matcher.__qualname__] * len(matches)
+                        result = _CompleteResult(text, matches, origins, ())
+                        break
+
+            if result is None:
+                # The matches of a custom completer replace the others
+                custom = [m for m in self._timed_matcher(
+                    self.dispatch_custom_completer.__qualname__,
+                    self.dispatch_custom_completer, text) or []][:MATCHES_LIMIT]
+
+                if self.incremental_completion:
+                    context = self._completion_context(text, line_buffer, cursor_pos,
+                                                       cursor_line, full_text)
+                else:
+                    context = None
+                narrowed = self._narrow_cached_completions(context, text)
+
+        if result is not None:
+            yield result
+            return
+
+        yield _CompleteResult(text, custom, ['custom'] * len(custom), ())
+        if narrowed is not None:
+            _filtered_matches, completions = narrowed
+            if custom:
+                _filtered_matches = []
+            _filtered_matches = _filtered_matches[:MATCHES_LIMIT]
+            yield _CompleteResult(text, [m[0] for m in _filtered_matches],
+                                  [m[1] for m in _filtered_matches], completions)
+            return
+
+        all_matches, all_completions = [], []
+        for _filtered_matches, completions in self._compute_completions(
+                text, line_buffer, cursor_pos, cursor_line, full_text, is_stale):
+            all_matches.extend(_filtered_matches)
+            all_completions.extend(completions)
+            if custom:
+                _filtered_matches = []
+            _filtered_matches = _filtered_matches[:MATCHES_LIMIT]
+            yield _CompleteResult(text, [m[0] for m in _filtered_matches],
+                                  [m[1] for m in _filtered_matches], completions)
+        if context is not None and not is_stale():
+            with self._lock:
+                self._completion_cache = (context, text,
+                                          self._sort_matches(all_matches),
+                                          all_completions)
+
+    def _compute_completions(self, text, line_buffer, cursor_pos, cursor_line,
+                             full_text, is_stale=None):
+        """Run all the matchers, and Jedi if enabled.
+
+        Yields the results of each as it finishes, as ``(matches,
+        completions)`` pairs: the sorted and deduplicated ``(match, origin)``
+        pairs of a matcher, or the Jedi completions. No more run once
+        ``is_stale()`` returns True.
+        """
+        if is_stale is None:
+            is_stale = lambda: False
 
         # FIXME: we should extend our api to return a dict with completions for
         # different types of objects.  The rlcomplete() method could then
         # simply collapse the dict into a list for readline, but we'd have
         # richer completion semantics in other environments.
-        completions:Iterable[Any] = []
-        if self.use_jedi:
-            if not full_text:
-                full_text = line_buffer
-            completions = self._jedi_matches(
-                cursor_pos, cursor_line, full_text)
-
-        if self.merge_completions:
-            matches = []
-            for matcher in self.matchers:
-                try:
-                    matches.extend([(m, matcher.__qualname__)
-                                    for m in matcher(text)])
-                except:
-                    # Show the ugly traceback if the matcher causes an
-                    # exception, but do NOT crash the kernel!
-                    sys.excepthook(*sys.exc_info())
-        else:
-            for matcher in self.matchers:
-                matches = [(m, matcher.__qualname__)
-                            for m in matcher(text)]
-                if matches:
-                    break
-                    
+        with self._lock:
+            self._completion_requests += 1
+            matchers = self.matchers
+        if self.use_jedi and not full_text:
+            full_text = line_buffer
+        jedi_matches = partial(self._jedi_matches, cursor_pos, cursor_line,
+                               full_text)
+
+        if self.concurrent_matchers:
+            calls = [(matcher.__qualname__,
+                      partial(self._matcher_results, matcher, text))
+                     for matcher in matchers]
+            if self.use_jedi:
+                calls.insert(0, (self._jedi_matches.__qualname__,
+                                 lambda: list(jedi_matches())))
+            futures = self._run_concurrently(calls, is_stale)
+            if self.use_jedi:
+                future = next(futures, None)
+                yield [], (future and future.result()) or []
+            # Yield the results in the order of the matchers, and handle
+            # errors, like below
+            for future in futures:
+                if future is None:
+                    continue
+                if self.merge_completions:
+                    try:
+                        matches = future.result() or []
+                    except:
+                        sys.excepthook(*sys.exc_info())
+                        continue
+                    yield self._sort_matches(matches), []
+                else:
+                    matches = future.result() or []
+                    if matches:
+                        yield self._sort_matches(matches), []
+                        return
+            return
+
+        if self.use_jedi and not is_stale():
+            with self._jedi_lock:
+                completions = list(self._timed_matcher(
+                    self._jedi_matches.__qualname__, jedi_matches) or [])
+            yield [], completions
+
+        run_matcher = lambda matcher: self._timed_matcher(
+            matcher.__qualname__, self._matcher_results, matcher, text) or []
+        for matcher in matchers:
+            if is_stale():
+                return
+            with self._lock:
+                if self.merge_completions:
+                    try:
+                        matches = run_matcher(matcher)
+                    except:
+                        # Show the ugly traceback if the matcher causes an
+                        # exception, but do NOT crash the kernel!
+                        sys.excepthook(*sys.exc_info())
+                        continue
+                else:
+                    matches = run_matcher(matcher)
+            if matches or self.merge_completions:
+                yield self._sort_matches(matches), []
+            if matches and not self.merge_completions:
+                return
+
+    @staticmethod
+    def _sort_matches(matches):
+        """Sort ``(match, origin)`` pairs, keeping the first of duplicates."""
         seen = set()
         filtered_matches = set()
         for m in matches:
@@ -2139,20 +2587,70 @@ def _complete(self, *, cursor_line, cursor_pos, line_buffer=None, text=None,
                 filtered_matches.add(m)
                 seen.add(t)
 
-        _filtered_matches = sorted(filtered_matches, key=lambda x: completions_sorting_key(x[0]))
+        return sorted(filtered_matches, key=lambda x: completions_sorting_key(x[0]))
 
-        custom_res = [(m, 'custom') for m in self.dispatch_custom_completer(text) or []]
-        
-        _filtered_matches = custom_res or _filtered_matches
-        
-        _filtered_matches = _filtered_matches[:MATCHES_LIMIT]
-        _matches = [m[0] for m in _filtered_matches]
-        origins = [m[1] for m in _filtered_matches]
+    def _completion_context(self, text, line_buffer, cursor_pos, cursor_line,
+                            full_text):
+        """Everything the completions of ``text`` depend on, apart from ``text``.
 
-        self.matches = _matches
+        Returns None if the completions should not be reused.
+        """
+        before = line_buffer[:cursor_pos]
+        if (self.custom_matchers or not self.merge_completions
+                or not before.endswith(text)):
+            return None
+        try:
+            cwd = os.getcwd()
+        except OSError:
+            return None
+        lines = full_text.split('\n') if full_text else [line_buffer]
+        return (id(self.namespace), id(self.global_namespace),
+                self._namespace_version, cwd, cursor_line,
+                before[:len(before) - len(text)], line_buffer[cursor_pos:],
+                tuple(lines[:cursor_line]), tuple(lines[cursor_line + 1:]),
+                self.use_jedi, self.greedy, self.dict_keys_only,
+                self.omit__names)
+
+    def _narrow_cached_completions(self, context, text):
+        """Filter the previous completions, if ``text`` extends their text.
+
+        Returns None if the completions have to be computed again.
+        """
+        if context is None or self._completion_cache is None:
+            return None
+        old_context, old_text, matches, completions = self._completion_cache
+        if context != old_context or not text.startswith(old_text):
+            return None
+        added = text[len(old_text):]
+        # Only narrow when more of a name is typed: other characters can
+        # change which matchers apply, or bring back names hidden by
+        # omit__names after a dot. An underscore can start an abbreviation of
+        # a snake_case name, which global_matches also completes. Completing
+        # the same text again computes fresh completions.
+        if not (re.fullmatch(r'\w+', added) and '_' not in added
+                and re.search(r'\w$', old_text)):
+            return None
+
+        narrowed = []
+        for m, origin in matches:
+            start = m.find(old_text)
+            if start < 0:
+                return None
+            if m.startswith(text, start):
+                narrowed.append((m, origin))
+
+        narrowed_completions = []
+        for c in completions:
+            if c.complete is None:
+                return None
+            name = c.name_with_symbols
+            typed = name[:len(name) - len(c.complete)] + added
+            # Jedi matches names case-insensitively
+            if name.lower().startswith(typed.lower()):
+                narrowed_completions.append(_NarrowedJediCompletion(c, typed))
+
+        return narrowed, narrowed_completions
 
-        return _CompleteResult(text, _matches, origins, completions)
-        
     def fwd_unicode_match(self, text:str) -> Tuple[str, Sequence[str]]:
         """
         Forward match a string starting with a backslash with a list of
@@ -2166,22 +2664,6 @@ def fwd_unicode_match(self, text:str) -> Tuple[str, Sequence[str]]:
             - matched text (empty if no matches)
             - list of potential completions, empty tuple  otherwise)
         """
-        # TODO: self.unicode_names is here a list we traverse each time with ~100k elements.
-        # We could do a faster match using a Trie.
-
-        # Using pygtrie the follwing seem to work:
-
-        #     s = PrefixSet()
-
-        #     for c in range(0,0x10FFFF + 1):
-        #         try:
-        #             s.add(unicodedata.name(chr(c)))
-        #         except ValueError:
-        #             pass
-        #     [''.join(k) for k in s.iter(prefix)]
-
-        # But need to be timed and adds an extra dependency.
-
         slashpos = text.rfind('\\')
         # if text starts with slash
         if slashpos > -1:
@@ -2191,7 +2673,11 @@ def fwd_unicode_match(self, text:str) -> Tuple[str, Sequence[str]]:
             # initialize it, so we don't want to initialize it unless we're
             # actually going to use it.
             s = text[slashpos+1:]
-            candidates = [x for x in self.unicode_names if x.startswith(s)]
+            # unicode_names is sorted, so the names starting with s are a
+            # contiguous slice of it.
+            names = self.unicode_names
+            candidates = names[bisect.bisect_left(names, s):
+                               bisect.bisect_left(names, s + chr(sys.maxunicode))]
             if candidates:
                 return s, candidates
             else:
@@ -2203,21 +2689,49 @@ def fwd_unicode_match(self, text:str) -> Tuple[str, Sequence[str]]:
 
     @property
     def unicode_names(self) -> List[str]:
-        """List of names of unicode code points that can be completed.
+        """Sorted list of names of unicode code points that can be completed.
 
         The list is lazily initialized on first access.
         """
         if self._unicode_names is None:
-            names = []
-            for c in range(0,0x10FFFF + 1):
-                try:
-                    names.append(unicodedata.name(chr(c)))
-                except ValueError:
-                    pass
-            self._unicode_names = _unicode_name_compute(_UNICODE_RANGES)
+            self._unicode_names = _get_unicode_names()
 
         return self._unicode_names
 
+
+# Sorted unicode names, shared by all completers
+_unicode_names_cache = None
+
+def _get_unicode_names() -> List[str]:
+    """Return the sorted names of the unicode code points in _UNICODE_RANGES.
+
+    Computing them takes a noticeable amount of time, so they are stored in the
+    IPython cache directory, one file per version of the unicode database, and
+    read from there in later sessions.
+    """
+    global _unicode_names_cache
+    if _unicode_names_cache is not None:
+        return _unicode_names_cache
+
+    path = os.path.join(get_ipython_cache_dir(),
+                        'unicode_names-%s.txt' % unicodedata.unidata_version)
+    try:
+        with open(path, encoding='ascii') as f:
+            names = f.read().split('\n')
+    except (OSError, ValueError):
+        names = None
+    if not names or not names[0]:
+        names = sorted(_unicode_name_compute(_UNICODE_RANGES))
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(tmp_path, 'w', encoding='ascii') as f:
+                f.write('\n'.join(names))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    _unicode_names_cache = names
+    return names
+
 def _unicode_name_compute(ranges:List[Tuple[int,int]]) -> List[str]:
     names = []
     for start,stop in ranges:
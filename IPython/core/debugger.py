@@ -38,6 +38,7 @@
 from IPython.utils import PyColorize
 from IPython.utils import coloransi, py3compat
 from IPython.core.excolors import exception_colors
+from IPython.core.sourcecache import highlight_cache
 from IPython.testing.skipdoctest import skip_doctest
 
 
@@ -440,6 +441,7 @@ def format_stack_entry(self, frame_lineno, lprefix=': ', context=None):
         start = min(start, len(lines) - context)
         start = max(start, 0)
         lines = lines[start : start + context]
+        version = self.__source_version(filename)
 
         for i,line in enumerate(lines):
             show_arrow = (start + 1 + i == lineno)
@@ -448,16 +450,32 @@ def format_stack_entry(self, frame_lineno, lprefix=': ', context=None):
                       or tpl_line
             ret.append(self.__format_line(linetpl, filename,
                                           start + 1 + i, line,
-                                          arrow = show_arrow) )
+                                          arrow = show_arrow,
+                                          version = version) )
         return ''.join(ret)
 
-    def __format_line(self, tpl_line, filename, lineno, line, arrow = False):
+    def __source_version(self, filename):
+        """The version of filename in the highlight cache, looked up once for
+        all the lines shown."""
+        if self.parser.style == 'NoColor':
+            return None
+        return highlight_cache.version(
+            filename, source=lambda: ''.join(linecache.getlines(filename)))
+
+    def __format_line(self, tpl_line, filename, lineno, line, arrow = False,
+                      version = None):
         bp_mark = ""
         bp_mark_color = ""
 
-        new_line, err = self.parser.format2(line, 'str')
-        if not err:
-            line = new_line
+        if self.parser.style != 'NoColor':
+            if version is None:
+                # Not cacheable
+                line = self._highlight_line(line)
+            else:
+                line = highlight_cache.get(
+                    filename, ('PyColorize', self.parser.style), line,
+                    functools.partial(self._highlight_line, line),
+                    version=version)
 
         bp = None
         if lineno in self.get_file_breaks(filename):
@@ -482,6 +500,10 @@ def __format_line(self, tpl_line, filename, lineno, line, arrow = False):
         return tpl_line % (bp_mark_color + bp_mark, num, line)
 
 
+    def _highlight_line(self, line):
+        new_line, err = self.parser.format2(line, 'str')
+        return line if err else new_line
+
     def print_list_lines(self, filename, first, last):
         """The printing (as opposed to the parsing part of a 'list'
         command."""
@@ -493,6 +515,7 @@ def print_list_lines(self, filename, first, last):
             src = []
             if filename == "<string>" and hasattr(self, "_exec_filename"):
                 filename = self._exec_filename
+            version = self.__source_version(filename)
 
             for lineno in range(first, last+1):
                 line = linecache.getline(filename, lineno)
@@ -500,9 +523,11 @@ def print_list_lines(self, filename, first, last):
                     break
 
                 if lineno == self.curframe.f_lineno:
-                    line = self.__format_line(tpl_line_em, filename, lineno, line, arrow = True)
+                    line = self.__format_line(tpl_line_em, filename, lineno, line,
+                                              arrow = True, version = version)
                 else:
-                    line = self.__format_line(tpl_line, filename, lineno, line, arrow = False)
+                    line = self.__format_line(tpl_line, filename, lineno, line,
+                                              arrow = False, version = version)
 
                 src.append(line)
                 self.lineno = lineno
@@ -66,6 +66,7 @@ def publish_display_data(data, metadata=None, source=None, *, transient=None, **
     from IPython.core.interactiveshell import InteractiveShell
 
     display_pub = InteractiveShell.instance().display_pub
+    _flush_updates(display_pub, kwargs)
 
     # only pass transient if supplied,
     # to avoid errors with older ipykernel.
@@ -80,6 +81,14 @@ def publish_display_data(data, metadata=None, source=None, *, transient=None, **
     )
 
 
+def _flush_updates(display_pub, kwargs):
+    """Publish the pending display updates, before another output."""
+    if not kwargs.get('update'):
+        flush = getattr(display_pub, 'flush_updates', None)
+        if flush is not None:
+            flush()
+
+
 def _new_id():
     """Generate a new random text id with urandom"""
     return b2a_hex(os.urandom(16)).decode('ascii')
@@ -263,9 +272,11 @@ def display(*objs, include=None, exclude=None, metadata=None, transient=None, di
     if not raw:
         format = InteractiveShell.instance().display_formatter.format
 
+    display_pub = InteractiveShell.instance().display_pub
+    publish_update = getattr(display_pub, 'publish_update', None)
     for obj in objs:
         if raw:
-            publish_display_data(data=obj, metadata=metadata, **kwargs)
+            format_dict, md_dict = obj, metadata
         else:
             format_dict, md_dict = format(obj, include=include, exclude=exclude)
             if not format_dict:
@@ -274,6 +285,13 @@ def display(*objs, include=None, exclude=None, metadata=None, transient=None, di
             if metadata:
                 # kwarg-specified metadata gets precedence
                 _merge(md_dict, metadata)
+        if kwargs.get('update') and publish_update is not None:
+            # Formatted now, as the publisher may hold the update back
+            update_kwargs = dict(kwargs)
+            del update_kwargs['update']
+            publish_update(transient['display_id'], format_dict, md_dict,
+                           **update_kwargs)
+        else:
             publish_display_data(data=format_dict, metadata=md_dict, **kwargs)
     if display_id:
         return DisplayHandle(display_id)
@@ -359,7 +377,9 @@ def clear_output(wait=False):
         Wait to clear the output until new output is available to replace it."""
     from IPython.core.interactiveshell import InteractiveShell
     if InteractiveShell.initialized():
-        InteractiveShell.instance().display_pub.clear_output(wait)
+        display_pub = InteractiveShell.instance().display_pub
+        _flush_updates(display_pub, {})
+        display_pub.clear_output(wait)
     else:
         print('\033[2K\r', end='')
         sys.stdout.flush()
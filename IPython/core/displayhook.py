@@ -8,14 +8,427 @@
 # Distributed under the terms of the Modified BSD License.
 
 import builtins as builtin_mod
+import gc
+import operator
+import os
+import pickle
+import re
 import sys
 import io as _io
+import tempfile
+import time
 import tokenize
+import weakref
+from collections import OrderedDict
 
 from traitlets.config.configurable import Configurable
-from traitlets import Instance, Float
+from traitlets import Instance, Float, Integer, Enum, observe
 from warnings import warn
 
+
+def estimate_size(obj, depth=2, sample=100):
+    """Estimate the memory used by an object, in bytes.
+
+    Objects exposing their memory use (``nbytes`` for arrays, or
+    ``memory_usage(deep=True)`` for pandas objects) are trusted. Otherwise the
+    size of containers and of instance dicts is estimated from up to
+    ``sample`` of their items, ``depth`` levels deep.
+    """
+    try:
+        nbytes = getattr(obj, 'nbytes', None)
+        if isinstance(nbytes, int):
+            return nbytes
+        if callable(getattr(type(obj), 'memory_usage', None)):
+            usage = obj.memory_usage(deep=True)
+            return int(getattr(usage, 'sum', lambda: usage)())
+    except Exception:
+        pass
+    try:
+        size = sys.getsizeof(obj)
+    except TypeError:
+        size = 0
+    if depth <= 0 or isinstance(obj, (str, bytes, bytearray, int, float)):
+        return size
+    if isinstance(obj, dict):
+        items = [x for kv in list(obj.items())[:sample] for x in kv]
+        count = len(obj) * 2
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)[:sample] if isinstance(obj, (set, frozenset)) else obj[:sample]
+        count = len(obj)
+    elif isinstance(getattr(obj, '__dict__', None), dict):
+        return size + estimate_size(obj.__dict__, depth - 1, sample)
+    else:
+        return size
+    if items:
+        sampled = sum(estimate_size(x, depth - 1, sample) for x in items)
+        size += sampled * count // len(items)
+    return size
+
+
+class EvictedOutput(object):
+    """Placeholder for an output evicted from memory by :class:`OutputCache`.
+
+    The output is weakly referenced, if it can be, and loaded from that
+    reference as long as something else keeps it alive.
+    """
+
+    def __init__(self, obj, size, alias):
+        self.type_name = type(obj).__name__
+        self.size = size
+        # The _N variable bound to a LazyOutput in the namespace, if any
+        self.alias = alias
+        try:
+            self.ref = weakref.ref(obj)
+        except TypeError:
+            self.ref = None
+
+    def load(self):
+        """Return the evicted object, or raise KeyError if it is gone."""
+        obj = self.ref() if self.ref is not None else None
+        if obj is None:
+            raise KeyError(self.type_name)
+        return obj
+
+    def discard(self):
+        """Release the resources held for the evicted object."""
+        pass
+
+    def __repr__(self):
+        return '<%s %s, %d bytes>' % (self.__class__.__name__, self.type_name,
+                                      self.size)
+
+
+class SpilledOutput(EvictedOutput):
+    """An output pickled to a file, loaded again when it is needed."""
+    state = 'spilled'
+
+    def __init__(self, obj, size, alias, path):
+        super(SpilledOutput, self).__init__(obj, size, alias)
+        self.path = path
+        with open(path, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self):
+        try:
+            return super(SpilledOutput, self).load()
+        except KeyError:
+            pass
+        try:
+            with open(self.path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError) as e:
+            raise KeyError(self.path) from e
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class WeakOutput(EvictedOutput):
+    """An output only referenced weakly, which is gone once nothing else
+    references it."""
+
+    def __init__(self, obj, size, alias):
+        super(WeakOutput, self).__init__(obj, size, alias)
+        if self.ref is None:
+            raise TypeError("cannot create weak reference to %r object"
+                            % self.type_name)
+
+    @property
+    def state(self):
+        return 'weak' if self.ref() is not None else 'dead'
+
+
+class LazyOutput(object):
+    """Stands for an evicted output as its ``_N`` variable.
+
+    Using it loads the output from the :class:`OutputCache`, rebinds the
+    variable to it and forwards the operation to it. If the output is gone,
+    this raises NameError, as if the variable was not defined (AttributeError
+    for attributes). It is not an instance of the class of the output, so
+    that code scanning the namespace with ``isinstance`` doesn't load it.
+    """
+    __slots__ = ('_cache', '_key')
+
+    def __init__(self, cache, key):
+        object.__setattr__(self, '_cache', cache)
+        object.__setattr__(self, '_key', key)
+
+    def _load(self, error=NameError):
+        key = object.__getattribute__(self, '_key')
+        try:
+            return object.__getattribute__(self, '_cache')[key]
+        except KeyError:
+            raise error("name '_%s' is not defined: the output was evicted "
+                        "from memory, and is gone" % key) from None
+
+    def __getattr__(self, name):
+        return getattr(self._load(AttributeError), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def _forward(name, function):
+    """A LazyOutput method applying function to the loaded output.
+
+    The builtins and operators are called rather than the output's own special
+    methods, so that their fallbacks apply: ``bool()`` of an object without
+    ``__bool__`` or ``__len__``, ``in`` through ``__iter__``, or the reflected
+    operator of the other operand.
+    """
+    def method(self, *args, **kwargs):
+        return function(self._load(), *args, **kwargs)
+    method.__name__ = name
+    return method
+
+def _reflected(function):
+    return lambda obj, other: function(other, obj)
+
+_forwarded = {
+    'repr': repr, 'str': str, 'bytes': bytes, 'format': format, 'hash': hash,
+    'bool': bool, 'len': len, 'iter': iter, 'reversed': reversed,
+    'contains': lambda obj, item: item in obj,
+    'getitem': operator.getitem, 'setitem': operator.setitem,
+    'delitem': operator.delitem,
+    'call': lambda obj, *args, **kwargs: obj(*args, **kwargs),
+    'enter': lambda obj: obj.__enter__(),
+    'exit': lambda obj, *args: obj.__exit__(*args),
+    'neg': operator.neg, 'pos': operator.pos, 'abs': abs,
+    'invert': operator.invert, 'int': int, 'float': float,
+    'complex': complex, 'index': operator.index, 'round': round,
+}
+for _name in 'lt le eq ne gt ge'.split():
+    _forwarded[_name] = getattr(operator, '__%s__' % _name)
+for _name in ('add sub mul matmul truediv floordiv mod lshift rshift and xor '
+              'or').split():
+    _forwarded[_name] = getattr(operator, '__%s__' % _name)
+    _forwarded['r' + _name] = _reflected(_forwarded[_name])
+_forwarded.update(divmod=divmod, rdivmod=_reflected(divmod),
+                  pow=pow, rpow=_reflected(pow))
+for _name, _function in _forwarded.items():
+    setattr(LazyOutput, '__%s__' % _name, _forward('__%s__' % _name, _function))
+del _name, _function, _forwarded
+
+
+# The variables the displayhook binds to outputs
+_output_name = re.compile(r'_(_{0,2}|\d+)$')
+
+
+class OutputCache(dict):
+    """The output history (``Out`` and ``_oh``), with a memory budget.
+
+    When :attr:`max_bytes` is set, the sizes of the outputs held in memory are
+    estimated with :func:`estimate_size`. Once they add up to more than
+    ``max_bytes``, the oldest outputs are evicted: pickled to a temporary
+    directory if :attr:`evict` is ``'spill'``, or kept as weak references if it
+    is ``'weakref'``. Outputs which cannot be pickled are kept as weak
+    references, and those which cannot be weakly referenced stay in memory.
+
+    Only outputs which nothing but the output history references are spilled:
+    pickling the others would not free memory, so they are kept as weak
+    references. The output history is this cache, the ``_N``, ``_``, ``__``
+    and ``___`` variables, and the objects returned by :attr:`owners` (the
+    displayhook and the execution results); any other referrer found by
+    :func:`gc.get_referrers` makes an output shared.
+
+    Evicted outputs are replaced with :class:`EvictedOutput` placeholders, and
+    loaded again when accessed by key. Their ``_N`` variables in
+    :attr:`namespace` (and :attr:`hidden_namespace`, where IPython records
+    the variables it defined) are bound to :class:`LazyOutput` objects, which
+    load them when they are used.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(OutputCache, self).__init__(*args, **kwargs)
+        self.max_bytes = 0
+        self.evict = 'spill'
+        self.namespace = None
+        self.hidden_namespace = None
+        self.owners = lambda: []
+        # Estimated sizes of the evictable outputs held in memory, oldest first
+        self.sizes = OrderedDict()
+        self.resident_bytes = 0
+        self._spill_dir = None
+        self._hold_evictions = False
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, EvictedOutput):
+            value = self._reload(key, value)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        self._forget(key)
+        dict.__setitem__(self, key, value)
+        if self.max_bytes:
+            size = estimate_size(value)
+            self.sizes[key] = size
+            self.resident_bytes += size
+            if not self._hold_evictions:
+                self._evict_oldest()
+
+    def __delitem__(self, key):
+        self._forget(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        self._forget(key)
+        return dict.pop(self, key, *default)
+
+    def clear(self):
+        for value in self.values():
+            if isinstance(value, EvictedOutput):
+                value.discard()
+        self.sizes.clear()
+        self.resident_bytes = 0
+        dict.clear(self)
+
+    @property
+    def evicted(self):
+        """The keys of the evicted outputs."""
+        return [k for k, v in self.items() if isinstance(v, EvictedOutput)]
+
+    def _forget(self, key):
+        """Stop accounting for the output stored under key."""
+        if key in self.sizes:
+            self.resident_bytes -= self.sizes.pop(key)
+        old = dict.get(self, key)
+        if isinstance(old, EvictedOutput):
+            old.discard()
+
+    def _evict_oldest(self, keep=1):
+        # The newest outputs are never evicted
+        while self.resident_bytes > self.max_bytes and len(self.sizes) > keep:
+            key, size = self.sizes.popitem(last=False)
+            self.resident_bytes -= size
+            obj = dict.__getitem__(self, key)
+            alias = '_%s' % key
+            # A loop, as a comprehension would hold obj in a closure cell,
+            # which _is_shared would count as a reference
+            bound = []
+            for ns in self._namespaces():
+                if ns.get(alias) is obj:
+                    bound.append(ns)
+            if self.namespace not in bound:
+                alias = None
+            placeholder = self._make_placeholder(key, obj, size, alias,
+                                                 self._is_shared(obj))
+            if placeholder is not None:
+                dict.__setitem__(self, key, placeholder)
+                lazy = LazyOutput(self, key)
+                for ns in bound:
+                    ns[alias] = lazy
+
+    def _is_shared(self, obj):
+        """Whether anything outside the output history references obj.
+
+        References from the frames running this check don't count.
+        """
+        history = {id(self)}
+        for owner in self.owners():
+            history.add(id(owner))
+            # Instances may reference their attributes through their __dict__
+            if getattr(owner, '__dict__', None) is not None:
+                history.add(id(owner.__dict__))
+        # No comprehensions: their closure cells would reference obj
+        for ns in self._namespaces():
+            for name, value in ns.items():
+                if value is obj and not _output_name.match(name):
+                    break
+            else:
+                history.add(id(ns))
+        frame = sys._getframe()
+        while frame is not None:
+            history.add(id(frame))
+            frame = frame.f_back
+        return any(id(r) not in history for r in gc.get_referrers(obj))
+
+    def _make_placeholder(self, key, obj, size, alias, shared=False):
+        if self.evict == 'spill' and not shared:
+            if self._spill_dir is None:
+                self._spill_dir = tempfile.TemporaryDirectory(prefix='ipython-out-')
+            path = os.path.join(self._spill_dir.name, '%s.pickle' % key)
+            try:
+                return SpilledOutput(obj, size, alias, path)
+            except Exception:
+                # Not picklable: fall back to a weak reference
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        try:
+            return WeakOutput(obj, size, alias)
+        except TypeError:
+            return None
+
+    def _reload(self, key, placeholder):
+        try:
+            value = placeholder.load()
+        except KeyError:
+            placeholder.discard()
+            dict.__delitem__(self, key)
+            self._rebind(placeholder.alias)
+            raise KeyError(key) from None
+        self[key] = value
+        self._rebind(placeholder.alias, value)
+        return value
+
+    def _namespaces(self):
+        return [ns for ns in (self.namespace, self.hidden_namespace)
+                if ns is not None]
+
+    def _rebind(self, alias, *value):
+        """Bind the _N variables still bound to a LazyOutput to value, or
+        delete them without a value."""
+        if alias is None:
+            return
+        for ns in self._namespaces():
+            if type(ns.get(alias)) is LazyOutput:
+                if value:
+                    ns[alias] = value[0]
+                else:
+                    del ns[alias]
+
+    def load_referenced(self, source):
+        """Load the evicted outputs whose ``_N`` variable appears in source.
+
+        They are all kept in memory, even if they exceed the budget, while
+        other outputs are evicted to make room for them.
+        """
+        keys = sorted({int(n) for n in re.findall(r'\b_(\d+)\b', source)})
+        if not any(isinstance(dict.get(self, k), EvictedOutput) for k in keys):
+            return
+        self._hold_evictions = True
+        try:
+            for key in keys:
+                if isinstance(dict.get(self, key), EvictedOutput):
+                    try:
+                        self[key]
+                    except KeyError:
+                        pass
+        finally:
+            self._hold_evictions = False
+        used = [k for k in keys if k in self.sizes]
+        for key in used:
+            self.sizes.move_to_end(key)
+        self._evict_oldest(keep=max(len(used), 1))
+
+
 # TODO: Move the various attributes (cache_size, [others now moved]). Some
 # of these are also attributes of InteractiveShell. They should be on ONE object
 # only and the other objects should ask that one object for their values.
@@ -33,6 +446,20 @@ class DisplayHook(Configurable):
                            allow_none=True)
     cull_fraction = Float(0.2)
 
+    output_cache_max_bytes = Integer(0,
+        help="""Memory budget, in bytes, for the outputs kept in the output
+        cache (``Out`` and the ``_N`` variables). Once their estimated size
+        exceeds it, the oldest outputs are evicted (see output_cache_evict),
+        and loaded again when used. 0 (the default) means no limit.
+        """
+    ).tag(config=True)
+    output_cache_evict = Enum(('spill', 'weakref'), default_value='spill',
+        help="""What to do with outputs evicted from the output cache:
+        'spill' pickles them to a temporary file, 'weakref' only keeps a weak
+        reference to them, so they are gone once nothing else uses them.
+        """
+    ).tag(config=True)
+
     def __init__(self, shell=None, cache_size=1000, **kwargs):
         super(DisplayHook, self).__init__(shell=shell, **kwargs)
         cache_size_min = 3
@@ -57,6 +484,41 @@ def __init__(self, shell=None, cache_size=1000, **kwargs):
         # these are deliberately global:
         to_user_ns = {'_':self._,'__':self.__,'___':self.___}
         self.shell.user_ns.update(to_user_ns)
+        self._configure_output_cache()
+
+    @observe('output_cache_max_bytes', 'output_cache_evict')
+    def _output_cache_changed(self, change):
+        self._configure_output_cache()
+
+    @property
+    def output_cache(self):
+        """The output history, if it is an :class:`OutputCache`, else None."""
+        if self.shell is None:
+            return None
+        oh = self.shell.user_ns.get('_oh')
+        return oh if isinstance(oh, OutputCache) else None
+
+    def _configure_output_cache(self):
+        oh = self.output_cache
+        if oh is not None:
+            oh.max_bytes = self.output_cache_max_bytes
+            oh.evict = self.output_cache_evict
+            oh.namespace = self.shell.user_ns
+            oh.hidden_namespace = self.shell.user_ns_hidden
+            oh.owners = self._output_owners
+
+    def _output_owners(self):
+        """The objects through which the displayhook and the shell reference
+        outputs, apart from the output cache and the output variables."""
+        return [self] + [r for r in (self.shell.last_execution_result,
+                                     self.exec_result) if r is not None]
+
+    def load_outputs(self, source):
+        """Load the evicted outputs used by the code about to run."""
+        oh = self.output_cache
+        if oh is not None and oh.max_bytes:
+            self._configure_output_cache()
+            oh.load_referenced(source)
 
     @property
     def prompt_count(self):
@@ -228,6 +690,7 @@ def update_user_ns(self, result):
                 new_result = '_%s' % self.prompt_count
                 to_main[new_result] = result
                 self.shell.push(to_main, interactive=False)
+                self._configure_output_cache()
                 self.shell.user_ns['_oh'][self.prompt_count] = result
 
     def fill_exec_result(self, result):
@@ -241,8 +704,8 @@ def log_output(self, format_dict):
             return
         if self.shell.logger.log_output:
             self.shell.logger.log_write(format_dict['text/plain'], 'output')
-        self.shell.history_manager.output_hist_reprs[self.prompt_count] = \
-                                                    format_dict['text/plain']
+        self.shell.history_manager.store_output_repr(self.prompt_count,
+                                                     format_dict['text/plain'])
 
     def finish_displayhook(self):
         """Finish up all displayhook activities."""
@@ -257,6 +720,8 @@ def __call__(self, result=None):
         """
         self.check_for_underscore()
         if result is not None and not self.quiet():
+            exec_result = self.exec_result
+            start = time.perf_counter()
             self.start_displayhook()
             self.write_output_prompt()
             format_dict, md_dict = self.compute_format_data(result)
@@ -266,6 +731,8 @@ def __call__(self, result=None):
                 self.write_format_data(format_dict, md_dict)
                 self.log_output(format_dict)
             self.finish_displayhook()
+            if exec_result is not None:
+                exec_result._add_timing('displayhook', start)
 
     def cull_cache(self):
         """Output cache is full, cull the oldest entries"""
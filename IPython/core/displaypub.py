@@ -17,9 +17,11 @@
 
 
 import sys
+import threading
+import time
 
 from traitlets.config.configurable import Configurable
-from traitlets import List
+from traitlets import Bool, Dict, Float, List
 
 # This used to be defined here - it is imported for backwards compatibility
 from .display_functions import publish_display_data
@@ -34,11 +36,48 @@ class DisplayPublisher(Configurable):
 
     Instances of this class are created by the main IPython object and should
     be accessed there.
+
+    With :attr:`coalesce_updates`, the updates of a display (see
+    :func:`~IPython.display.update_display`) are published at most
+    :attr:`max_update_rate` times per second. Only the latest update of each
+    display is kept in between, and published once the interval has passed:
+    :attr:`updates_dropped` counts the others, and :attr:`updates_sent` the
+    updates published.
     """
 
+    coalesce_updates = Bool(False,
+        help="""Publish the updates of each display at most max_update_rate
+        times per second, and drop the updates superseded in between. The
+        latest update is published when the interval has passed, from a timer
+        thread, and at the latest before other outputs or at the end of the
+        cell. Updates are formatted when they are made, so an update shows
+        the object as it was then.
+        """
+    ).tag(config=True)
+
+    max_update_rate = Float(10.0,
+        help="""Maximum number of updates per second of each display, with
+        coalesce_updates. At 0, the updates are only published before other
+        outputs and at the end of the cell, and no timer is used.
+        """
+    ).tag(config=True)
+
+    # Counters of the updates dropped and published by publish_update
+    updates_dropped = 0
+    updates_sent = 0
+
+    # display_id -> publish kwargs of the latest update not yet published
+    _pending_updates = Dict()
+    # display_id -> time of the last update published
+    _last_update = Dict()
+
     def __init__(self, shell=None, *args, **kwargs):
         self.shell = shell
         super().__init__(*args, **kwargs)
+        # Guards the pending updates, which the timer also publishes
+        self._update_lock = threading.RLock()
+        self._update_timer = None
+        self._update_due = None
 
     def _validate_data(self, data, metadata=None):
         """Validate the display data.
@@ -115,6 +154,88 @@ def publish(self, data, metadata=None, source=None, *, transient=None, update=Fa
         if 'text/plain' in data:
             print(data['text/plain'])
 
+    def publish_update(self, display_id, data, metadata=None, **kwargs):
+        """Publish an update of the display display_id.
+
+        Parameters
+        ----------
+        display_id : str
+            The id of the display to update.
+        data, metadata : dict
+            The format and metadata dicts of the update, as for :meth:`publish`.
+        **kwargs
+            Passed to :meth:`publish`, with ``update=True``.
+        """
+        kwargs.update(data=data, metadata=metadata, update=True)
+        if not self.coalesce_updates:
+            self._publish_update(display_id, kwargs)
+            return
+        with self._update_lock:
+            if self._pending_updates.pop(display_id, None) is not None:
+                self.updates_dropped += 1
+            self._pending_updates[display_id] = kwargs
+            self._publish_due_updates()
+
+    def flush_updates(self):
+        """Publish the pending updates, in the order they were made."""
+        with self._update_lock:
+            self._cancel_update_timer()
+            while self._pending_updates:
+                display_id = next(iter(self._pending_updates))
+                self._publish_update(display_id,
+                                     self._pending_updates.pop(display_id))
+            # Forget the displays which may be updated right away
+            if self._last_update:
+                now = time.monotonic()
+                interval = self._update_interval()
+                self._last_update = {display_id: t for display_id, t
+                                     in self._last_update.items()
+                                     if now - t < interval}
+
+    def _update_interval(self):
+        return 1 / self.max_update_rate if self.max_update_rate > 0 else 0
+
+    def _publish_due_updates(self):
+        """Publish the pending updates whose interval has passed.
+
+        A timer is started to publish the others when theirs passes.
+        """
+        if self.max_update_rate <= 0:
+            return
+        now = time.monotonic()
+        interval = self._update_interval()
+        due = None
+        for display_id in list(self._pending_updates):
+            t = self._last_update.get(display_id)
+            if t is None or now - t >= interval:
+                self._publish_update(display_id,
+                                     self._pending_updates.pop(display_id))
+            elif due is None or t + interval < due:
+                due = t + interval
+        if due is not None and (self._update_due is None
+                                or due < self._update_due):
+            self._cancel_update_timer()
+            self._update_due = due
+            self._update_timer = threading.Timer(due - now, self._on_update_timer)
+            self._update_timer.daemon = True
+            self._update_timer.start()
+
+    def _on_update_timer(self):
+        with self._update_lock:
+            if self._update_timer is threading.current_thread():
+                self._update_timer = self._update_due = None
+            self._publish_due_updates()
+
+    def _cancel_update_timer(self):
+        if self._update_timer is not None:
+            self._update_timer.cancel()
+            self._update_timer = self._update_due = None
+
+    def _publish_update(self, display_id, kwargs):
+        self._last_update[display_id] = time.monotonic()
+        self.updates_sent += 1
+        self.publish(**kwargs)
+
     def clear_output(self, wait=False):
         """Clear the output of the cell receiving output."""
         print('\033[2K\r', end='')
@@ -25,7 +25,7 @@
 from ..utils.dir2 import get_real_method
 from ..lib import pretty
 from traitlets import (
-    Bool, Dict, Integer, Unicode, CUnicode, ObjectName, List,
+    Bool, Dict, Integer, Unicode, CUnicode, ObjectName, List, Type,
     ForwardDeclaredInstance,
     default, observe,
 )
@@ -86,6 +86,37 @@ def _formatters_default(self):
             d[f.format_type] = f
         return d
 
+    # The MIME types consumed by each frontend showing the outputs, by name.
+    consumers = Dict()
+
+    def register_consumer(self, name, mime_types):
+        """Declare the MIME types a frontend can display.
+
+        Once consumers are registered, :meth:`format` only computes the
+        format types at least one of them consumes, unless it is given
+        ``include``. The other representations can be computed later,
+        with :meth:`LazyFormatDict.compute`.
+
+        Parameters
+        ----------
+        name : str
+            Identifies the consumer, to replace or unregister its MIME types.
+        mime_types : list, tuple or set
+            The format types (MIME types) the consumer can display.
+        """
+        self.consumers[name] = frozenset(mime_types)
+
+    def unregister_consumer(self, name):
+        """Forget the MIME types registered by a consumer."""
+        self.consumers.pop(name, None)
+
+    @property
+    def consumed_types(self):
+        """The MIME types consumed by the registered consumers, or None if
+        there are none, in which case all active types are computed."""
+        consumed = frozenset().union(*self.consumers.values())
+        return consumed or None
+
     def format(self, obj, include=None, exclude=None):
         """Return a format data dict for an object.
 
@@ -140,13 +171,21 @@ def format(self, obj, include=None, exclude=None):
             not be called.
 
         """
-        format_dict = {}
-        md_dict = {}
-        
         if self.ipython_display_formatter(obj):
             # object handled itself, don't proceed
             return {}, {}
 
+        if include is None:
+            consumed = self.consumed_types
+            if consumed is not None:
+                format_dict, md_dict = self._format(obj, consumed, exclude)
+                format_dict = LazyFormatDict(format_dict, obj, self, md_dict,
+                                             consumed, exclude)
+                return format_dict, md_dict
+        return self._format(obj, include, exclude)
+
+    def _format(self, obj, include=None, exclude=None):
+        """Compute the format data, once _ipython_display_ declined."""
         format_dict, md_dict = self.mimebundle_formatter(obj, include=include, exclude=exclude)
 
         if format_dict or md_dict:
@@ -198,6 +237,50 @@ def format_types(self):
         return list(self.formatters.keys())
 
 
+class LazyFormatDict(dict):
+    """A format data dict with only some representations of an object.
+
+    :meth:`DisplayFormatter.format` returns it when frontends registered the
+    MIME types they consume (see :meth:`DisplayFormatter.register_consumer`).
+    It only holds those types, but keeps a reference to the object, so that
+    :meth:`compute` can add the other representations if they are needed.
+    Copies and pickles of it are plain dicts.
+    """
+
+    def __init__(self, data, obj, formatter, metadata, computed, exclude=None):
+        super(LazyFormatDict, self).__init__(data)
+        self.metadata = metadata
+        self._obj = obj
+        self._formatter = formatter
+        # The MIME types already asked for, or None once all were
+        self._computed = set(computed)
+        self._exclude = exclude
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+    def compute(self, mime_types=None):
+        """Add the given representations, or all the missing ones, to the
+        format data and its metadata. Return self.
+        """
+        if self._computed is None:
+            return self
+        if mime_types is None:
+            include = None
+            exclude = self._computed.union(self._exclude or ())
+            self._computed = None
+        else:
+            include = set(mime_types) - self._computed
+            if not include:
+                return self
+            exclude = self._exclude
+            self._computed.update(include)
+        data, md = self._formatter._format(self._obj, include, exclude)
+        self.update(data)
+        self.metadata.update(md)
+        return self
+
+
 #-----------------------------------------------------------------------------
 # Formatters for specific format types (text, html, svg, etc.)
 #-----------------------------------------------------------------------------
@@ -283,6 +366,11 @@ def _get_type(obj):
 Raise KeyError in `BaseFormatter.pop` if passed as the default value to `pop`
 """)
 
+_no_printer = Sentinel('_no_printer', __name__,
+"""
+Cached result of `BaseFormatter.lookup_by_type` for types without a printer
+""")
+
 
 class BaseFormatter(Configurable):
     """A base formatter class that is configurable.
@@ -327,6 +415,25 @@ class BaseFormatter(Configurable):
     # The deferred-import type-specific printers.
     # Map (modulename, classname) pairs to the format functions.
     deferred_printers = Dict().tag(config=True)
+
+    # Number of types whose lookup is cached, before the cache is cleared.
+    type_cache_size = 1000
+
+    def __init__(self, **kwargs):
+        # Map types to the class of their MRO which has a printer, or
+        # _no_printer. The sizes of type_printers and deferred_printers are
+        # kept to notice when the dicts are changed directly.
+        self._type_cache = {}
+        self._type_cache_sizes = None
+        super(BaseFormatter, self).__init__(**kwargs)
+
+    @observe('type_printers', 'deferred_printers')
+    def _printers_changed(self, change):
+        self._clear_type_cache()
+
+    def _clear_type_cache(self):
+        self._type_cache.clear()
+        self._type_cache_sizes = None
     
     @catch_format_error
     def __call__(self, obj):
@@ -421,13 +528,39 @@ def lookup_by_type(self, typ):
             else:
                 return self.deferred_printers[typ_key]
         else:
-            for cls in pretty._get_mro(typ):
-                if cls in self.type_printers or self._in_deferred_types(cls):
-                    return self.type_printers[cls]
+            cls = self._resolve_type(typ)
+            if cls is not _no_printer:
+                return self.type_printers[cls]
         
         # If we have reached here, the lookup failed.
         raise KeyError("No registered printer for {0!r}".format(typ))
 
+    def _resolve_type(self, typ):
+        """Return the first class in the MRO of typ with a printer in
+        type_printers, or _no_printer.
+
+        The result is cached until printers are registered or removed.
+        """
+        sizes = (len(self.type_printers), len(self.deferred_printers))
+        if sizes != self._type_cache_sizes:
+            self._type_cache.clear()
+            self._type_cache_sizes = sizes
+        cls = self._type_cache.get(typ)
+        if cls is not None and (cls is _no_printer or cls in self.type_printers):
+            return cls
+        cls = _no_printer
+        for base in pretty._get_mro(typ):
+            if base in self.type_printers or self._in_deferred_types(base):
+                cls = base
+                break
+        if len(self._type_cache) >= self.type_cache_size:
+            self._type_cache.clear()
+        # Moving a deferred printer changed the sizes
+        self._type_cache_sizes = (len(self.type_printers),
+                                  len(self.deferred_printers))
+        self._type_cache[typ] = cls
+        return cls
+
     def for_type(self, typ, func=None):
         """Add a format function for a given type.
         
@@ -464,6 +597,7 @@ def for_type(self, typ, func=None):
         
         if func is not None:
             self.type_printers[typ] = func
+            self._clear_type_cache()
         
         return oldfunc
 
@@ -504,6 +638,7 @@ def for_type_by_name(self, type_module, type_name, func=None):
         
         if func is not None:
             self.deferred_printers[key] = func
+            self._clear_type_cache()
         return oldfunc
     
     def pop(self, typ, default=_raise_key_error):
@@ -543,6 +678,7 @@ def pop(self, typ, default=_raise_key_error):
                 old = self.type_printers.pop(typ)
             else:
                 old = self.deferred_printers.pop(_mod_name_key(typ), default)
+        self._clear_type_cache()
         if old is _raise_key_error:
             raise KeyError("No registered value for {0!r}".format(typ))
         return old
@@ -601,6 +737,30 @@ def dtype_pprinter(obj, p, cycle):
         Set to 0 to disable truncation.
         """
     ).tag(config=True)
+
+    max_chars = Integer(1000000,
+        help="""Stop pretty printing an object after this many characters,
+        without computing the rest of its representation.
+
+        Set to 0 to disable truncation.
+        """
+    ).tag(config=True)
+
+    max_depth = Integer(0,
+        help="""Abbreviate the objects nested deeper than this many levels,
+        e.g. as [...] or {...}.
+
+        Set to 0 to disable abbreviation.
+        """
+    ).tag(config=True)
+
+    printer_class = Type(pretty.RepresentationPrinter,
+        klass=pretty.RepresentationPrinter,
+        help="""The class of the pretty printer. Use
+        IPython.lib.pretty.IterativeRepresentationPrinter to print deeply
+        nested lists, tuples, sets and dicts without recursion errors.
+        """
+    ).tag(config=True)
     
     # Look for a _repr_pretty_ methods to use for pretty printing.
     print_method = ObjectName('_repr_pretty_')
@@ -693,9 +853,11 @@ def __call__(self, obj):
             return repr(obj)
         else:
             stream = StringIO()
-            printer = pretty.RepresentationPrinter(stream, self.verbose,
+            printer = self.printer_class(stream, self.verbose,
                 self.max_width, self.newline,
                 max_seq_length=self.max_seq_length,
+                max_chars=self.max_chars,
+                max_depth=self.max_depth,
                 singleton_pprinters=self.singleton_printers,
                 type_pprinters=self.type_printers,
                 deferred_pprinters=self.deferred_printers)
@@ -9,15 +9,20 @@
 import os
 import re
 import sqlite3
+import sys
+import tempfile
 import threading
+import zlib
+from urllib.request import pathname2url
 
 from traitlets.config.configurable import LoggingConfigurable
 from decorator import decorator
+from IPython.core.displayhook import OutputCache
 from IPython.utils.decorators import undoc
 from IPython.paths import locate_profile
 from traitlets import (
-    Any, Bool, Dict, Instance, Integer, List, Unicode, TraitError,
-    default, observe,
+    Any, Bool, CaselessStrEnum, Dict, Instance, Integer, List, Unicode,
+    TraitError, default, observe,
 )
 
 #-----------------------------------------------------------------------------
@@ -51,10 +56,116 @@ def only_when_enabled(f, self, *a, **kw):
         return f(self, *a, **kw)
 
 
+# The phases of running a cell, as in ExecutionResult.timings, in the order of
+# the columns of the cell_timings table.
+TIMING_PHASES = ('transform', 'parse', 'ast_transform', 'compile', 'execute',
+                 'displayhook', 'history')
+
+# The resources used by a cell, as recorded by IPython.core.cellstats, in the
+# order of the columns of the cell_stats table, with their SQL types.
+STAT_COLUMNS = (('wall', 'real'), ('cpu', 'real'), ('rss_delta', 'integer'),
+                ('malloc_peak', 'integer'), ('top_allocations', 'text'))
+STAT_METRICS = tuple(name for name, type_ in STAT_COLUMNS if type_ != 'text')
+
+# FTS5 rowids for the search index pack (session, line) into one integer, so
+# that index entries can be found (and deleted) without a table scan.
+_FTS_LINE_BITS = 32
+_FTS_LINE_MASK = (1 << _FTS_LINE_BITS) - 1
+
+# A glob pattern can only be narrowed down by the trigram index if it holds at
+# least three consecutive literal characters.
+_glob_class_re = re.compile(r"\[[^\]]*\]")
+_glob_literal_run_re = re.compile(r"[^*?\[\]]{3}")
+
+
+def _glob_uses_index(pattern):
+    """Return True if a GLOB pattern is selective enough for the FTS index."""
+    return bool(_glob_literal_run_re.search(_glob_class_re.sub("?", pattern)))
+
+
+# Archive shards hold a contiguous range of sessions, named after it
+_archive_re = re.compile(r"^history-(\d+)-(\d+)\.sqlite$")
+
+# Sessions which may still be running, possibly in another process: they have
+# no end yet, and started after a limit or are the current session. Older
+# sessions with no end were left by processes which crashed or were killed.
+# Takes the limit and the current session as parameters.
+_running_sql = """SELECT session FROM sessions WHERE end IS NULL
+    AND (start >= ? OR session == ?)"""
+
+# The sessions of a range which may be archived, those not running.
+_archivable_sql = "session BETWEEN ? AND ? AND session NOT IN (%s)" % _running_sql
+
+
+def _merge_search_results(rows, n, unique, output):
+    """Combine search results from several databases, as a single search
+    over all of them would have returned them."""
+    rows.sort(key=lambda row: row[:2])
+    if unique:
+        # keep the most recent occurrence of each input
+        seen = set()
+        unique_rows = []
+        for row in reversed(rows):
+            text = row[2][0] if output else row[2]
+            if text not in seen:
+                seen.add(text)
+                unique_rows.append(row)
+        rows = unique_rows[::-1]
+    if n is not None:
+        rows = rows[len(rows) - n:] if n else []
+    return rows
+
+
+def _zip_text(text):
+    """Compress a string for storage in a history archive."""
+    if text is None:
+        return None
+    return zlib.compress(text.encode('utf-8'))
+
+
+def _unzip_text(data):
+    """Decompress a string stored with :func:`_zip_text`."""
+    if data is None:
+        return None
+    return zlib.decompress(data).decode('utf-8')
+
+
+def _load_output(data):
+    """Return an output read from the database, which may be compressed."""
+    if isinstance(data, bytes):
+        return _unzip_text(data)
+    return data
+
+
+def _truncate_middle(text, max_length):
+    """Shorten text to about max_length characters, keeping its head and
+    tail around a marker saying how much was left out."""
+    if len(text) <= max_length:
+        return text
+    head = max_length // 2
+    tail = max_length - head
+    return "%s\n...[%d characters truncated]...\n%s" % (
+        text[:head], len(text) - head - tail, text[len(text) - tail:])
+
+
 # use 16kB as threshold for whether a corrupt history db should be saved
 # that should be at least 100 entries or so
 _SAVE_DB_SIZE = 16384
 
+def _open_archive_db(path):
+    """Open an archive shard read-only, with decompressing views laid out like
+    the tables of the main database."""
+    db = sqlite3.connect('file:%s?mode=ro' % pathname2url(path), uri=True,
+            detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+    db.create_function('_unzip', 1, _unzip_text)
+    db.execute("""CREATE TEMP VIEW history AS SELECT session, line,
+               _unzip(source) AS source, _unzip(source_raw) AS source_raw
+               FROM main.history_z""")
+    db.execute("""CREATE TEMP VIEW output_history AS SELECT session,
+               line, _unzip(output) AS output FROM main.output_history_z""")
+    return db
+
+
 @decorator
 def catch_corrupt_db(f, self, *a, **kw):
     """A decorator which wraps HistoryAccessor method calls to catch errors from
@@ -164,6 +275,20 @@ class HistoryAccessor(HistoryAccessorBase):
         """
     ).tag(config=True)
 
+    fts_index = Bool(False,
+        help="""Maintain a full-text index of the history for searching.
+
+        If True, and the SQLite library supports FTS5 with the trigram
+        tokenizer, a shadow index of all inputs is created and kept in sync
+        with triggers. Searches with ``%history -g``, ``%recall`` and
+        ``%rerun -g`` then look up matching lines in the index instead of
+        scanning the whole history table. This makes the history file larger.
+        """
+    ).tag(config=True)
+
+    # Whether the full-text search index exists and can be queried
+    _fts_available = False
+
     # The SQLite database
     db = Any()
     @observe('db')
@@ -191,6 +316,8 @@ def __init__(self, profile='default', hist_file=u'', **traits):
         """
         # We need a pointer back to the shell for various tasks.
         super(HistoryAccessor, self).__init__(**traits)
+        # Read-only connections to archive shards, keyed by path
+        self._archive_dbs = {}
         # defer setting hist_file from kwarg until after init,
         # otherwise the default kwarg value would clobber any value
         # set by config
@@ -227,6 +354,7 @@ def init_db(self):
         kwargs = dict(detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
         kwargs.update(self.connection_options)
         self.db = sqlite3.connect(self.hist_file, **kwargs)
+        self._configure_connection(self.db)
         self.db.execute("""CREATE TABLE IF NOT EXISTS sessions (session integer
                         primary key autoincrement, start timestamp,
                         end timestamp, num_cmds integer, remark text)""")
@@ -238,10 +366,283 @@ def init_db(self):
         self.db.execute("""CREATE TABLE IF NOT EXISTS output_history
                         (session integer, line integer, output text,
                         PRIMARY KEY (session, line))""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS cell_timings
+                        (session integer, line integer, %s,
+                        PRIMARY KEY (session, line))"""
+                        % ", ".join("%s real" % p for p in TIMING_PHASES))
+        self.db.execute("""CREATE TABLE IF NOT EXISTS cell_stats
+                        (session integer, line integer, %s,
+                        PRIMARY KEY (session, line))"""
+                        % ", ".join("%s %s" % col for col in STAT_COLUMNS))
+        self._fts_available = self.fts_index and self._init_fts()
         self.db.commit()
         # success! reset corrupt db count
         self._corrupt_db_counter = 0
 
+    def _init_fts(self):
+        """Create the full-text search index and the triggers keeping it in
+        sync with the history table.
+
+        Returns False if this SQLite build does not support FTS5 with the
+        trigram tokenizer, in which case searches fall back to table scans.
+        """
+        rowid = "(({0}.session << {1}) | {0}.line)".format
+        try:
+            exists = self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='history_fts'"
+            ).fetchone()
+            if exists:
+                return True
+            self.db.execute("""CREATE VIRTUAL TABLE history_fts USING fts5
+                            (source, source_raw,
+                            tokenize='trigram case_sensitive 1')""")
+        except sqlite3.OperationalError as e:
+            self.log.debug("History search index not available: %s", e)
+            return False
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_insert
+                        AFTER INSERT ON history BEGIN
+                        INSERT INTO history_fts (rowid, source, source_raw)
+                        VALUES (%s, new.source, new.source_raw); END""" % rowid('new', _FTS_LINE_BITS))
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_delete
+                        AFTER DELETE ON history BEGIN
+                        DELETE FROM history_fts WHERE rowid = %s; END""" % rowid('old', _FTS_LINE_BITS))
+        self.db.execute("""CREATE TRIGGER IF NOT EXISTS history_fts_update
+                        AFTER UPDATE ON history BEGIN
+                        DELETE FROM history_fts WHERE rowid = %s;
+                        INSERT INTO history_fts (rowid, source, source_raw)
+                        VALUES (%s, new.source, new.source_raw); END""" % (
+                            rowid('old', _FTS_LINE_BITS), rowid('new', _FTS_LINE_BITS)))
+        # Index the history recorded before the index was created
+        self.db.execute("""INSERT INTO history_fts (rowid, source, source_raw)
+                        SELECT %s, source, source_raw FROM history"""
+                        % rowid('history', _FTS_LINE_BITS))
+        return True
+
+    def _configure_connection(self, conn):
+        """Overridden by HistoryManager to set up connections for writing."""
+        pass
+
+    ## -------------------------
+    ## Archives of old sessions:
+    ## -------------------------
+    def _get_archive_dir(self):
+        """The directory holding the archive shards of this history file."""
+        return os.path.splitext(self.hist_file)[0] + '-archive'
+
+    def _list_archives(self):
+        """Return (first session, last session, path) for each archive shard,
+        oldest first."""
+        if not self.enabled or self.hist_file == ':memory:':
+            return []
+        archive_dir = self._get_archive_dir()
+        try:
+            names = os.listdir(archive_dir)
+        except OSError:
+            return []
+        archives = []
+        for name in names:
+            m = _archive_re.match(name)
+            if m:
+                archives.append((int(m.group(1)), int(m.group(2)),
+                                 os.path.join(archive_dir, name)))
+        return sorted(archives)
+
+    def _get_archive_db(self, path):
+        """Return the connection to an archive shard (see
+        :func:`_open_archive_db`)."""
+        db = self._archive_dbs.get(path)
+        if db is None:
+            db = self._archive_dbs[path] = _open_archive_db(path)
+        return db
+
+    def _get_db_for_session(self, session):
+        """Return the connection to the database holding a session."""
+        archives = [path for first, last, path in self._list_archives()
+                    if first <= session <= last]
+        if not archives:
+            return self.db
+        # Sessions which were running when their neighbours were archived
+        # stay in the main database, and may be archived later on their own.
+        query = "SELECT 1 FROM sessions WHERE session == ?"
+        if self.db.execute(query, (session,)).fetchone():
+            return self.db
+        for path in archives:
+            db = self._get_archive_db(path)
+            if db.execute(query, (session,)).fetchone():
+                return db
+        return self._get_archive_db(archives[0])
+
+    def _running_params(self, stale_days):
+        """The parameters of _running_sql: sessions with no end which started
+        more than stale_days ago are not running, except the current one."""
+        limit = datetime.datetime.now() - datetime.timedelta(days=stale_days)
+        return (limit, getattr(self, 'session_number', None))
+
+    def _archive_cutoff(self, conn, running, keep_days=0, keep_sessions=0,
+                        max_bytes=0):
+        """Return the newest session that the retention limits archive, or
+        None. The newest session in the database is never archived, nor are
+        sessions still running (see compact), given by the parameters of
+        _running_sql."""
+        cutoffs = []
+        if keep_days:
+            limit = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+            # Sessions which never ended are dated by their start
+            cutoffs.append(conn.execute("""SELECT max(session) FROM sessions
+                    WHERE COALESCE(end, start) < ? AND session NOT IN (%s)"""
+                    % _running_sql, (limit,) + tuple(running)).fetchone()[0])
+        if keep_sessions:
+            row = conn.execute("""SELECT session FROM sessions
+                    ORDER BY session DESC LIMIT 1 OFFSET ?""",
+                    (keep_sessions,)).fetchone()
+            cutoffs.append(row and row[0])
+        if max_bytes:
+            # Walk the sessions newest first, without loading them all.
+            cur = conn.execute("""SELECT session,
+                (SELECT COALESCE(SUM(length(source) + length(source_raw)), 0)
+                 FROM history WHERE history.session == sessions.session) +
+                (SELECT COALESCE(SUM(length(output)), 0) FROM output_history
+                 WHERE output_history.session == sessions.session)
+                FROM sessions ORDER BY session DESC""")
+            total = 0
+            for i, (session, size) in enumerate(cur):
+                total += size
+                if total > max_bytes and i:
+                    cutoffs.append(session)
+                    break
+        cutoffs = [c for c in cutoffs if c is not None]
+        if not cutoffs:
+            return None
+        newest, = conn.execute("SELECT max(session) FROM sessions").fetchone()
+        return min(max(cutoffs), newest - 1)
+
+    def _write_archive(self, conn, first, last, running, chunk_size=1000):
+        """Copy the sessions first to last which are not running (given by
+        the parameters of _running_sql) into a new compressed archive
+        shard."""
+        archive_dir = self._get_archive_dir()
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, 'history-%d-%d.sqlite' % (first, last))
+        copies = [
+            ("SELECT * FROM sessions WHERE " + _archivable_sql,
+             "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+             lambda row: row),
+            ("""SELECT session, line, source, source_raw FROM history
+             WHERE """ + _archivable_sql,
+             "INSERT INTO history_z VALUES (?, ?, ?, ?)",
+             lambda row: row[:2] + (_zip_text(row[2]), _zip_text(row[3]))),
+            ("""SELECT session, line, output FROM output_history
+             WHERE """ + _archivable_sql,
+             "INSERT INTO output_history_z VALUES (?, ?, ?)",
+             lambda row: row[:2] + (row[2] if isinstance(row[2], bytes)
+                                    else _zip_text(row[2]),)),
+        ]
+        # A name of our own, in case another process is compacting too
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.',
+                                        suffix='.tmp', dir=archive_dir)
+        os.close(fd)
+        archive = sqlite3.connect(tmp_path)
+        try:
+            archive.execute("""CREATE TABLE sessions (session integer
+                        primary key autoincrement, start timestamp,
+                        end timestamp, num_cmds integer, remark text)""")
+            archive.execute("""CREATE TABLE history_z
+                    (session integer, line integer, source blob,
+                    source_raw blob, PRIMARY KEY (session, line))""")
+            archive.execute("""CREATE TABLE output_history_z
+                        (session integer, line integer, output blob,
+                        PRIMARY KEY (session, line))""")
+            for select, insert, convert in copies:
+                cur = conn.execute(select, (first, last) + tuple(running))
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    archive.executemany(insert, [convert(r) for r in rows])
+            archive.commit()
+            archive.close()
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, path)
+        except BaseException:
+            archive.close()
+            os.remove(tmp_path)
+            raise
+        return path
+
+    def compact(self, keep_days=0, keep_sessions=0, max_bytes=0,
+                batch_sessions=100, vacuum=False, conn=None, stale_days=7):
+        """Move old sessions into compressed, read-only archive databases.
+
+        Archived sessions can still be retrieved and searched through this
+        class. Sessions are moved in batches, each into its own archive shard,
+        so that memory use does not depend on the size of the history, and an
+        interrupted compaction can simply be run again. Each batch holds a
+        write lock on the database, so processes compacting the same history
+        at once don't archive the same sessions twice. Sessions which have not
+        ended, such as those of other running IPython processes, are kept in
+        the main database, unless they started more than stale_days ago: those
+        were left by processes which crashed or were killed. The current
+        session is always kept.
+
+        Parameters
+        ----------
+        keep_days : int
+          Archive sessions which ended more than this many days ago.
+        keep_sessions : int
+          Keep at most this many recent sessions in the main database.
+        max_bytes : int
+          Archive the oldest sessions until the inputs and outputs left in the
+          main database take up at most about this many bytes.
+        batch_sessions : int
+          Number of sessions moved into each archive shard.
+        vacuum : bool
+          If True, vacuum the main database afterwards, to give the freed
+          space back to the filesystem.
+        conn : sqlite3.Connection, optional
+          Connection to the main database, if not the default one.
+        stale_days : int
+          Sessions with no end which started more than this many days ago
+          are treated as ended at their start.
+
+        Limits which are 0 are not applied.
+
+        Returns
+        -------
+        The number of sessions archived.
+        """
+        if not self.enabled or self.hist_file == ':memory:':
+            return 0
+        if conn is None:
+            conn = self.db
+        running = self._running_params(stale_days)
+        cutoff = self._archive_cutoff(conn, running, keep_days, keep_sessions,
+                                      max_bytes)
+        if cutoff is None:
+            return 0
+        archived = 0
+        conn.commit()
+        while True:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                sessions = conn.execute("""SELECT session FROM sessions
+                        WHERE session <= ? AND session NOT IN (%s)
+                        ORDER BY session LIMIT ?""" % _running_sql,
+                        (cutoff,) + running + (batch_sessions,)).fetchall()
+                if not sessions:
+                    break
+                first, last = sessions[0][0], sessions[-1][0]
+                self._write_archive(conn, first, last, running)
+                # sessions goes last, as _archivable_sql looks it up
+                for table in ('history', 'output_history', 'cell_timings',
+                              'cell_stats', 'sessions'):
+                    conn.execute("DELETE FROM %s WHERE %s"
+                                 % (table, _archivable_sql),
+                                 (first, last) + running)
+            archived += len(sessions)
+        if archived and vacuum:
+            conn.execute("VACUUM")
+        return archived
+
     def writeout_cache(self):
         """Overridden by HistoryManager to dump the cache before certain
         database lookups."""
@@ -250,7 +651,7 @@ def writeout_cache(self):
     ## -------------------------------
     ## Methods for retrieving history:
     ## -------------------------------
-    def _run_sql(self, sql, params, raw=True, output=False):
+    def _run_sql(self, sql, params, raw=True, output=False, db=None):
         """Prepares and runs an SQL query for the history database.
 
         Parameters
@@ -261,6 +662,8 @@ def _run_sql(self, sql, params, raw=True, output=False):
           Parameters passed to the SQL query (to replace "?")
         raw, output : bool
           See :meth:`get_range`
+        db : sqlite3.Connection, optional
+          The database to query, e.g. an archive. Defaults to the main one.
 
         Returns
         -------
@@ -271,10 +674,13 @@ def _run_sql(self, sql, params, raw=True, output=False):
         if output:
             sqlfrom = "history LEFT JOIN output_history USING (session, line)"
             toget = "history.%s, output_history.output" % toget
-        cur = self.db.execute("SELECT session, line, %s FROM %s " %\
+        if db is None:
+            db = self.db
+        cur = db.execute("SELECT session, line, %s FROM %s " %\
                                 (toget, sqlfrom) + sql, params)
-        if output:    # Regroup into 3-tuples, and parse JSON
-            return ((ses, lin, (inp, out)) for ses, lin, inp, out in cur)
+        if output:    # Regroup into 3-tuples, and decompress outputs
+            return ((ses, lin, (inp, _load_output(out)))
+                    for ses, lin, inp, out in cur)
         return cur
 
     @only_when_enabled
@@ -303,7 +709,8 @@ def get_session_info(self, session):
            A manually set description.
         """
         query = "SELECT * from sessions where session == ?"
-        return self.db.execute(query, (session,)).fetchone()
+        db = self._get_db_for_session(session)
+        return db.execute(query, (session,)).fetchone()
 
     @catch_corrupt_db
     def get_last_session_id(self):
@@ -316,7 +723,8 @@ def get_last_session_id(self):
             return record[0]
 
     @catch_corrupt_db
-    def get_tail(self, n=10, raw=True, output=False, include_latest=False):
+    def get_tail(self, n=10, raw=True, output=False, include_latest=False,
+                 before=None):
         """Get the last n lines from the history database.
 
         Parameters
@@ -329,19 +737,49 @@ def get_tail(self, n=10, raw=True, output=False, include_latest=False):
           If False (default), n+1 lines are fetched, and the latest one
           is discarded. This is intended to be used where the function
           is called by a user command, which it should not return.
+        before : tuple, optional
+          ``(session, line)``: only get the lines before this one, e.g. to
+          page through the history from the end.
 
         Returns
         -------
         Tuples as :meth:`get_range`
         """
         self.writeout_cache()
+        return self._get_tail(n, raw, output, include_latest, before)
+
+    def _get_tail(self, n, raw=True, output=False, include_latest=False,
+                  before=None, db=None, get_archive_db=None):
+        """:meth:`get_tail`, on other connections than the accessor's.
+
+        ``db`` is the connection to the main database, and
+        ``get_archive_db(path)`` returns the connection to an archive shard.
+        Unlike get_tail, this doesn't move the database away on errors.
+        """
+        if get_archive_db is None:
+            get_archive_db = self._get_archive_db
         if not include_latest:
             n += 1
-        cur = self._run_sql("ORDER BY session DESC, line DESC LIMIT ?",
-                                (n,), raw=raw, output=output)
+        sql = "ORDER BY session DESC, line DESC LIMIT ?"
+        params = (n,)
+        if before is not None:
+            sql = "WHERE (session, line) < (?, ?) " + sql
+            params = tuple(before) + params
+        rows = list(self._run_sql(sql, params, raw=raw, output=output, db=db))
+        for first, last, path in reversed(self._list_archives()):
+            # Sessions left running when archiving may be older than
+            # archived ones, so the shards overlapping the rows are merged.
+            if len(rows) >= n and rows[n - 1][0] > last:
+                break
+            if before is not None and first > before[0]:
+                continue
+            rows.extend(self._run_sql(sql, params, raw=raw, output=output,
+                                      db=get_archive_db(path)))
+            rows.sort(key=lambda row: row[:2], reverse=True)
+            del rows[n:]
         if not include_latest:
-            return reversed(list(cur)[1:])
-        return reversed(list(cur))
+            return reversed(rows[1:])
+        return reversed(rows)
 
     @catch_corrupt_db
     def search(self, pattern="*", raw=True, search_raw=True,
@@ -349,6 +787,10 @@ def search(self, pattern="*", raw=True, search_raw=True,
         """Search the database using unix glob-style matching (wildcards
         * and ?).
 
+        If the full-text index is enabled (see :attr:`fts_index`), patterns
+        containing at least three consecutive literal characters are looked up
+        in the index, otherwise the whole history table is scanned.
+
         Parameters
         ----------
         pattern : str
@@ -367,20 +809,38 @@ def search(self, pattern="*", raw=True, search_raw=True,
         -------
         Tuples as :meth:`get_range`
         """
-        tosearch = "source_raw" if search_raw else "source"
-        if output:
-            tosearch = "history." + tosearch
+        column = "source_raw" if search_raw else "source"
+        tosearch = "history." + column if output else column
         self.writeout_cache()
-        sqlform = "WHERE %s GLOB ?" % tosearch
+        use_index = self._fts_available and _glob_uses_index(pattern)
+        globform = "WHERE %s GLOB ?" % tosearch
+        if use_index:
+            # The trigram index narrows down the candidates, and the GLOB on
+            # the index table then checks them exactly.
+            sqlform = ("WHERE (history.session, history.line) IN "
+                       "(SELECT rowid >> %d, rowid & %d FROM history_fts "
+                       "WHERE history_fts.%s GLOB ?)" % (
+                           _FTS_LINE_BITS, _FTS_LINE_MASK, column))
+        else:
+            sqlform = globform
         params = (pattern,)
+        tail = ""
         if unique:
-            sqlform += ' GROUP BY {0}'.format(tosearch)
+            tail += ' GROUP BY {0}'.format(tosearch)
         if n is not None:
-            sqlform += " ORDER BY session DESC, line DESC LIMIT ?"
+            tail += " ORDER BY session DESC, line DESC LIMIT ?"
             params += (n,)
-        elif unique:
-            sqlform += " ORDER BY session, line"
-        cur = self._run_sql(sqlform, params, raw=raw, output=output)
+        elif unique or use_index:
+            tail += " ORDER BY session, line"
+        cur = self._run_sql(sqlform + tail, params, raw=raw, output=output)
+        archives = self._list_archives()
+        if archives:
+            # Archives have no full-text index
+            rows = list(cur)
+            for first, last, path in archives:
+                rows.extend(self._run_sql(globform + tail, params, raw=raw,
+                            output=output, db=self._get_archive_db(path)))
+            return iter(_merge_search_results(rows, n, unique, output))
         if n is not None:
             return reversed(list(cur))
         return cur
@@ -421,7 +881,86 @@ def get_range(self, session, start=1, stop=None, raw=True,output=False):
             params = (session, start)
 
         return self._run_sql("WHERE session==? AND %s" % lineclause,
-                                    params, raw=raw, output=output)
+                                    params, raw=raw, output=output,
+                                    db=self._get_db_for_session(session))
+
+    @catch_corrupt_db
+    def get_timings(self, session, start=1, stop=None):
+        """Retrieve the execution timings stored for a session.
+
+        Timings are only stored when :attr:`HistoryManager.db_log_timings` is
+        enabled, and are not kept for archived sessions.
+
+        Parameters
+        ----------
+        session : int
+            Session number to retrieve.
+        start : int
+            First line to retrieve.
+        stop : int
+            End of line range (excluded from output itself). If None, retrieve
+            to the end of the session.
+
+        Returns
+        -------
+        entries
+          An iterator of (session, line, timings) tuples, where timings is a
+          dict mapping phase names to durations in seconds, as in
+          :attr:`ExecutionResult.timings`.
+        """
+        self.writeout_cache()
+        params = (session, start, stop if stop else sys.maxsize)
+        cur = self.db.execute("""SELECT session, line, %s FROM cell_timings
+                WHERE session == ? AND line >= ? AND line < ? ORDER BY line"""
+                % ", ".join(TIMING_PHASES), params)
+        return ((session, line, {p: t for p, t in zip(TIMING_PHASES, times)
+                                 if t is not None})
+                for session, line, *times in cur)
+
+    @catch_corrupt_db
+    def get_stats(self, sort='wall', n=10, session=None):
+        """Get the cells which used the most resources.
+
+        The resources used by cells are only stored when
+        :attr:`IPython.core.cellstats.CellStatsRecorder.enabled` is set, and are
+        not kept for archived sessions.
+
+        Parameters
+        ----------
+        sort : str
+            The metric to sort by, one of ``wall``, ``cpu`` (both in seconds),
+            ``rss_delta`` and ``malloc_peak`` (both in bytes).
+        n : int
+            The number of cells to return. None returns all of them.
+        session : int, optional
+            Only return the cells of this session.
+
+        Returns
+        -------
+        entries
+          A list of (session, line, source_raw, stats) tuples, most expensive
+          first, where stats is a dict of the recorded metrics, and of the
+          ``top_allocations`` description if there is one.
+        """
+        if sort not in STAT_METRICS:
+            raise ValueError("Unknown metric %r, expected one of %s"
+                             % (sort, ", ".join(STAT_METRICS)))
+        self.writeout_cache()
+        where, params = "", ()
+        if session is not None:
+            where, params = "WHERE cell_stats.session == ?", (session,)
+        if n is not None:
+            params += (n,)
+        names = [name for name, type_ in STAT_COLUMNS]
+        cur = self.db.execute("""SELECT cell_stats.session, cell_stats.line,
+                history.source_raw, %s
+                FROM cell_stats LEFT JOIN history USING (session, line) %s
+                ORDER BY %s IS NULL, %s DESC %s"""
+                % (", ".join(names), where, sort, sort,
+                   "" if n is None else "LIMIT ?"), params)
+        return [(session, line, source, {k: v for k, v in zip(names, values)
+                                         if v is not None})
+                for session, line, source, *values in cur]
 
     def get_range_by_str(self, rangestr, raw=True, output=False):
         """Get lines of history from a string of ranges, as used by magic
@@ -466,10 +1005,17 @@ def _dir_hist_default(self):
             return []
 
     # A dict of output history, keyed with ints from the shell's
-    # execution count.
+    # execution count. The displayhook may evict outputs from memory.
     output_hist = Dict()
+
+    @default('output_hist')
+    def _output_hist_default(self):
+        return OutputCache()
+
     # The text/plain repr of outputs.
     output_hist_reprs = Dict()
+    # Memory used by the reprs added with store_output_repr
+    _output_hist_reprs_size = 0
 
     # The number of the current session in the history database
     session_number = Integer()
@@ -477,13 +1023,82 @@ def _dir_hist_default(self):
     db_log_output = Bool(False,
         help="Should the history database include output? (default: no)"
     ).tag(config=True)
+    db_log_timings = Bool(False,
+        help="""Should the history database include how long each phase of
+        running a cell took? (default: no) See `ExecutionResult.timings`.
+        """
+    ).tag(config=True)
+    db_output_max_length = Integer(0,
+        help="""Maximum length, in characters, of an output stored in the
+        history database. Longer outputs are stored with their middle cut
+        out. 0 (the default) means no limit.
+        """
+    ).tag(config=True)
+    db_compress_output = Bool(False,
+        help="""Compress outputs stored in the history database with zlib.
+        They are decompressed transparently when read.
+        """
+    ).tag(config=True)
+    output_hist_reprs_max_bytes = Integer(0,
+        help="""Memory budget, in bytes, for the text representations of the
+        outputs kept in `output_hist_reprs`. The oldest ones are dropped when
+        it is exceeded. 0 (the default) means no limit.
+        """
+    ).tag(config=True)
     db_cache_size = Integer(0,
         help="Write to database every x commands (higher values save disk access & power).\n"
         "Values of 1 or less effectively disable caching."
     ).tag(config=True)
+    db_cache_timeout = Integer(0,
+        help="""Write cached commands to the database at the latest this many
+        milliseconds after they were entered, even if fewer than db_cache_size
+        commands are cached. 0 (the default) means no time limit.
+        """
+    ).tag(config=True)
+    db_wal_mode = Bool(False,
+        help="""Use SQLite's write-ahead log for the history database.
+
+        In WAL mode, readers do not block the writer and vice versa, so several
+        IPython processes sharing a profile do not wait for each other when
+        saving history. The setting is stored in the database file, so it stays
+        in effect for older IPython versions accessing the same file.
+        """
+    ).tag(config=True)
+    db_synchronous = CaselessStrEnum(('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+        default_value=None, allow_none=True,
+        help="""The SQLite ``synchronous`` level used when writing history.
+
+        NORMAL is safe in WAL mode and avoids a disk sync for each write. If
+        unset, SQLite's default is used.
+        """
+    ).tag(config=True)
+    retain_days = Integer(0,
+        help="""Move sessions which ended more than this many days ago out of
+        the history database, into compressed archives next to it. Sessions
+        which never ended, e.g. because IPython crashed, count as ended when
+        they started, once that was more than a week ago.
+
+        Archived sessions can still be viewed and searched, but more slowly.
+        Retention limits are applied in the background when IPython starts.
+        0 (the default) means no limit.
+        """
+    ).tag(config=True)
+    retain_sessions = Integer(0,
+        help="""Keep at most this many recent sessions in the history
+        database, and archive older ones (see retain_days). 0 means no limit.
+        """
+    ).tag(config=True)
+    retain_bytes = Integer(0,
+        help="""Archive the oldest sessions (see retain_days) once the inputs
+        and outputs in the history database take up more than about this many
+        bytes. 0 means no limit.
+        """
+    ).tag(config=True)
     # The input and output caches
     db_input_cache = List()
     db_output_cache = List()
+    db_timings_cache = List()
+    db_stats_cache = List()
     
     # History saving in separate thread
     save_thread = Instance('IPython.core.history.HistorySavingThread',
@@ -513,6 +1128,8 @@ def __init__(self, shell=None, config=None, **traits):
         self.save_flag = threading.Event()
         self.db_input_cache_lock = threading.Lock()
         self.db_output_cache_lock = threading.Lock()
+        self.db_timings_cache_lock = threading.Lock()
+        self.db_stats_cache_lock = threading.Lock()
         
         try:
             self.new_session()
@@ -660,6 +1277,26 @@ def get_range(self, session=0, start=1, stop=None, raw=True,output=False):
         return super(HistoryManager, self).get_range(session, start, stop, raw,
                                                      output)
 
+    def get_timings(self, session=0, start=1, stop=None):
+        """Retrieve the execution timings stored for a session.
+
+        As :meth:`HistoryAccessor.get_timings`, but the current session is 0,
+        and negative numbers count back from the current session.
+        """
+        if session <= 0:
+            session += self.session_number
+        return super(HistoryManager, self).get_timings(session, start, stop)
+
+    def get_stats(self, sort='wall', n=10, session=None):
+        """Get the cells which used the most resources.
+
+        As :meth:`HistoryAccessor.get_stats`, but the current session is 0,
+        and negative numbers count back from the current session.
+        """
+        if session is not None and session <= 0:
+            session += self.session_number
+        return super(HistoryManager, self).get_stats(sort, n, session)
+
     ## ----------------------------
     ## Methods for storing history:
     ## ----------------------------
@@ -713,6 +1350,29 @@ def store_inputs(self, line_num, source, source_raw=None):
         if self.shell is not None:
             self.shell.push(to_main, interactive=False)
 
+    def store_output_repr(self, line_num, output):
+        """Keep the text/plain repr of an output, for %history -o and for
+        storing in the database.
+
+        If :attr:`output_hist_reprs_max_bytes` is set, the oldest reprs are
+        dropped to stay within it. The newest one is always kept.
+        """
+        reprs = self.output_hist_reprs
+        old = reprs.pop(line_num, None)
+        if old is not None:
+            self._output_hist_reprs_size -= sys.getsizeof(old)
+        reprs[line_num] = output
+        self._output_hist_reprs_size += sys.getsizeof(output)
+        limit = self.output_hist_reprs_max_bytes
+        if not limit or self._output_hist_reprs_size <= limit:
+            return
+        # Entries may have been removed by other means, recount before
+        # evicting anything.
+        self._output_hist_reprs_size = sum(sys.getsizeof(v) for v in reprs.values())
+        while self._output_hist_reprs_size > limit and len(reprs) > 1:
+            oldest = next(iter(reprs))
+            self._output_hist_reprs_size -= sys.getsizeof(reprs.pop(oldest))
+
     def store_output(self, line_num):
         """If database output logging is enabled, this saves all the
         outputs from the indicated prompt number to the database. It's
@@ -726,23 +1386,98 @@ def store_output(self, line_num):
         if (not self.db_log_output) or (line_num not in self.output_hist_reprs):
             return
         output = self.output_hist_reprs[line_num]
+        if self.db_output_max_length:
+            output = _truncate_middle(output, self.db_output_max_length)
+        if self.db_compress_output:
+            output = _zip_text(output)
 
         with self.db_output_cache_lock:
             self.db_output_cache.append((line_num, output))
         if self.db_cache_size <= 1:
             self.save_flag.set()
 
+    def store_timings(self, line_num, timings):
+        """If database timings logging is enabled, save the execution timings
+        of the indicated prompt number to the database. It's called by
+        run_cell_async after code has been executed.
+
+        Parameters
+        ----------
+        line_num : int
+          The prompt number of the cell.
+        timings : dict
+          Durations in seconds by phase, as in `ExecutionResult.timings`.
+        """
+        if not self.db_log_timings:
+            return
+        with self.db_timings_cache_lock:
+            self.db_timings_cache.append(
+                (line_num,) + tuple(timings.get(p) for p in TIMING_PHASES))
+        if self.db_cache_size <= 1:
+            self.save_flag.set()
+
+    def store_stats(self, line_num, stats):
+        """Save the resources used by the cell with the indicated prompt
+        number to the database. It's called by
+        :class:`IPython.core.cellstats.CellStatsRecorder` after a cell ran.
+
+        Parameters
+        ----------
+        line_num : int
+          The prompt number of the cell.
+        stats : dict
+          The recorded values, keyed by the names of the cell_stats columns.
+        """
+        with self.db_stats_cache_lock:
+            self.db_stats_cache.append(
+                (line_num,) + tuple(stats.get(name) for name, _ in STAT_COLUMNS))
+        if self.db_cache_size <= 1:
+            self.save_flag.set()
+
+    def _configure_connection(self, conn):
+        """Apply the journal mode and synchronous level to a connection."""
+        if self.db_wal_mode:
+            conn.execute("PRAGMA journal_mode=WAL")
+        if self.db_synchronous:
+            conn.execute("PRAGMA synchronous=%s" % self.db_synchronous.upper())
+
+    def apply_retention(self, conn=None):
+        """Archive old sessions according to the retention limits.
+
+        See :attr:`retain_days`, :attr:`retain_sessions` and
+        :attr:`retain_bytes`. Returns the number of sessions archived.
+        """
+        if not (self.retain_days or self.retain_sessions or self.retain_bytes):
+            return 0
+        return self.compact(keep_days=self.retain_days,
+                            keep_sessions=self.retain_sessions,
+                            max_bytes=self.retain_bytes, conn=conn)
+
     def _writeout_input_cache(self, conn):
         with conn:
-            for line in self.db_input_cache:
-                conn.execute("INSERT INTO history VALUES (?, ?, ?, ?)",
-                                (self.session_number,)+line)
+            conn.executemany("INSERT INTO history VALUES (?, ?, ?, ?)",
+                             [(self.session_number,) + line
+                              for line in self.db_input_cache])
 
     def _writeout_output_cache(self, conn):
         with conn:
-            for line in self.db_output_cache:
-                conn.execute("INSERT INTO output_history VALUES (?, ?, ?)",
-                                (self.session_number,)+line)
+            conn.executemany("INSERT INTO output_history VALUES (?, ?, ?)",
+                             [(self.session_number,) + line
+                              for line in self.db_output_cache])
+
+    def _writeout_timings_cache(self, conn):
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cell_timings VALUES (%s)"
+                             % ", ".join("?" * (len(TIMING_PHASES) + 2)),
+                             [(self.session_number,) + line
+                              for line in self.db_timings_cache])
+
+    def _writeout_stats_cache(self, conn):
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO cell_stats VALUES (%s)"
+                             % ", ".join("?" * (len(STAT_COLUMNS) + 2)),
+                             [(self.session_number,) + line
+                              for line in self.db_stats_cache])
 
     @only_when_enabled
     def writeout_cache(self, conn=None):
@@ -776,6 +1511,18 @@ def writeout_cache(self, conn=None):
             finally:
                 self.db_output_cache = []
 
+        with self.db_timings_cache_lock:
+            try:
+                self._writeout_timings_cache(conn)
+            finally:
+                self.db_timings_cache = []
+
+        with self.db_stats_cache_lock:
+            try:
+                self._writeout_stats_cache(conn)
+            finally:
+                self.db_stats_cache = []
+
 
 class HistorySavingThread(threading.Thread):
     """This thread takes care of writing history to the database, so that
@@ -783,7 +1530,9 @@ class HistorySavingThread(threading.Thread):
 
     It waits for the HistoryManager's save_flag to be set, then writes out
     the history cache. The main thread is responsible for setting the flag when
-    the cache size reaches a defined threshold."""
+    the cache size reaches a defined threshold. If the HistoryManager's
+    db_cache_timeout is set, the cache is also written out when it holds
+    entries older than that timeout."""
     daemon = True
     stop_now = False
     enabled = True
@@ -800,13 +1549,24 @@ def run(self):
             self.db = sqlite3.connect(self.history_manager.hist_file,
                             **self.history_manager.connection_options
             )
+            self.history_manager._configure_connection(self.db)
+            try:
+                self.history_manager.apply_retention(self.db)
+            except (OSError, sqlite3.Error) as e:
+                self.history_manager.log.error(
+                    "Failed to archive old history sessions: %s", e)
             while True:
-                self.history_manager.save_flag.wait()
+                timeout = self.history_manager.db_cache_timeout / 1000 or None
+                flagged = self.history_manager.save_flag.wait(timeout)
                 if self.stop_now:
                     self.db.close()
                     return
                 self.history_manager.save_flag.clear()
-                self.history_manager.writeout_cache(self.db)
+                if (flagged or self.history_manager.db_input_cache
+                        or self.history_manager.db_output_cache
+                        or self.history_manager.db_timings_cache
+                        or self.history_manager.db_stats_cache):
+                    self.history_manager.writeout_cache(self.db)
         except Exception as e:
             print(("The history saving thread hit an unexpected error (%s)."
                    "History will not be written to the database.") % repr(e))
@@ -6,29 +6,51 @@
 """
 
 import os
+import shutil
 import sqlite3
+import stat
 
 from traitlets.config.application import Application
 from .application import BaseIPythonApplication
+from .history import HistoryAccessor
 from traitlets import Bool, Int, Dict
 from ..utils.io import ask_yes_no
 
 trim_hist_help = """Trim the IPython history database to the last 1000 entries.
 
 This actually copies the last 1000 entries to a new database, and then replaces
-the old file with the new. Use the `--keep=` argument to specify a number
-other than 1000.
+the old file with the new. Entries which were archived (see `ipython history
+compact`) are moved back into it, and the archives are removed. Use the
+`--keep=` argument to specify a number other than 1000.
 """
 
 clear_hist_help = """Clear the IPython history database, deleting all entries.
 
-Because this is a destructive operation, IPython will prompt the user if they
-really want to do this. Passing a `-f` flag will force clearing without a
+This includes the archived sessions. Because this is a destructive operation,
+IPython will prompt the user if they really want to do this. Passing a `-f` flag will force clearing without a
 prompt.
 
 This is an handy alias to `ipython history trim --keep=0`
 """
 
+compact_hist_help = """Move old sessions from the IPython history database into archives.
+
+Archived sessions are stored compressed, in read-only databases in a
+`history-archive` directory next to the history file. They can still be
+viewed and searched with %history, but are no longer slowing down access to
+recent history. Sessions are moved in batches, so this runs in bounded memory
+and can be interrupted and resumed.
+
+Use `--keep-days=`, `--keep-sessions=` and `--max-bytes=` to choose which
+sessions to keep in the main database.
+"""
+
+
+def _remove_readonly(func, path, exc_info):
+    """shutil.rmtree error handler for the read-only archive shards."""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
 
 class HistoryTrim(BaseIPythonApplication):
     description = trim_hist_help
@@ -54,27 +76,42 @@ class HistoryTrim(BaseIPythonApplication):
     def start(self):
         profile_dir = self.profile_dir.location
         hist_file = os.path.join(profile_dir, 'history.sqlite')
-        con = sqlite3.connect(hist_file)
+        # The accessor reads archived sessions too
+        accessor = HistoryAccessor(hist_file=hist_file, parent=self)
+        archive_dir = accessor._get_archive_dir()
+        dbs = [accessor.db] + [accessor._get_archive_db(path) for _, _, path
+                               in reversed(accessor._list_archives())]
 
-        # Grab the recent history from the current database.
-        inputs = list(con.execute('SELECT session, line, source, source_raw FROM '
+        # Grab the recent history from the current database and archives.
+        inputs = []
+        for db in dbs:
+            inputs.extend(db.execute('SELECT session, line, source, source_raw FROM '
                                 'history ORDER BY session DESC, line DESC LIMIT ?', (self.keep+1,)))
-        if len(inputs) <= self.keep:
+        # An interrupted compaction may leave a session in both
+        inputs = sorted({row[:2]: row for row in inputs}.values(), reverse=True)
+        del inputs[self.keep+1:]
+        if len(inputs) <= self.keep and len(dbs) == 1:
+            accessor.db.close()
             print("There are already at most %d entries in the history database." % self.keep)
             print("Not doing anything. Use --keep= argument to keep fewer entries")
             return
         
         print("Trimming history to the most recent %d entries." % self.keep)
         
-        inputs.pop() # Remove the extra element we got to check the length.
+        if len(inputs) > self.keep:
+            inputs.pop() # Remove the extra element we got to check the length.
         inputs.reverse()
         if inputs:
             first_session = inputs[0][0]
-            outputs = list(con.execute('SELECT session, line, output FROM '
-                                       'output_history WHERE session >= ?', (first_session,)))
-            sessions = list(con.execute('SELECT session, start, end, num_cmds, remark FROM '
-                                        'sessions WHERE session >= ?', (first_session,)))
-        con.close()
+            outputs = []
+            sessions = []
+            for db in dbs:
+                outputs.extend(db.execute('SELECT session, line, output FROM '
+                                           'output_history WHERE session >= ?', (first_session,)))
+                sessions.extend(db.execute('SELECT session, start, end, num_cmds, remark FROM '
+                                            'sessions WHERE session >= ?', (first_session,)))
+        for db in dbs:
+            db.close()
         
         # Create the new history database.
         new_hist_file = os.path.join(profile_dir, 'history.sqlite.new')
@@ -99,9 +136,9 @@ def start(self):
         if inputs:
             with new_db:
                 # Add the recent history into the new database.
-                new_db.executemany('insert into sessions values (?,?,?,?,?)', sessions)
-                new_db.executemany('insert into history values (?,?,?,?)', inputs)
-                new_db.executemany('insert into output_history values (?,?,?)', outputs)
+                new_db.executemany('insert or ignore into sessions values (?,?,?,?,?)', sessions)
+                new_db.executemany('insert or ignore into history values (?,?,?,?)', inputs)
+                new_db.executemany('insert or ignore into output_history values (?,?,?)', outputs)
         new_db.close()
 
         if self.backup:
@@ -112,8 +149,14 @@ def start(self):
                 backup_hist_file = os.path.join(profile_dir, 'history.sqlite.old.%d' % i)
             os.rename(hist_file, backup_hist_file)
             print("Backed up longer history file to", backup_hist_file)
+            if os.path.isdir(archive_dir):
+                backup_archive_dir = '%s.old.%d' % (archive_dir, i)
+                os.rename(archive_dir, backup_archive_dir)
+                print("Backed up history archives to", backup_archive_dir)
         else:
             os.remove(hist_file)
+            if os.path.isdir(archive_dir):
+                shutil.rmtree(archive_dir, onerror=_remove_readonly)
         
         os.rename(new_hist_file, hist_file)
 
@@ -140,6 +183,64 @@ def start(self):
                 default="no", interrupt="no"):
             HistoryTrim.start(self)
 
+class HistoryCompact(BaseIPythonApplication):
+    description = compact_hist_help
+
+    keep_days = Int(0,
+        help="Archive sessions which ended more than this many days ago."
+        ).tag(config=True)
+
+    keep_sessions = Int(0,
+        help="Number of recent sessions to keep in the database."
+        ).tag(config=True)
+
+    max_bytes = Int(0,
+        help="Archive the oldest sessions until the database holds at most "
+             "this many bytes of inputs and outputs."
+        ).tag(config=True)
+
+    batch = Int(100,
+        help="Number of sessions to move into each archive file."
+        ).tag(config=True)
+
+    stale_days = Int(7,
+        help="Sessions which never ended, e.g. because IPython crashed, are "
+             "taken to have ended when they started, once they started more "
+             "than this many days ago."
+        ).tag(config=True)
+
+    aliases = Dict({
+        'keep-days': 'HistoryCompact.keep_days',
+        'keep-sessions': 'HistoryCompact.keep_sessions',
+        'max-bytes': 'HistoryCompact.max_bytes',
+        'batch': 'HistoryCompact.batch',
+        'stale-days': 'HistoryCompact.stale_days',
+    })
+
+    def start(self):
+        if not (self.keep_days or self.keep_sessions or self.max_bytes):
+            print("No retention limit specified. Use --keep-days=, "
+                  "--keep-sessions= or --max-bytes= to choose one.")
+            self.exit(1)
+        profile_dir = self.profile_dir.location
+        hist_file = os.path.join(profile_dir, 'history.sqlite')
+        accessor = HistoryAccessor(hist_file=hist_file, parent=self)
+        try:
+            archived = accessor.compact(keep_days=self.keep_days,
+                                        keep_sessions=self.keep_sessions,
+                                        max_bytes=self.max_bytes,
+                                        batch_sessions=self.batch,
+                                        vacuum=True,
+                                        stale_days=self.stale_days)
+        finally:
+            accessor.db.close()
+        if archived:
+            print("Archived %d sessions to %s" % (archived,
+                                                  accessor._get_archive_dir()))
+        else:
+            print("No sessions to archive.")
+
+
 class HistoryApp(Application):
     name = u'ipython-history'
     description = "Manage the IPython history database."
@@ -147,6 +248,7 @@ class HistoryApp(Application):
     subcommands = Dict(dict(
         trim = (HistoryTrim, HistoryTrim.description.splitlines()[0]),
         clear = (HistoryClear, HistoryClear.description.splitlines()[0]),
+        compact = (HistoryCompact, HistoryCompact.description.splitlines()[0]),
     ))
 
     def start(self):
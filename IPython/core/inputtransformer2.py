@@ -11,6 +11,7 @@
 # Distributed under the terms of the Modified BSD License.
 
 from codeop import compile_command
+import copy
 import re
 import tokenize
 from typing import List, Tuple, Optional, Any
@@ -210,6 +211,22 @@ def transform(self, lines: List[str]):
         """
         raise NotImplementedError
 
+    def line_range(self, lines: List[str]) -> Tuple[int, int]:
+        """Return the (start, stop) indices of the physical lines replaced
+        by ``transform()``.
+
+        The lines before *start* and from *stop* onwards are left unchanged.
+        """
+        return self.start_line, find_end_of_continued_line(lines, self.start_line) + 1
+
+    def moved(self, offset: int):
+        """Return a copy of this transformation for the lines starting
+        *offset* lines into the ones it was found in.
+        """
+        new = copy.copy(self)
+        new.start_line -= offset
+        return new
+
 class MagicAssign(TokenTransformBase):
     """Transformer for assignments from magics (a = %foo)"""
     @classmethod
@@ -440,6 +457,14 @@ def find(cls, tokens_by_line):
                     ix += 1
                 return cls(line[ix].start, line[-2].start)
 
+    def line_range(self, lines):
+        return self.start_line, self.q_line + 1
+
+    def moved(self, offset):
+        new = super().moved(offset)
+        new.q_line -= offset
+        return new
+
     def transform(self, lines):
         """Transform a help command found by the ``find()`` classmethod.
         """
@@ -508,6 +533,75 @@ def make_tokens_by_line(lines:List[str]):
 
     return tokens_by_line
 
+class IncrementalTokenizer:
+    """Group the tokens of successive versions of a cell by line, like
+    :func:`make_tokens_by_line`, tokenizing only what changed at the end.
+
+    When the lines passed start with lines seen in the previous call, the
+    tokens of the complete logical lines among those are reused. The rest is
+    tokenized after lines which restore the indentation the tokenizer had at
+    that point. This makes checking a growing cell after each new line cheap.
+    """
+    def __init__(self):
+        self.lines = []
+        self.tokens_by_line = []
+        # (number of lines, number of token lines, indentation stack) where
+        # the tokenizer is between statements, with no open bracket
+        self.checkpoints = [(0, 0, ())]
+
+    def __call__(self, lines: List[str]) -> List[List[Any]]:
+        """Return the tokens of lines, grouped by line.
+
+        The outer list is new, but the token lists may be shared with other
+        calls and must not be modified.
+        """
+        common = 0
+        for old, new in zip(self.lines, lines):
+            if old != new:
+                break
+            common += 1
+        # The last line may end the input, which changes its tokens
+        while self.checkpoints[-1][0] > max(min(common, len(lines) - 1), 0):
+            self.checkpoints.pop()
+        nlines, ntoken_lines, indents = self.checkpoints[-1]
+
+        # Statements indented as the tokenizer expects the next line
+        preamble = [indent + 'pass\n' for indent in indents]
+        new_tokens = make_tokens_by_line(preamble + lines[nlines:])
+        offset = nlines - len(preamble)
+        stack = list(indents)
+        # The tokenizer and make_tokens_by_line count brackets differently
+        # after an unmatched closing one.
+        parenlev = grouping_parenlev = 0
+        tokens_by_line = self.tokens_by_line[:ntoken_lines]
+        for line_tokens in new_tokens[len(preamble):]:
+            line_tokens = [t._replace(start=(t.start[0] + offset, t.start[1]),
+                                      end=(t.end[0] + offset, t.end[1]))
+                           for t in line_tokens]
+            tokens_by_line.append(line_tokens)
+            for token in line_tokens:
+                if token.type == tokenize.INDENT:
+                    stack.append(token.string)
+                elif token.type == tokenize.DEDENT:
+                    stack.pop()
+                elif token.type == tokenize.OP:
+                    if token.string in '([{':
+                        parenlev += 1
+                        grouping_parenlev += 1
+                    elif token.string in ')]}':
+                        parenlev -= 1
+                        grouping_parenlev = max(grouping_parenlev - 1, 0)
+            last = line_tokens[-1]
+            row = last.start[0]
+            if (last.type in (tokenize.NEWLINE, tokenize.NL)
+                    and parenlev == 0 and grouping_parenlev == 0
+                    and row < len(lines) and lines[row - 1].endswith('\n')):
+                self.checkpoints.append((row, len(tokens_by_line), tuple(stack)))
+
+        self.lines = list(lines)
+        self.tokens_by_line = tokens_by_line
+        return list(tokens_by_line)
+
 def show_linewise_tokens(s: str):
     """For investigation and debugging"""
     if not s.endswith('\n'):
@@ -518,9 +612,41 @@ def show_linewise_tokens(s: str):
         for tokinfo in line:
             print(" ", tokinfo)
 
+def _bracket_balance(tokens):
+    """Count the opening minus the closing brackets among tokens."""
+    balance = 0
+    for token in tokens:
+        if token.type == tokenize.OP:
+            if token.string in '([{':
+                balance += 1
+            elif token.string in ')]}':
+                balance -= 1
+    return balance
+
+def _ends_cleanly(tokens):
+    """Whether a logical line leaves the tokenizer as it found it, so that the
+    tokens of the following lines do not depend on it.
+    """
+    return (tokens[-1].type in (tokenize.NEWLINE, tokenize.NL)
+            and _bracket_balance(tokens) == 0)
+
 # Arbitrary limit to prevent getting stuck in infinite loops
 TRANSFORM_LOOP_LIMIT = 500
 
+# The transformations which can only change a cell if it starts with
+# whitespace, or if _maybe_special_re matches it. This is a rough scan for
+# escapes and prompts at the start of lines, ``= %magic`` and ``= !cmd``
+# assignments and ``?`` anywhere. Lines can also be split by characters other
+# than '\n', which '^' doesn't match.
+# Compared by id, as user transforms may not be hashable
+_prescanned_transforms = frozenset(map(id, [
+    leading_empty_lines, leading_indent, classic_prompt, ipython_prompt,
+    cell_magic, MagicAssign, SystemAssign, EscapedCommand, HelpEnd,
+]))
+_maybe_special_re = re.compile(
+    r'^\s*(?:[!%,;/]|>>>|\.\.\.|In \[)|=[\s\\]*[!%]|[?\r\v\f\x1c-\x1e\x85\u2028\u2029]',
+    re.MULTILINE)
+
 class TransformerManager:
     """Applies various transformations to a cell or code block.
 
@@ -543,6 +669,7 @@ def __init__(self):
             EscapedCommand,
             HelpEnd,
         ]
+        self._check_tokenizer = IncrementalTokenizer()
 
     def do_one_token_transform(self, lines):
         """Find and run the transform earliest in the code.
@@ -577,18 +704,120 @@ def do_one_token_transform(self, lines):
         return False, lines
 
     def do_token_transforms(self, lines):
-        for _ in range(TRANSFORM_LOOP_LIMIT):
-            changed, lines = self.do_one_token_transform(lines)
-            if not changed:
-                return lines
+        """Apply the token transformers to all the special syntax in lines.
+
+        This gives the same result as calling :meth:`do_one_token_transform`
+        until nothing changes, without tokenizing the whole cell again after
+        each transformation. The cell is tokenized once, and its logical lines
+        are transformed in order. A transformed line is tokenized again on its
+        own: if it is plain Python, ending with all brackets closed, and the
+        special syntax it replaced also did, the tokens of the following lines
+        are still valid. Otherwise, the rest of the cell is tokenized again.
+        """
+        # Transformers whose first match failed to transform: they can't
+        # transform anything after it.
+        stuck = set()
+        restarts = 0
+        restart_row = 0
+        while True:
+            tokens_by_line = make_tokens_by_line(lines)
+            new_lines = []
+            # lines[:done] have been transformed into new_lines
+            done = 0
+            for ix, line_tokens in enumerate(tokens_by_line):
+                first_row = line_tokens[0].start[0] - 1
+                if first_row < restart_row:
+                    continue
+                candidates = self._find_in_line(line_tokens, stuck)
+                if not candidates:
+                    continue
+                for transformer in candidates:
+                    start, stop = transformer.line_range(lines)
+                    # Keep a line of context on each side, so that
+                    # transformers can tell if they are alone in the cell.
+                    lo, hi = max(start - 1, 0), min(stop + 1, len(lines))
+                    try:
+                        window = transformer.moved(lo).transform(lines[lo:hi])
+                    except SyntaxError:
+                        continue
+                    replacement = window[start - lo:len(window) - (hi - stop)]
+                    break
+                else:
+                    stuck.update(type(t) for t in candidates)
+                    continue
+
+                restart_row = len(new_lines) + first_row - done
+                new_lines.extend(lines[done:start])
+                new_lines.extend(replacement)
+                done = stop
+                # Tokenizing may have stopped early, e.g. in an unclosed
+                # string, if nothing follows.
+                at_end = ix == len(tokens_by_line) - 1 and stop == len(lines)
+                if not ((at_end or (_ends_cleanly(line_tokens)
+                                    and line_tokens[-1].start[0] == stop))
+                        and self._is_plain_python(
+                            lines[first_row:start] + replacement, stuck)):
+                    break
+            else:
+                new_lines.extend(lines[done:])
+                return new_lines
+
+            # The rest of the cell has to be tokenized again, starting from
+            # the line just transformed.
+            lines = new_lines + lines[done:]
+            restarts += 1
+            if restarts >= TRANSFORM_LOOP_LIMIT:
+                raise RuntimeError("Input transformation still changing after "
+                                   "%d iterations. Aborting." % TRANSFORM_LOOP_LIMIT)
+
+    def _find_in_line(self, line_tokens, stuck=()):
+        """Find the transformations applying to one logical line, in the order
+        :meth:`do_one_token_transform` would try them."""
+        candidates = []
+        for transformer_cls in self.token_transformers:
+            if transformer_cls in stuck:
+                continue
+            transformer = transformer_cls.find([line_tokens])
+            if transformer:
+                candidates.append(transformer)
+        return sorted(candidates, key=TokenTransformBase.sortby)
 
-        raise RuntimeError("Input transformation still changing after "
-                           "%d iterations. Aborting." % TRANSFORM_LOOP_LIMIT)
+    def _is_plain_python(self, lines, stuck=()):
+        """Whether lines hold one logical line, with no special syntax left,
+        which ends cleanly."""
+        try:
+            tokens_by_line = make_tokens_by_line(lines)
+        except (SyntaxError, ValueError):
+            # e.g. inconsistent indentation
+            return False
+        # The trailing DEDENT and ENDMARKER tokens come as a last line
+        if not tokens_by_line or len(tokens_by_line) > 2:
+            return False
+        line_tokens = tokens_by_line[0]
+        return (_ends_cleanly(line_tokens)
+                and line_tokens[-1].start[0] == len(lines)
+                and not self._find_in_line(line_tokens, stuck))
+
+    def can_skip_transforms(self, cell: str) -> bool:
+        """Whether :meth:`transform_cell` can return cell unchanged, without
+        looking for IPython syntax line by line.
+
+        This is a quick scan, so cells using no IPython syntax may still
+        return False. It also returns False when custom transformations are
+        used.
+        """
+        return (cell[:1].strip() != ''
+                and _maybe_special_re.search(cell) is None
+                and all(id(t) in _prescanned_transforms for transforms in (
+                            self.cleanup_transforms, self.line_transforms,
+                            self.token_transformers) for t in transforms))
 
     def transform_cell(self, cell: str) -> str:
         """Transforms a cell of input code"""
         if not cell.endswith('\n'):
             cell += '\n'  # Ensure the cell has a trailing newline
+        if self.can_skip_transforms(cell):
+            return cell
         lines = cell.splitlines(keepends=True)
         for transform in self.cleanup_transforms + self.line_transforms:
             lines = transform(lines)
@@ -638,30 +867,36 @@ def check_complete(self, cell: str):
             # Explicit backslash continuation
             return 'incomplete', find_last_indent(lines)
 
-        try:
-            for transform in self.cleanup_transforms:
-                if not getattr(transform, 'has_side_effects', False):
-                    lines = transform(lines)
-        except SyntaxError:
-            return 'invalid', None
+        # Plain Python is left unchanged by the transformations
+        if not self.can_skip_transforms(cell):
+            try:
+                for transform in self.cleanup_transforms:
+                    if not getattr(transform, 'has_side_effects', False):
+                        lines = transform(lines)
+            except SyntaxError:
+                return 'invalid', None
 
-        if lines[0].startswith('%%'):
-            # Special case for cell magics - completion marked by blank line
-            if lines[-1].strip():
-                return 'incomplete', find_last_indent(lines)
-            else:
-                return 'complete', None
+            if lines[0].startswith('%%'):
+                # Special case for cell magics - completion marked by blank line
+                if lines[-1].strip():
+                    return 'incomplete', find_last_indent(lines)
+                else:
+                    return 'complete', None
+
+            try:
+                for transform in self.line_transforms:
+                    if not getattr(transform, 'has_side_effects', False):
+                        lines = transform(lines)
+                lines = self.do_token_transforms(lines)
+            except SyntaxError:
+                return 'invalid', None
 
         try:
-            for transform in self.line_transforms:
-                if not getattr(transform, 'has_side_effects', False):
-                    lines = transform(lines)
-            lines = self.do_token_transforms(lines)
+            tokens_by_line = self._check_tokenizer(lines)
         except SyntaxError:
+            # Inconsistent indentation
             return 'invalid', None
 
-        tokens_by_line = make_tokens_by_line(lines)
-
         if not tokens_by_line:
             return 'incomplete', find_last_indent(lines)
 
@@ -679,6 +914,7 @@ def check_complete(self, cell: str):
         ] and len(tokens_by_line) > 1:
             last_token_line = tokens_by_line.pop()
 
+        tokens_by_line[-1] = list(tokens_by_line[-1])
         while tokens_by_line[-1] and tokens_by_line[-1][-1].type in newline_types:
             tokens_by_line[-1].pop()
 
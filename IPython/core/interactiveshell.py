@@ -17,11 +17,13 @@
 import builtins as builtin_mod
 import functools
 import inspect
+import linecache
 import os
 import re
 import runpy
 import sys
 import tempfile
+import time
 import traceback
 import types
 import subprocess
@@ -40,15 +42,17 @@
 from IPython.core.alias import Alias, AliasManager
 from IPython.core.autocall import ExitAutocall
 from IPython.core.builtin_trap import BuiltinTrap
+from IPython.core.cellstats import CellStatsRecorder
 from IPython.core.events import EventManager, available_events
-from IPython.core.compilerop import CachingCompiler, check_linecache_ipython
+from IPython.core.compilerop import (CachingCompiler, check_linecache_ipython,
+                                     code_name, parse_cell_name)
 from IPython.core.debugger import Pdb
 from IPython.core.display_trap import DisplayTrap
 from IPython.core.displayhook import DisplayHook
 from IPython.core.displaypub import DisplayPublisher
 from IPython.core.error import InputRejected, UsageError
 from IPython.core.extensions import ExtensionManager
-from IPython.core.formatters import DisplayFormatter
+from IPython.core.formatters import DisplayFormatter, LazyFormatDict
 from IPython.core.history import HistoryManager
 from IPython.core.inputtransformer2 import ESC_MAGIC, ESC_MAGIC2
 from IPython.core.logger import Logger
@@ -280,6 +284,22 @@ class DummyMod(object):
     __spec__ = None
 
 
+class _Identity(object):
+    """Hashable wrapper comparing objects by identity, to use objects which
+    may not be hashable, like transformers, in cache keys. The wrapper keeps
+    the object alive, so its id can't be reused while the key exists."""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __hash__(self):
+        return id(self.obj)
+
+    def __eq__(self, other):
+        return isinstance(other, _Identity) and self.obj is other.obj
+
+
 class ExecutionInfo(object):
     """The arguments used for a call to :meth:`InteractiveShell.run_cell`
 
@@ -308,6 +328,13 @@ class ExecutionResult(object):
     """The result of a call to :meth:`InteractiveShell.run_cell`
 
     Stores information about what took place.
+
+    ``timings`` maps the phases of running the cell to the time, in seconds,
+    spent in each of them: ``transform``, ``parse``, ``ast_transform``,
+    ``compile``, ``execute``, ``displayhook`` and ``history``. Phases which
+    did not happen (e.g. because of an error, or because the compiled code was
+    reused) are missing. Time spent in the display hook is not counted in
+    ``execute``.
     """
     execution_count = None
     error_before_exec = None
@@ -317,6 +344,11 @@ class ExecutionResult(object):
 
     def __init__(self, info):
         self.info = info
+        self.timings = {}
+
+    def _add_timing(self, phase, start):
+        """Add the time elapsed since ``start`` (from time.perf_counter) to a phase."""
+        self.timings[phase] = self.timings.get(phase, 0.) + time.perf_counter() - start
 
     @property
     def success(self):
@@ -347,6 +379,41 @@ class InteractiveShell(SingletonConfigurable):
         """
     ).tag(config=True)
 
+    code_cache_size = Integer(128, help=
+        """
+        Number of recently run cells whose compiled code is kept, so that
+        running the same cell again does not parse, transform and compile it
+        again. Cells are not cached while there are ast_transformers, so they
+        are applied every time a cell runs. Set to 0 to disable.
+        """
+    ).tag(config=True)
+
+    @observe('code_cache_size')
+    def _code_cache_size_changed(self, change):
+        if hasattr(self, 'compile'):
+            self._init_cell_caches()
+
+    linecache_max_entries = Integer(1000, help=
+        """
+        Maximum number of cells whose source is kept in memory for tracebacks
+        and introspection, 0 for no limit. Beyond it, the least recently run
+        cells are forgotten, unless code from them is still alive. A forgotten
+        cell appearing in a traceback is read back from the history.
+        """
+    ).tag(config=True)
+
+    linecache_max_bytes = Integer(0, help=
+        """
+        Maximum total size, in characters, of the cells whose source is kept
+        in memory, 0 for no limit. See linecache_max_entries.
+        """
+    ).tag(config=True)
+
+    @observe('linecache_max_entries', 'linecache_max_bytes')
+    def _linecache_limits_changed(self, change):
+        if hasattr(self, 'compile'):
+            setattr(self.compile, change['name'], change['new'])
+
     autocall = Enum((0,1,2), default_value=0, help=
         """
         Make IPython automatically call any callable object even if you didn't
@@ -664,6 +731,7 @@ def __init__(self, ipython_dir=None, profile_dir=None,
         self.init_syntax_highlighting()
         self.init_hooks()
         self.init_events()
+        self.init_cell_stats()
         self.init_pushd_popd_magic()
         self.init_user_ns()
         self.init_logger()
@@ -747,6 +815,9 @@ def init_instance_attrs(self):
 
         # command compiler
         self.compile = CachingCompiler()
+        self.compile.linecache_max_entries = self.linecache_max_entries
+        self.compile.linecache_max_bytes = self.linecache_max_bytes
+        self._init_cell_caches()
 
         # Make an empty namespace, which extension writers can rely on both
         # existing and NEVER being used by ipython itself.  This gives them a
@@ -769,6 +840,17 @@ def init_instance_attrs(self):
         # Dict to track post-execution functions that have been registered
         self._post_execute = {}
 
+    def _init_cell_caches(self):
+        """Set up the caches which let a cell run again skip straight to
+        execution, see code_cache_size."""
+        size = self.code_cache_size
+        self.compile.code_cache_size = size
+        # Both are pure functions of the cell
+        self._static_transform_cell = functools.lru_cache(size)(
+            lambda raw_cell, transforms:
+                self.input_transformer_manager.transform_cell(raw_cell))
+        self._should_be_async = functools.lru_cache(size)(_should_be_async)
+
     def init_environment(self):
         """Any changes we need to make to the user's environment."""
         pass
@@ -868,6 +950,13 @@ def init_display_formatter(self):
     def init_display_pub(self):
         self.display_pub = self.display_pub_class(parent=self, shell=self)
         self.configurables.append(self.display_pub)
+        self.events.register('post_execute', self._flush_display_updates)
+
+    def _flush_display_updates(self):
+        """Publish the display updates held back during the cell."""
+        flush = getattr(self.display_pub, 'flush_updates', None)
+        if flush is not None:
+            flush()
 
     def init_data_pub(self):
         if not self.data_pub_class:
@@ -1461,6 +1550,8 @@ def reset(self, new_session=True):
         # execution protection
         self.clear_main_mod_cache()
 
+        self._invalidate_completions()
+
     def del_var(self, varname, by_name=False):
         """Delete a variable from the various namespaces, so that, as
         far as possible, we're not keeping any hidden references to it.
@@ -1506,6 +1597,8 @@ def del_var(self, varname, by_name=False):
                 if getattr(self.displayhook, name) is obj:
                     setattr(self.displayhook, name, None)
 
+        self._invalidate_completions()
+
     def reset_selective(self, regex=None):
         """Clear selective variables from internal namespaces based on a
         specified regular expression.
@@ -1576,6 +1669,8 @@ def push(self, variables, interactive=True):
         else:
             user_ns_hidden.update(vdict)
 
+        self._invalidate_completions()
+
     def drop_by_id(self, variables):
         """Remove a dict of variables from the user namespace, if they are the
         same as the values in the dictionary.
@@ -1800,6 +1895,11 @@ def init_history(self):
         self.history_manager = HistoryManager(shell=self, parent=self)
         self.configurables.append(self.history_manager)
 
+    def init_cell_stats(self):
+        """Sets up the recording of the resources used by each cell."""
+        self.cell_stats = CellStatsRecorder(shell=self, parent=self)
+        self.configurables.append(self.cell_stats)
+
     #-------------------------------------------------------------------------
     # Things related to exception handling and tracebacks (not debugging)
     #-------------------------------------------------------------------------
@@ -2041,6 +2141,7 @@ def showtraceback(self, exc_tuple=None, filename=None, tb_offset=None,
                         # in the engines. This should return a list of strings.
                         stb = value._render_traceback_()
                     except Exception:
+                        self._restore_evicted_cells(tb)
                         stb = self.InteractiveTB.structured_traceback(etype,
                                             value, tb, tb_offset=tb_offset)
 
@@ -2056,6 +2157,25 @@ def showtraceback(self, exc_tuple=None, filename=None, tb_offset=None,
         except KeyboardInterrupt:
             print('\n' + self.get_exception_only(), file=sys.stderr)
 
+    def _restore_evicted_cells(self, tb):
+        """Put the cells a traceback goes through back into linecache, from
+        the history, if they were evicted (see linecache_max_entries)."""
+        hist = self.history_manager.input_hist_parsed
+        while tb is not None:
+            name = tb.tb_frame.f_code.co_filename
+            tb = tb.tb_next
+            parsed = parse_cell_name(name)
+            if parsed is None or name in linecache.cache:
+                continue
+            number = parsed[0]
+            if number >= len(hist):
+                continue
+            # The history strips trailing newlines
+            for source in (hist[number] + '\n', hist[number]):
+                if code_name(source, number) == name:
+                    self.compile.cache(source, number)
+                    break
+
     def _showtraceback(self, etype, evalue, stb):
         """Actually show a traceback.
 
@@ -2163,6 +2283,14 @@ def init_completer(self):
         self.set_hook('complete_command', cd_completer, str_key = '%cd')
         self.set_hook('complete_command', reset_completer, str_key = '%reset')
 
+    def _invalidate_completions(self):
+        """Tell the completer that the user namespace may have changed."""
+        # The namespace is modified during initialisation, before the
+        # completer exists.
+        completer = getattr(self, 'Completer', None)
+        if completer is not None:
+            completer.invalidate_completion_cache()
+
     @skip_doctest
     def complete(self, text, line=None, cursor_pos=None):
         """Return the completed text and a list of completions.
@@ -2635,6 +2763,10 @@ def _format_user_obj(self, obj):
         """
         
         data, md = self.display_formatter.format(obj)
+        if isinstance(data, LazyFormatDict):
+            # The results go to the client which requested them, whatever the
+            # local frontends consume
+            data = dict(data.compute())
         value = {
             'status' : 'ok',
             'data' : data,
@@ -2881,11 +3013,13 @@ def _run_cell(self, raw_cell:str, store_history:bool, silent:bool, shell_futures
         # we need to avoid calling self.transform_cell multiple time on the same thing
         # so we need to store some results:
         preprocessing_exc_tuple = None
+        transform_start = time.perf_counter()
         try:
             transformed_cell = self.transform_cell(raw_cell)
         except Exception:
             transformed_cell = raw_cell
             preprocessing_exc_tuple = sys.exc_info()
+        transform_time = time.perf_counter() - transform_start
 
         assert transformed_cell is not None
         coro = self.run_cell_async(
@@ -2895,6 +3029,7 @@ def _run_cell(self, raw_cell:str, store_history:bool, silent:bool, shell_futures
             shell_futures=shell_futures,
             transformed_cell=transformed_cell,
             preprocessing_exc_tuple=preprocessing_exc_tuple,
+            transform_time=transform_time,
         )
 
         # run_cell_async is async, but may not actually need an eventloop.
@@ -2913,7 +3048,7 @@ def _run_cell(self, raw_cell:str, store_history:bool, silent:bool, shell_futures
             runner = _pseudo_sync_runner
 
         try:
-            return runner(coro)
+            result = runner(coro)
         except BaseException as e:
             info = ExecutionInfo(raw_cell, store_history, silent, shell_futures)
             result = ExecutionResult(info)
@@ -2921,6 +3056,8 @@ def _run_cell(self, raw_cell:str, store_history:bool, silent:bool, shell_futures
             self.showtraceback(running_compiled_code=True)
             return result
 
+        return result
+
     def should_run_async(
         self, raw_cell: str, *, transformed_cell=None, preprocessing_exc_tuple=None
     ) -> bool:
@@ -2962,7 +3099,7 @@ def should_run_async(
                 return False
         else:
             cell = transformed_cell
-        return _should_be_async(cell)
+        return self._should_be_async(cell)
 
     async def run_cell_async(
         self,
@@ -2972,7 +3109,8 @@ async def run_cell_async(
         shell_futures=True,
         *,
         transformed_cell: Optional[str] = None,
-        preprocessing_exc_tuple: Optional[Any] = None
+        preprocessing_exc_tuple: Optional[Any] = None,
+        transform_time: Optional[float] = None
     ) -> ExecutionResult:
         """Run a complete IPython cell asynchronously.
 
@@ -2996,6 +3134,9 @@ async def run_cell_async(
           cell that was passed through transformers
         preprocessing_exc_tuple:
           trace if the transformation failed.
+        transform_time: float
+          time, in seconds, spent in the transformation, recorded as the
+          ``transform`` timing of the result.
 
         Returns
         -------
@@ -3018,8 +3159,13 @@ async def run_cell_async(
         if store_history:
             result.execution_count = self.execution_count
 
+        if transform_time is not None:
+            result.timings['transform'] = transform_time
+
         def error_before_exec(value):
             if store_history:
+                self.history_manager.store_timings(result.execution_count,
+                                                   result.timings)
                 self.execution_count += 1
             result.error_before_exec = value
             self.last_execution_succeeded = False
@@ -3045,6 +3191,7 @@ def error_before_exec(value):
             # prefilter_manager) raises an exception, we store it in this variable
             # so that we can display the error after logging the input and storing
             # it in the history.
+            transform_start = time.perf_counter()
             try:
                 cell = self.transform_cell(raw_cell)
             except Exception:
@@ -3052,6 +3199,7 @@ def error_before_exec(value):
                 cell = raw_cell  # cell has to exist so it can be stored/logged
             else:
                 preprocessing_exc_tuple = None
+            result._add_timing('transform', transform_start)
         else:
             if preprocessing_exc_tuple is None:
                 cell = transformed_cell
@@ -3060,8 +3208,10 @@ def error_before_exec(value):
 
         # Store raw and processed history
         if store_history:
+            history_start = time.perf_counter()
             self.history_manager.store_inputs(self.execution_count,
                                               cell, raw_cell)
+            result._add_timing('history', history_start)
         if not silent:
             self.logger.log(cell, raw_cell)
 
@@ -3072,6 +3222,9 @@ def error_before_exec(value):
                 self.execution_count += 1
             return error_before_exec(preprocessing_exc_tuple[1])
 
+        # Outputs evicted from memory are loaded again if the cell uses them.
+        self.displayhook.load_outputs(cell)
+
         # Our own compiler remembers the __future__ environment. If we want to
         # run code with a separate __future__ environment, use the default
         # compiler
@@ -3083,60 +3236,82 @@ def error_before_exec(value):
             cell_name = self.compile.cache(cell, self.execution_count)
 
             with self.display_trap:
-                # Compile to bytecode
-                try:
-                    if sys.version_info < (3,8) and self.autoawait:
-                        if _should_be_async(cell):
-                            # the code AST below will not be user code: we wrap it
-                            # in an `async def`. This will likely make some AST
-                            # transformer below miss some transform opportunity and
-                            # introduce a small coupling to run_code (in which we
-                            # bake some assumptions of what _ast_asyncify returns.
-                            # they are ways around (like grafting part of the ast
-                            # later:
-                            #    - Here, return code_ast.body[0].body[1:-1], as well
-                            #    as last expression in  return statement which is
-                            #    the user code part.
-                            #    - Let it go through the AST transformers, and graft
-                            #    - it back after the AST transform
-                            # But that seem unreasonable, at least while we
-                            # do not need it.
-                            code_ast = _ast_asyncify(cell, 'async-def-wrapper')
-                            _run_async = True
+                interactivity = "none" if silent else self.ast_node_interactivity
+
+                # Running the same cell again reuses its compiled code, which
+                # also depends on the compiler flags. AST transformers may
+                # reject input or have side effects, so they must run every
+                # time: cells aren't cached while there are any.
+                codes = code_cache_key = None
+                if (compiler is self.compile and sys.version_info >= (3, 8)
+                        and not self.ast_transformers):
+                    code_cache_key = compiler.code_cache_key(
+                        cell, interactivity, self.autoawait)
+                    codes = compiler.get_cached_code(code_cache_key, cell_name)
+
+                if codes is None:
+                    # Compile to bytecode
+                    parse_start = time.perf_counter()
+                    try:
+                        if sys.version_info < (3,8) and self.autoawait:
+                            if _should_be_async(cell):
+                                # the code AST below will not be user code: we wrap it
+                                # in an `async def`. This will likely make some AST
+                                # transformer below miss some transform opportunity and
+                                # introduce a small coupling to run_code (in which we
+                                # bake some assumptions of what _ast_asyncify returns.
+                                # they are ways around (like grafting part of the ast
+                                # later:
+                                #    - Here, return code_ast.body[0].body[1:-1], as well
+                                #    as last expression in  return statement which is
+                                #    the user code part.
+                                #    - Let it go through the AST transformers, and graft
+                                #    - it back after the AST transform
+                                # But that seem unreasonable, at least while we
+                                # do not need it.
+                                code_ast = _ast_asyncify(cell, 'async-def-wrapper')
+                                _run_async = True
+                            else:
+                                code_ast = compiler.ast_parse(cell, filename=cell_name)
                         else:
                             code_ast = compiler.ast_parse(cell, filename=cell_name)
-                    else:
-                        code_ast = compiler.ast_parse(cell, filename=cell_name)
-                except self.custom_exceptions as e:
-                    etype, value, tb = sys.exc_info()
-                    self.CustomTB(etype, value, tb)
-                    return error_before_exec(e)
-                except IndentationError as e:
-                    self.showindentationerror()
-                    return error_before_exec(e)
-                except (OverflowError, SyntaxError, ValueError, TypeError,
-                        MemoryError) as e:
-                    self.showsyntaxerror()
-                    return error_before_exec(e)
-
-                # Apply AST transformations
-                try:
-                    code_ast = self.transform_ast(code_ast)
-                except InputRejected as e:
-                    self.showtraceback()
-                    return error_before_exec(e)
+                    except self.custom_exceptions as e:
+                        etype, value, tb = sys.exc_info()
+                        self.CustomTB(etype, value, tb)
+                        return error_before_exec(e)
+                    except IndentationError as e:
+                        self.showindentationerror()
+                        return error_before_exec(e)
+                    except (OverflowError, SyntaxError, ValueError, TypeError,
+                            MemoryError) as e:
+                        self.showsyntaxerror()
+                        return error_before_exec(e)
+                    result._add_timing('parse', parse_start)
+
+                    # Apply AST transformations
+                    ast_transform_start = time.perf_counter()
+                    try:
+                        code_ast = self.transform_ast(code_ast)
+                    except InputRejected as e:
+                        self.showtraceback()
+                        return error_before_exec(e)
+                    result._add_timing('ast_transform', ast_transform_start)
 
                 # Give the displayhook a reference to our ExecutionResult so it
                 # can fill in the output value.
                 self.displayhook.exec_result = result
 
                 # Execute the user code
-                interactivity = "none" if silent else self.ast_node_interactivity
                 if _run_async:
                     interactivity = 'async'
 
-                has_raised = await self.run_ast_nodes(code_ast.body, cell_name,
-                       interactivity=interactivity, compiler=compiler, result=result)
+                if codes is not None:
+                    has_raised = await self._run_cached_codes(codes, result)
+                else:
+                    has_raised = await self.run_ast_nodes(code_ast.body, cell_name,
+                           interactivity=interactivity, compiler=compiler, result=result,
+                           code_cache_key=code_cache_key)
+                self._invalidate_completions()
 
                 self.last_execution_succeeded = not has_raised
                 self.last_execution_result = result
@@ -3145,10 +3320,18 @@ def error_before_exec(value):
                 # ExecutionResult
                 self.displayhook.exec_result = None
 
+        # The display hook runs while the code is executed.
+        if 'execute' in result.timings:
+            result.timings['execute'] -= result.timings.get('displayhook', 0.)
+
         if store_history:
             # Write output to the database. Does nothing unless
             # history output logging is enabled.
+            history_start = time.perf_counter()
             self.history_manager.store_output(self.execution_count)
+            result._add_timing('history', history_start)
+            self.history_manager.store_timings(self.execution_count,
+                                               result.timings)
             # Each cell is a *single* input, regardless of how many lines it has
             self.execution_count += 1
 
@@ -3168,7 +3351,12 @@ def transform_cell(self, raw_cell):
         see :meth:`transform_ast`.
         """
         # Static input transformations
-        cell = self.input_transformer_manager.transform_cell(raw_cell)
+        itm = self.input_transformer_manager
+        # Transforms may not be hashable, so the key compares them by identity
+        cell = self._static_transform_cell(raw_cell, (_Identity(itm),) + tuple(
+            tuple(map(_Identity, transforms)) for transforms in (
+                itm.cleanup_transforms, itm.line_transforms,
+                itm.token_transformers)))
 
         if len(cell.splitlines()) == 1:
             # Dynamic transformations - only applied for single line commands
@@ -3216,7 +3404,7 @@ def transform_ast(self, node):
         return node
 
     async def run_ast_nodes(self, nodelist:ListType[AST], cell_name:str, interactivity='last_expr',
-                        compiler=compile, result=None):
+                        compiler=compile, result=None, code_cache_key=None):
         """Run a sequence of AST nodes. The execution mode depends on the
         interactivity parameter.
 
@@ -3246,6 +3434,9 @@ async def run_ast_nodes(self, nodelist:ListType[AST], cell_name:str, interactivi
           the AST nodes into code objects. Default is the built-in compile().
         result : ExecutionResult, optional
           An object to store exceptions that occur during execution.
+        code_cache_key : optional
+          If given, the code objects are cached under this key with
+          ``compiler.cache_code()``, once they have all been compiled.
 
         Returns
         -------
@@ -3297,10 +3488,13 @@ async def run_ast_nodes(self, nodelist:ListType[AST], cell_name:str, interactivi
                 # If interactivity is async the semantics of run_code are
                 # completely different Skip usual machinery.
                 mod = Module(nodelist, [])
+                compile_start = time.perf_counter()
                 async_wrapper_code = compiler(mod, cell_name, 'exec')
                 exec(async_wrapper_code, self.user_global_ns, self.user_ns)
                 async_code = removed_co_newlocals(self.user_ns.pop('async-def-wrapper')).__code__
-                if (await self.run_code(async_code, result, async_=True)):
+                if result is not None:
+                    result._add_timing('compile', compile_start)
+                if (await self._run_code_timed(async_code, result, async_=True)):
                     return True
             else:
                 if sys.version_info > (3, 8):
@@ -3319,15 +3513,22 @@ def compare(code):
                 for node in to_run_interactive:
                     to_run.append((node, 'single'))
 
+                compiled = []
                 for node,mode in to_run:
                     if mode == 'exec':
                         mod = Module([node], [])
                     elif mode == 'single':
                         mod = ast.Interactive([node])
+                    compile_start = time.perf_counter()
                     with compiler.extra_flags(getattr(ast, 'PyCF_ALLOW_TOP_LEVEL_AWAIT', 0x0) if self.autoawait else 0x0):
                         code = compiler(mod, cell_name, mode)
                         asy = compare(code)
-                    if (await self.run_code(code, result,  async_=asy)):
+                    if result is not None:
+                        result._add_timing('compile', compile_start)
+                    compiled.append(code)
+                    if code_cache_key is not None and len(compiled) == len(to_run):
+                        compiler.cache_code(code_cache_key, compiled)
+                    if (await self._run_code_timed(code, result,  async_=asy)):
                         return True
 
             # Flush softspace
@@ -3351,6 +3552,31 @@ def compare(code):
 
         return False
 
+    async def _run_cached_codes(self, codes, result=None):
+        """Run the code objects of a cell, as compiled by run_ast_nodes.
+
+        Returns True if an exception occurred while running code.
+        """
+        for code in codes:
+            asy = inspect.CO_COROUTINE & code.co_flags == inspect.CO_COROUTINE
+            if (await self._run_code_timed(code, result, async_=asy)):
+                return True
+
+        # Flush softspace
+        if softspace(sys.stdout, 0):
+            print()
+        return False
+
+    async def _run_code_timed(self, code_obj, result=None, *, async_=False):
+        """Call run_code, adding its duration to the result's ``execute`` timing."""
+        if result is None:
+            return await self.run_code(code_obj, result, async_=async_)
+        execute_start = time.perf_counter()
+        try:
+            return await self.run_code(code_obj, result, async_=async_)
+        finally:
+            result._add_timing('execute', execute_start)
+
     def _async_exec(self, code_obj: types.CodeType, user_ns: dict):
         """
         Evaluate an asynchronous code object using a code runner
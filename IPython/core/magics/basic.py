@@ -390,6 +390,49 @@ def xmode_switch_err(name):
         except:
             xmode_switch_err('user')
 
+    @line_magic
+    def completer_stats(self, parameter_s=''):
+        """Show how long each tab completion matcher takes.
+
+        %completer_stats [-r]
+
+        For each matcher, shows the number of calls, the mean and maximum
+        durations, a histogram of the durations, and how many times the
+        matcher went over its time budget or was skipped for it (see
+        ``IPCompleter.matcher_time_budgets``), and how many times it was left
+        out for not finishing before the deadline of a concurrent completion
+        (see ``IPCompleter.concurrent_matchers``).
+
+        Options:
+
+          -r: reset the statistics.
+        """
+        opts, args = self.parse_options(parameter_s, 'r')
+        completer = self.shell.Completer
+        if 'r' in opts:
+            completer.matcher_stats.clear()
+            return
+        if not completer.matcher_stats:
+            print("No completions yet.")
+            return
+
+        bounds = next(iter(completer.matcher_stats.values())).bounds
+        buckets = ['<%gms' % (b * 1000) for b in bounds]
+        buckets.append('>=%gms' % (bounds[-1] * 1000))
+        width = max(len(name) for name in completer.matcher_stats)
+        header = ['Matcher'.ljust(width), 'Calls', 'Mean(ms)', 'Max(ms)']
+        header += buckets + ['Over', 'Skipped', 'Dropped']
+        print('  '.join(header))
+        for name, stats in sorted(completer.matcher_stats.items(),
+                                  key=lambda item: -item[1].total):
+            mean = stats.total / stats.calls if stats.calls else 0
+            row = [name.ljust(width), '%5d' % stats.calls,
+                   '%8.1f' % (mean * 1000), '%7.1f' % (stats.max * 1000)]
+            row += [str(n).rjust(len(b)) for n, b in zip(stats.histogram, buckets)]
+            row += ['%4d' % stats.overruns, '%7d' % stats.skipped,
+                    '%7d' % stats.dropped]
+            print('  '.join(row))
+
     @line_magic
     def quickref(self, arg):
         """ Show a quick reference sheet """
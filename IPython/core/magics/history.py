@@ -19,6 +19,7 @@
 
 # Our own packages
 from IPython.core.error import StdinNotImplementedError
+from IPython.core.history import STAT_METRICS
 from IPython.core.magic import Magics, magics_class, line_magic
 from IPython.core.magic_arguments import (argument, magic_arguments,
                                           parse_argstring)
@@ -218,6 +219,74 @@ def _format_lineno(session, line):
         if close_at_end:
             outfile.close()
 
+    @magic_arguments()
+    @argument(
+        '-s', dest='sort', choices=STAT_METRICS, default='wall',
+        help="""
+        the metric to sort cells by: wall or cpu time, increase of the peak
+        RSS, or peak of traced memory allocations. Default: wall.
+        """)
+    @argument(
+        '-n', dest='n', type=int, default=10,
+        help="the number of cells to show. Default: 10.")
+    @argument(
+        '-c', dest='current', action='store_true', default=False,
+        help="only show cells of the current session.")
+    @argument(
+        '-a', dest='allocations', action='store_true', default=False,
+        help="""
+        also show the source lines which allocated the most memory in each
+        cell, if they were recorded.
+        """)
+    @line_magic
+    def cellstats(self, parameter_s=''):
+        """Show the cells which used the most resources, across sessions.
+
+        The resources used by each cell are recorded when
+        ``CellStatsRecorder.enabled`` is set (it can be set at runtime with
+        ``%config CellStatsRecorder.enabled = True``). Set
+        ``CellStatsRecorder.trace_malloc`` to also record memory allocations.
+        Sizes are shown in megabytes.
+
+        Examples
+        --------
+        ::
+
+          In [1]: %cellstats -s cpu -n 3
+          Cell        Wall(s)   CPU(s)  RSS+(MB)  Alloc(MB)  Input
+          12/4          2.310    2.302     120.5          -  x = np.random.rand(...
+          15            0.853    0.851       0.0          -  sorted(data)
+          12/7          0.411    0.052       0.0          -  time.sleep(0.4)
+        """
+        args = parse_argstring(self.cellstats, parameter_s)
+        history_manager = self.shell.history_manager
+        rows = history_manager.get_stats(args.sort, args.n,
+                                         session=0 if args.current else None)
+        if not rows:
+            print("No resource usage recorded. Set "
+                  "CellStatsRecorder.enabled = True to record it.")
+            return
+
+        def mb(value):
+            return '-' if value is None else '%.1f' % (value / 1e6)
+
+        print('Cell        Wall(s)   CPU(s)  RSS+(MB)  Alloc(MB)  Input')
+        for session, line, source, stats in rows:
+            if session == history_manager.session_number:
+                cell = str(line)
+            else:
+                cell = '%s/%s' % (session, line)
+            source = (source or '').strip().split('\n')[0]
+            if len(source) > 25:
+                source = source[:22] + '...'
+            print('%-10s %8.3f %8.3f %9s %10s  %s' % (
+                cell, stats.get('wall', 0), stats.get('cpu', 0),
+                mb(stats.get('rss_delta')), mb(stats.get('malloc_peak')),
+                source))
+            if args.allocations and stats.get('top_allocations'):
+                for site in stats['top_allocations'].splitlines():
+                    print('    ' + site)
+
     @line_magic
     def recall(self, arg):
         r"""Repeat a command, or get command to input line for editing.
@@ -19,6 +19,7 @@
 
 # Our own packages
 from IPython.core import page
+from IPython.core.displayhook import EvictedOutput, estimate_size
 from IPython.core.error import StdinNotImplementedError, UsageError
 from IPython.core.magic import Magics, magics_class, line_magic
 from IPython.testing.skipdoctest import skip_doctest
@@ -601,6 +602,56 @@ def reset(self, parameter_s=''):
 
         gc.collect()
 
+    @line_magic
+    def outcache(self, parameter_s=''):
+        """Show the outputs held in the output cache (``Out``).
+
+        For each output, shows whether it is held in memory, spilled to disk,
+        or only weakly referenced (``weak``, or ``dead`` once it is gone), with
+        its estimated size in megabytes. Outputs are evicted from memory when
+        ``DisplayHook.output_cache_max_bytes`` is set, see also
+        ``DisplayHook.output_cache_evict``.
+
+        Examples
+        --------
+        ::
+
+          In [4]: %outcache
+          3 outputs, 52.4 MB in memory (budget: 100.0 MB), 1 evicted
+          Out  State      Size(MB)  Type
+          1    memory          0.0  int
+          2    spilled        80.0  ndarray
+          3    memory         52.4  DataFrame
+        """
+        displayhook = self.shell.displayhook
+        oh = self.shell.user_ns.get('_oh', {})
+        if not oh:
+            print("The output cache is empty.")
+            return
+        rows = []
+        in_memory = 0
+        evicted = 0
+        for n in sorted(oh):
+            value = dict.get(oh, n)
+            if isinstance(value, EvictedOutput):
+                state, size, type_name = value.state, value.size, value.type_name
+                evicted += 1
+            else:
+                state, type_name = 'memory', type(value).__name__
+                size = getattr(oh, 'sizes', {}).get(n)
+                if size is None:
+                    size = estimate_size(value)
+                in_memory += size
+            rows.append((n, state, size, type_name))
+
+        budget = displayhook.output_cache_max_bytes
+        print("%d outputs, %.1f MB in memory (budget: %s), %d evicted" % (
+            len(rows), in_memory / 1e6,
+            '%.1f MB' % (budget / 1e6) if budget else 'none', evicted))
+        print("Out  State      Size(MB)  Type")
+        for n, state, size, type_name in rows:
+            print("%-4s %-9s %9.1f  %s" % (n, state, size / 1e6, type_name))
+
     @line_magic
     def reset_selective(self, parameter_s=''):
         """Resets the namespace by removing names defined by the user.
@@ -0,0 +1,129 @@
+# encoding: utf-8
+"""Highlighted source, kept between tracebacks and debugger prompts.
+
+Highlighting the source of a frame with pygments takes much longer than
+formatting the rest of it, and the same library files show up in traceback
+after traceback. :data:`highlight_cache` is shared by :mod:`IPython.core.ultratb`
+and :class:`IPython.core.debugger.Pdb`.
+"""
+
+# Copyright (c) IPython Development Team.
+# Distributed under the terms of the Modified BSD License.
+
+import os
+import threading
+from collections import OrderedDict
+
+
+def _source_version(filename, source):
+    """Identify the version of a source file: its modification time, or for
+    code which is not in a file (e.g. interactive cells), a hash of its text.
+    """
+    try:
+        return os.stat(filename).st_mtime_ns
+    except (OSError, ValueError):
+        pass
+    if source is None:
+        return None
+    text = source()
+    return (len(text), hash(text))
+
+
+def _size(value):
+    """Number of characters in the strings in value."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_size(v) for v in value)
+    return 0
+
+
+class HighlightCache(object):
+    """Highlighted regions of source files.
+
+    Entries are keyed by file name, modification time and color scheme. Each
+    holds the highlighted regions (lines, functions...) of that version of the
+    file which were asked for. When the highlighted text takes more than
+    ``max_bytes`` characters, the least recently used files are dropped.
+    """
+
+    def __init__(self, max_bytes=16 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # (filename, version, scheme) -> {region: (value, size)}
+        self._files = OrderedDict()
+        # (filename, scheme) -> the key for the latest version seen
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def version(self, filename, source=None):
+        """Return the version of filename, which :meth:`get` takes to look up
+        several regions of the same file, or None if it can't be cached.
+        source is as for :meth:`get`.
+        """
+        return _source_version(filename, source)
+
+    def get(self, filename, scheme, region, highlight, source=None,
+            version=None):
+        """Return ``highlight()``, the highlighted region of filename, from
+        the cache if it is there.
+
+        scheme identifies how the region is highlighted, and region which
+        part of the file it is: both must be hashable. If filename is not a
+        file, source must be a function returning its text, or nothing is
+        cached. version is the :meth:`version` of filename, if known.
+        """
+        if version is None:
+            version = _source_version(filename, source)
+        if version is None:
+            return highlight()
+        key = (filename, version, scheme)
+        with self._lock:
+            regions = self._files.get(key)
+            if regions is not None:
+                self._files.move_to_end(key)
+                if region in regions:
+                    return regions[region][0]
+
+        value = highlight()
+        size = _size(value)
+        with self._lock:
+            regions = self._files.get(key)
+            if regions is None:
+                # Older versions of the file won't be needed again
+                old = self._latest.get((filename, scheme))
+                if old is not None:
+                    self._drop(old)
+                regions = self._files[key] = {}
+                self._latest[(filename, scheme)] = key
+            if region not in regions:
+                regions[region] = (value, size)
+                self.nbytes += size
+            # Keep the file in use, even if it is too big on its own
+            while self.nbytes > self.max_bytes and len(self._files) > 1:
+                oldest = next(iter(self._files))
+                if oldest == key:
+                    self._files.move_to_end(key)
+                    continue
+                self._drop(oldest)
+        return value
+
+    def _drop(self, key):
+        regions = self._files.pop(key, None)
+        if regions is None:
+            return
+        self.nbytes -= sum(size for _, size in regions.values())
+        filename, _, scheme = key
+        if self._latest.get((filename, scheme)) == key:
+            del self._latest[(filename, scheme)]
+
+    def clear(self):
+        """Forget all highlighted source."""
+        with self._lock:
+            self._files.clear()
+            self._latest.clear()
+            self.nbytes = 0
+
+
+#: The cache shared by tracebacks and the debugger
+highlight_cache = HighlightCache()
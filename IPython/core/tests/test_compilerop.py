@@ -14,6 +14,7 @@
 #-----------------------------------------------------------------------------
 
 # Stdlib imports
+import __future__
 import linecache
 import sys
 
@@ -71,3 +72,60 @@ def test_compiler_check_cache():
             break
     else:
         raise AssertionError('Entry for input-99 missing from linecache')
+
+def test_code_cache():
+    cp = compilerop.CachingCompiler()
+    cp.code_cache_size = 2
+    codes = [compile('x = 1', 'first', 'exec')]
+    key = cp.code_cache_key('x = 1', 'exec')
+    nt.assert_is_none(cp.get_cached_code(key, 'second'))
+    cp.cache_code(key, codes)
+    cached = cp.get_cached_code(key, 'second')
+    if sys.version_info >= (3, 8):
+        nt.assert_equal(cached[0].co_filename, 'second')
+        nt.assert_equal(cp.code_cache_info(), (1, 1, 2, 1))
+    # Different flags are a different key
+    with cp.extra_flags(__future__.annotations.compiler_flag):
+        nt.assert_not_equal(cp.code_cache_key('x = 1', 'exec'), key)
+    # Least recently used code is evicted first
+    cp.cache_code(cp.code_cache_key('y = 1'), codes)
+    cp.get_cached_code(key, 'third')
+    cp.cache_code(cp.code_cache_key('z = 1'), codes)
+    nt.assert_in(key, cp._code_cache)
+    nt.assert_not_in(cp.code_cache_key('y = 1'), cp._code_cache)
+
+def test_linecache_limits():
+    ipython_cache = linecache._ipython_cache
+    linecache._ipython_cache = type(ipython_cache)()
+    try:
+        cp = compilerop.CachingCompiler()
+        cp.linecache_max_entries = 2
+        first = cp.cache('def f():\n    pass\n', 1)
+        code = cp('def f():\n    pass\n', first, 'exec')
+        names = [cp.cache('x = %d' % i, i) for i in range(2, 5)]
+        # The code from the first cell is alive, so the cell is kept
+        nt.assert_equal(list(linecache._ipython_cache), [first, names[-1]])
+        nt.assert_not_in(names[0], linecache.cache)
+        del code
+        cp.cache('x = 5', 5)
+        nt.assert_not_in(first, linecache.cache)
+        nt.assert_equal(len(linecache._ipython_cache), 2)
+
+        cp.linecache_max_entries = 0
+        cp.linecache_max_bytes = 10
+        cp.cache('x = 6', 6)
+        nt.assert_equal(len(linecache._ipython_cache), 2)
+        # The most recent cell is always kept
+        cp.cache('y = 1234567890', 7)
+        nt.assert_equal(len(linecache._ipython_cache), 1)
+
+        # Checking the cache does not drop cells, but restores them after
+        # the cache was cleared
+        linecache.checkcache()
+        nt.assert_in(cp.cache('y = 1234567890', 7), linecache.cache)
+        linecache.clearcache()
+        linecache.checkcache()
+        nt.assert_in(cp.cache('y = 1234567890', 7), linecache.cache)
+    finally:
+        linecache._ipython_cache = ipython_cache
+        linecache.cache.update(ipython_cache)
@@ -7,7 +7,10 @@
 import os
 import sys
 import textwrap
+import threading
+import time
 import unittest
+from unittest import mock
 
 from contextlib import contextmanager
 
@@ -112,6 +115,36 @@ def greedy_completion():
         ip.Completer.greedy = greedy_original
 
 
+def test_unicode_names_cache():
+    """The sorted unicode names are stored on disk and read back."""
+    from unittest import mock
+    import unicodedata
+
+    with TemporaryDirectory() as tmpdir, \
+            mock.patch.object(completer, "get_ipython_cache_dir", lambda: tmpdir), \
+            mock.patch.object(completer, "_unicode_names_cache", None):
+        names = completer._get_unicode_names()
+        nt.assert_equal(names, sorted(names))
+        path = os.path.join(tmpdir, "unicode_names-%s.txt" % unicodedata.unidata_version)
+        assert os.path.exists(path)
+
+        completer._unicode_names_cache = None
+        with mock.patch.object(completer, "_unicode_name_compute") as compute:
+            nt.assert_equal(completer._get_unicode_names(), names)
+        compute.assert_not_called()
+
+
+def test_fwd_unicode_match_prefix():
+    ip = get_ipython()
+    c = ip.Completer
+    name, matches = c.fwd_unicode_match("\\ROMAN NUMERAL FIVE")
+    nt.assert_equal(name, "ROMAN NUMERAL FIVE")
+    expected = [n for n in c.unicode_names if n.startswith("ROMAN NUMERAL FIVE")]
+    nt.assert_equal(list(matches), expected)
+    assert "ROMAN NUMERAL FIVE THOUSAND" in matches
+    nt.assert_equal(c.fwd_unicode_match("\\NOT A UNICODE NAME"), ("", ()))
+
+
 def test_protect_filename():
     if sys.platform == "win32":
         pairs = [
@@ -1276,3 +1309,269 @@ def meth_2(self, meth2_arg1, meth2_arg2):
         _, matches = ip.complete(None, "test.meth(")
         nt.assert_in("meth_arg1=", matches)
         nt.assert_not_in("meth2_arg1=", matches)
+
+    def test_incremental_completion(self):
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+        c.incremental_completion = True
+        computed = []
+        compute = c._compute_completions
+
+        def counting_compute(*args):
+            computed.append(args[0])
+            return compute(*args)
+
+        c._compute_completions = counting_compute
+        try:
+            ip.user_ns.update(zqalpha=1, zqalbum=2, zqbeta=3)
+            _, matches = ip.complete("zq")
+            nt.assert_equal(matches, ["zqalbum", "zqalpha", "zqbeta"])
+            _, matches = ip.complete("zqal")
+            nt.assert_equal(matches, ["zqalbum", "zqalpha"])
+            _, matches = ip.complete("zqalp")
+            nt.assert_equal(matches, ["zqalpha"])
+            nt.assert_equal(computed, ["zq"])
+
+            # Deleting text or changing the context computes completions again
+            ip.complete("z")
+            ip.complete("zqal", "x = zqal")
+            nt.assert_equal(computed, ["zq", "z", "zqal"])
+
+            # So does modifying the namespace
+            ip.push({"zqalcove": 4})
+            _, matches = ip.complete("zqal", "x = zqal")
+            nt.assert_in("zqalcove", matches)
+            ip.run_cell("zqalmanac = 5")
+            _, matches = ip.complete("zqal", "x = zqal")
+            nt.assert_in("zqalmanac", matches)
+            ip.del_var("zqalmanac")
+            _, matches = ip.complete("zqal", "x = zqal")
+            nt.assert_not_in("zqalmanac", matches)
+            nt.assert_equal(len(computed), 6)
+        finally:
+            del c._compute_completions
+            c.incremental_completion = False
+            for name in ("zqalpha", "zqalbum", "zqbeta", "zqalcove"):
+                ip.user_ns.pop(name, None)
+
+    def test_incremental_completion_jedi(self):
+        ip = get_ipython()
+        c = ip.Completer
+        c.incremental_completion = True
+        ip.user_ns.update(zqalpha=1, zqalbum=2, zqbeta=3)
+        try:
+            with provisionalcompleter():
+                c.use_jedi = True
+                list(c.completions("zq", 2))
+                completions = set(c.completions("zqal", 4))
+                c.use_jedi = False
+            nt.assert_in(Completion(0, 4, "zqalpha"), completions)
+            nt.assert_in(Completion(0, 4, "zqalbum"), completions)
+            nt.assert_not_in(Completion(0, 4, "zqbeta"), completions)
+        finally:
+            c.use_jedi = False
+            c.incremental_completion = False
+            for name in ("zqalpha", "zqalbum", "zqbeta"):
+                ip.user_ns.pop(name, None)
+
+    def test_matcher_time_budget(self):
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+        calls = []
+
+        def slow_matcher(text):
+            calls.append(text)
+            time.sleep(0.01)
+            return []
+
+        name = slow_matcher.__qualname__
+        c.custom_matchers.append(slow_matcher)
+        c.matcher_time_budgets = {name: 0.001}
+        c.matcher_budget_strikes = 2
+        c.matcher_budget_cooldown = 2
+        try:
+            for i in range(5):
+                ip.complete("zq")
+            # Over budget twice, skipped for two requests, then tried again
+            stats = c.matcher_stats[name]
+            nt.assert_equal(len(calls), 3)
+            nt.assert_equal(stats.calls, 3)
+            nt.assert_equal(stats.overruns, 3)
+            nt.assert_equal(stats.skipped, 2)
+            nt.assert_equal(sum(stats.histogram), 3)
+            nt.assert_in("IPCompleter.python_matches", c.matcher_stats)
+        finally:
+            c.custom_matchers.remove(slow_matcher)
+            c.matcher_time_budgets = {}
+            c.matcher_budget_strikes = 3
+            c.matcher_budget_cooldown = 20
+
+    def test_completions_from_threads(self):
+        """Requests from several threads run their matchers one at a time"""
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+        active = []
+        overlaps = []
+
+        def slow_matcher(text):
+            active.append(text)
+            overlaps.append(len(active))
+            time.sleep(0.02)
+            if c.text_until_cursor != text:
+                overlaps.append(-1)
+            active.remove(text)
+            return []
+
+        c.custom_matchers.append(slow_matcher)
+        try:
+            threads = [threading.Thread(target=lambda text=text: list(
+                           c.completions(text, len(text))))
+                       for text in ("zqa", "zqbb", "zqccc")]
+            with provisionalcompleter():
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join(10)
+            nt.assert_equal(overlaps, [1, 1, 1])
+        finally:
+            c.custom_matchers.remove(slow_matcher)
+
+    def test_completions_streamed(self):
+        """With is_stale, each matcher's completions come as it finishes, and
+        no more matchers run once the request is stale"""
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+        calls = []
+        stale = []
+
+        def first_matcher(text):
+            calls.append("first")
+            return ["zqfirst"]
+
+        def second_matcher(text):
+            calls.append("second")
+            return ["zqsecond"]
+
+        c.custom_matchers.extend([first_matcher, second_matcher])
+        try:
+            with provisionalcompleter():
+                completions = c.completions("zq", 2, is_stale=lambda: bool(stale))
+                nt.assert_equal(next(completions).text, "zqfirst")
+                nt.assert_equal(calls, ["first"])
+                stale.append(True)
+                nt.assert_equal(list(completions), [])
+                nt.assert_equal(calls, ["first"])
+
+                # Without is_stale, all the matches are sorted together
+                texts = [c.text for c in c.completions("zq", 2)]
+                nt.assert_equal(texts, ["zqfirst", "zqsecond"])
+        finally:
+            c.custom_matchers.remove(first_matcher)
+            c.custom_matchers.remove(second_matcher)
+
+    def test_jedi_runs_without_lock(self):
+        """Other requests can run matchers while Jedi infers completions"""
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = True
+        inferring = threading.Event()
+        release = threading.Event()
+
+        def blocking_jedi(*args):
+            inferring.set()
+            release.wait(10)
+            return []
+
+        c._jedi_matches = blocking_jedi
+        try:
+            with provisionalcompleter():
+                thread = threading.Thread(
+                    target=lambda: list(c.completions("zq", 2)))
+                thread.start()
+                nt.assert_true(inferring.wait(10))
+                nt.assert_true(c._lock.acquire(timeout=5))
+                c._lock.release()
+                release.set()
+                thread.join(10)
+        finally:
+            release.set()
+            del c._jedi_matches
+            c.use_jedi = False
+
+    def test_concurrent_matchers_deadline(self):
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+        release = threading.Event()
+        calls = []
+        seen = []
+
+        def blocking_matcher(text):
+            calls.append(text)
+            release.wait(10)
+            # the state of its own request, not of the one after it
+            seen.append(c.text_until_cursor)
+            return ["zqblocked"]
+
+        name = blocking_matcher.__qualname__
+        c.custom_matchers.append(blocking_matcher)
+        c.concurrent_matchers = True
+        c.completion_deadline = 0.2
+        ip.user_ns["zqalpha"] = 1
+        try:
+            start = time.monotonic()
+            _, matches = ip.complete("zq")
+            nt.assert_less(time.monotonic() - start, 5)
+            nt.assert_equal(matches, ["zqalpha"])
+            # Not called again while it is still running
+            _, matches = ip.complete("zqa")
+            nt.assert_equal(matches, ["zqalpha"])
+            nt.assert_equal(calls, ["zq"])
+            nt.assert_equal(c.matcher_stats[name].dropped, 2)
+
+            release.set()
+            c._running_matchers[name].result(10)
+            nt.assert_equal(seen, ["zq"])
+            c.completion_deadline = 10
+            _, matches = ip.complete("zq")
+            nt.assert_equal(matches, ["zqalpha", "zqblocked"])
+        finally:
+            release.set()
+            c.custom_matchers.remove(blocking_matcher)
+            c.concurrent_matchers = False
+            c.completion_deadline = 0.5
+            del ip.user_ns["zqalpha"]
+
+    def test_concurrent_matchers_errors(self):
+        """Errors are handled as when the matchers run one after the other"""
+        ip = get_ipython()
+        c = ip.Completer
+        c.use_jedi = False
+
+        def failing_matcher(text):
+            raise ValueError("failing_matcher")
+
+        c.custom_matchers.append(failing_matcher)
+        c.concurrent_matchers = True
+        ip.user_ns["zqalpha"] = 1
+        try:
+            for concurrent in (False, True):
+                c.concurrent_matchers = concurrent
+                with mock.patch("sys.excepthook") as excepthook:
+                    _, matches = ip.complete("zq")
+                nt.assert_equal(matches, ["zqalpha"])
+                nt.assert_equal(excepthook.call_count, 1)
+                c.merge_completions = False
+                try:
+                    with nt.assert_raises(ValueError):
+                        ip.complete("zq")
+                finally:
+                    c.merge_completions = True
+        finally:
+            c.custom_matchers.remove(failing_matcher)
+            c.concurrent_matchers = False
+            del ip.user_ns["zqalpha"]
@@ -73,6 +73,28 @@ def test_longer_repr():
         debugger.Tracer()
     nt.assert_equal(trepr(a), ar)
 
+def test_format_stack_entry_source_version():
+    """The source of a frame is hashed once to highlight all its lines"""
+    import linecache
+    from IPython.core import sourcecache
+    source = "def f():\n    x = 1\n    return sys._getframe()\n"
+    linecache.cache['<pdb-cell>'] = (len(source), None,
+                                     source.splitlines(True), '<pdb-cell>')
+    try:
+        ns = {'sys': sys}
+        exec(compile(source, '<pdb-cell>', 'exec'), ns)
+        pdb = debugger.Pdb()
+        pdb.set_colors('Linux')
+        frame = pdb.curframe = ns['f']()
+        with patch.object(sourcecache, '_source_version',
+                          wraps=sourcecache._source_version) as version:
+            text = pdb.format_stack_entry((frame, 3), context=5)
+        nt.assert_equal(version.call_count, 1)
+        nt.assert_in('return', text)
+    finally:
+        del linecache.cache['<pdb-cell>']
+
+
 def test_ipdb_magics():
     '''Test calling some IPython magics from ipdb.
 
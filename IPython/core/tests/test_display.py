@@ -3,8 +3,10 @@
 
 import json
 import os
+import time
 import warnings
 
+from contextlib import contextmanager
 from unittest import mock
 
 import nose.tools as nt
@@ -14,7 +16,7 @@
 from IPython.utils.io import capture_output
 from IPython.utils.tempdir import NamedFileInTemporaryDirectory
 from IPython import paths as ipath
-from IPython.testing.tools import AssertNotPrints
+from IPython.testing.tools import AssertNotPrints, kernel_display_formatter
 
 import IPython.testing.decorators as dec
 
@@ -34,12 +36,20 @@ def test_image_size():
 
 
 def test_image_mimes():
-    fmt = get_ipython().display_formatter.format
-    for format in display.Image._ACCEPTABLE_EMBEDDINGS:
-        mime = display.Image._MIMETYPES[format]
-        img = display.Image(b'garbage', format=format)
-        data, metadata = fmt(img)
-        nt.assert_equal(sorted(data), sorted([mime, 'text/plain']))
+    with kernel_display_formatter(get_ipython()) as formatter:
+        for format in display.Image._ACCEPTABLE_EMBEDDINGS:
+            mime = display.Image._MIMETYPES[format]
+            img = display.Image(b'garbage', format=format)
+            data, metadata = formatter.format(img)
+            nt.assert_equal(sorted(data), sorted([mime, 'text/plain']))
+
+
+def test_image_mimes_terminal():
+    # The terminal only computes what it shows
+    img = display.Image(b'garbage', format='png')
+    data, metadata = get_ipython().display_formatter.format(img)
+    nt.assert_equal(list(data), ['text/plain'])
+    nt.assert_in('image/png', data.compute())
 
 
 def test_geojson():
@@ -453,3 +463,108 @@ def test_display_handle():
         'update': True,
     })
 
+
+class CountedRepr(object):
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def _repr_pretty_(self, p, cycle):
+        self.calls += 1
+        p.text('<%s>' % self.value)
+
+
+@contextmanager
+def _coalescing(rate):
+    pub = get_ipython().display_pub
+    pub.updates_dropped = pub.updates_sent = 0
+    pub.coalesce_updates = True
+    pub.max_update_rate = rate
+    try:
+        yield
+    finally:
+        pub.flush_updates()
+        pub.coalesce_updates = False
+        pub.max_update_rate = 10.0
+
+
+def published(pub):
+    return [(kwargs['data']['text/plain'], kwargs.get('update', False))
+            for args, kwargs in pub.call_args_list]
+
+
+def test_coalesce_updates():
+    ip = get_ipython()
+    objs = [CountedRepr(i) for i in range(100)]
+    with _coalescing(0), mock.patch.object(ip.display_pub, 'publish') as pub:
+        handle = display.display('start', display_id='progress')
+        for obj in objs:
+            handle.update(obj)
+            display.update_display('other %d' % obj.value, display_id='other')
+        nt.assert_equal(published(pub), [("'start'", False)])
+        nt.assert_equal(ip.display_pub.updates_dropped, 198)
+        # Updates are formatted when they are made
+        nt.assert_equal([obj.calls for obj in objs], [1] * 100)
+        objs[-1].value = 'changed'
+        # Pending updates are published before other outputs, in order
+        display.display('done')
+        nt.assert_equal(ip.display_pub.updates_sent, 2)
+    nt.assert_equal(published(pub), [("'start'", False), ('<99>', True),
+                                     ("'other 99'", True), ("'done'", False)])
+
+
+def test_coalesce_updates_rate():
+    ip = get_ipython()
+    with _coalescing(1e-6), mock.patch.object(ip.display_pub, 'publish') as pub:
+        for i in range(10):
+            display.update_display(i, display_id='progress')
+        # The first update is published right away, the next are held back
+        nt.assert_equal(published(pub), [('0', True)])
+        ip.display_pub.flush_updates()
+        nt.assert_equal(published(pub), [('0', True), ('9', True)])
+        nt.assert_equal(ip.display_pub.updates_dropped, 8)
+        nt.assert_equal(ip.display_pub.updates_sent, 2)
+    with _coalescing(1e9), mock.patch.object(ip.display_pub, 'publish') as pub:
+        for i in range(10):
+            display.update_display(i, display_id='progress')
+        nt.assert_equal(pub.call_count, 10)
+        nt.assert_equal(ip.display_pub.updates_dropped, 0)
+
+
+def test_coalesce_updates_timer():
+    ip = get_ipython()
+    with _coalescing(20), mock.patch.object(ip.display_pub, 'publish') as pub:
+        for i in range(10):
+            display.update_display(i, display_id='progress')
+        nt.assert_equal(published(pub), [('0', True)])
+        # The last update is published once the interval has passed
+        deadline = time.monotonic() + 5
+        while pub.call_count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        nt.assert_equal(published(pub), [('0', True), ('9', True)])
+        nt.assert_is_none(ip.display_pub._update_timer)
+
+
+def test_coalesce_updates_errors():
+    class Broken(object):
+        def _repr_pretty_(self, p, cycle):
+            raise ValueError('broken')
+
+    ip = get_ipython()
+    with _coalescing(0), mock.patch.object(ip.display_pub, 'publish') as pub:
+        # Formatter errors are shown when the update is made
+        with mock.patch.object(ip, 'showtraceback') as showtraceback:
+            display.update_display(Broken(), display_id='progress')
+            nt.assert_equal(showtraceback.call_count, 1)
+        # and nothing is left to publish
+        ip.display_pub.flush_updates()
+        nt.assert_equal(pub.call_count, 0)
+
+
+def test_coalesce_updates_end_of_cell():
+    ip = get_ipython()
+    with _coalescing(0), mock.patch.object(ip.display_pub, 'publish') as pub:
+        ip.run_cell("from IPython.display import update_display\n"
+                    "for i in range(5): update_display(i, display_id='x')")
+    nt.assert_equal(published(pub), [('4', True)])
+
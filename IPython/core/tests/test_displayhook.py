@@ -1,6 +1,8 @@
 import sys
 from IPython.testing.tools import AssertPrints, AssertNotPrints
-from IPython.core.displayhook import CapturingDisplayHook
+from IPython.core.displayhook import (CapturingDisplayHook, LazyOutput,
+                                      OutputCache, SpilledOutput, WeakOutput,
+                                      estimate_size)
 from IPython.utils.capture import CapturedIO
 
 def test_output_displayed():
@@ -110,3 +112,147 @@ def test_capture_display_hook_format():
     captured = CapturedIO(sys.stdout, sys.stderr, hook.outputs)
     # Should not raise with RichOutput transformation error
     captured.outputs
+
+
+class Big(object):
+    """An object reporting its size through nbytes, like an array"""
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def __repr__(self):
+        return 'Big(%d)' % self.nbytes
+
+
+def test_estimate_size():
+    assert estimate_size(Big(10**6)) == 10**6
+    assert estimate_size([Big(1000)] * 1000) > 10**6
+    assert estimate_size({'a': 'x' * 1000}) > 1000
+
+
+def test_output_cache_budget():
+    ip.user_ns['Big'] = Big
+    ip.displayhook.output_cache_max_bytes = 10**6
+    try:
+        ip.run_cell('Big(600000)', store_history=True)
+        first = ip.execution_count - 1
+        ip.run_cell('def nbytes_of(n): return eval("_%d" % n).nbytes')
+        ip.run_cell('Big(600000)', store_history=True)
+        oh = ip.user_ns['_oh']
+        assert isinstance(dict.get(oh, first), SpilledOutput)
+        assert type(ip.user_ns['_%d' % first]) is LazyOutput
+        with AssertPrints('spilled'):
+            ip.run_line_magic('outcache', '')
+        # _N is loaded when used, even where the cell doesn't mention it
+        with AssertPrints('%d: 600000' % first):
+            ip.run_cell('print("%d: %%d" %% nbytes_of(%d))' % (first, first))
+        assert type(ip.user_ns['_%d' % first]) is Big
+        assert ip.user_ns['_%d' % first] is oh[first]
+    finally:
+        ip.displayhook.output_cache_max_bytes = 0
+        del ip.user_ns['Big'], ip.user_ns['nbytes_of']
+
+
+def test_output_cache_keeps_shared_outputs():
+    """Outputs also referenced by variables aren't pickled"""
+    ip.user_ns['Big'] = Big
+    ip.displayhook.output_cache_max_bytes = 10**6
+    try:
+        ip.run_cell('kept = Big(600000)')
+        ip.run_cell('kept', store_history=True)
+        first = ip.execution_count - 1
+        ip.run_cell('Big(600000)', store_history=True)
+        ip.run_cell('Big(600000)', store_history=True)
+        oh = ip.user_ns['_oh']
+        assert isinstance(dict.get(oh, first), WeakOutput)
+        assert oh[first] is ip.user_ns['kept']
+        assert isinstance(dict.get(oh, first + 1), SpilledOutput)
+    finally:
+        ip.displayhook.output_cache_max_bytes = 0
+        del ip.user_ns['Big'], ip.user_ns['kept']
+
+
+def test_output_cache_weakref():
+    ns = {}
+    oc = OutputCache()
+    oc.max_bytes, oc.evict, oc.namespace = 100, 'weakref', ns
+    ns['_1'] = oc[1] = Big(80)
+    ns['_2'] = oc[2] = Big(80)
+    assert isinstance(dict.get(oc, 1), WeakOutput)
+    lazy = ns['_1']
+    assert type(lazy) is LazyOutput
+    # Nothing else references it
+    assert oc.get(1) is None
+    assert 1 not in oc
+    assert '_1' not in ns
+    assert getattr(lazy, 'nbytes', None) is None
+    try:
+        lazy + 1
+    except NameError:
+        pass
+    else:
+        assert False, "NameError not raised"
+    assert oc[2].nbytes == 80
+
+
+def test_lazy_output():
+    ns = {}
+    oc = OutputCache()
+    oc.max_bytes, oc.namespace = 100, ns
+    ns['_1'] = oc[1] = [1, 2, 3] * 10
+    ns['_2'] = oc[2] = [4] * 30
+    assert isinstance(dict.get(oc, 1), SpilledOutput)
+    lazy = ns['_1']
+    assert type(lazy) is LazyOutput
+    assert len(lazy) == 30 and lazy[:3] == [1, 2, 3] and lazy + [4] == oc[1] + [4]
+    # _1 is bound to the output again
+    assert ns['_1'] is oc[1]
+
+
+class BigSeq(Big):
+    """An old-style sequence, with neither __iter__ nor __contains__"""
+    def __getitem__(self, index):
+        if index >= 3:
+            raise IndexError(index)
+        return index
+
+
+def test_lazy_output_fallbacks():
+    """The builtins' fallbacks apply to outputs without special methods"""
+    ns = {}
+    oc = OutputCache()
+    oc.max_bytes, oc.namespace = 100, ns
+    ns['_1'] = oc[1] = Big(80)
+    ns['_2'] = oc[2] = BigSeq(80)
+    ns['_3'] = oc[3] = 5
+    ns['_4'] = oc[4] = Big(80)
+    assert isinstance(dict.get(oc, 1), SpilledOutput)
+    assert isinstance(dict.get(oc, 2), SpilledOutput)
+    assert bool(ns['_1']) is True
+    ns['_1'] = LazyOutput(oc, 1)
+    try:
+        len(ns['_1'])
+    except TypeError:
+        pass
+    else:
+        assert False, "TypeError not raised"
+    assert list(ns['_2']) == [0, 1, 2]
+    ns['_2'] = LazyOutput(oc, 2)
+    assert 2 in ns['_2'] and 5 not in ns['_2']
+    lazy = LazyOutput(oc, 4)
+    assert lazy == oc[4] and not lazy != oc[4]
+    assert 1 + LazyOutput(oc, 3) == 6 and 2 ** LazyOutput(oc, 3) == 32
+
+
+def test_output_cache_keeps_referenced_outputs():
+    """Outputs referenced from anything but the output variables aren't
+    pickled"""
+    ns = {}
+    oc = OutputCache()
+    oc.max_bytes, oc.namespace = 100, ns
+    held = [Big(80)]
+    ns['_1'] = oc[1] = held[0]
+    ns['_2'] = ns['_'] = oc[2] = Big(80)
+    ns['_3'] = oc[3] = Big(80)
+    assert isinstance(dict.get(oc, 1), WeakOutput)
+    assert oc[1] is held[0]
+    assert isinstance(dict.get(oc, 2), SpilledOutput)
@@ -1,5 +1,7 @@
 """Tests for the Formatters."""
 
+import copy
+import pickle
 import warnings
 from math import pi
 
@@ -13,8 +15,10 @@
 from traitlets.config import Config
 from IPython.core.formatters import (
     PlainTextFormatter, HTMLFormatter, PDFFormatter, _mod_name_key,
-    DisplayFormatter, JSONFormatter,
+    DisplayFormatter, JSONFormatter, LazyFormatDict,
 )
+from IPython.lib import pretty
+from IPython.testing.tools import kernel_display_formatter
 from IPython.utils.io import capture_output
 
 class A(object):
@@ -186,6 +190,44 @@ def test_lookup_by_type_string():
     nt.assert_not_in(_mod_name_key(C), f.deferred_printers)
     nt.assert_in(C, f.type_printers)
 
+def test_lookup_by_type_cache():
+    f = PlainTextFormatter()
+    def bar_printer(obj, pp, cycle):
+        pp.text('bar')
+    with nt.assert_raises(KeyError):
+        f.lookup_by_type(C)
+    # A cached miss is forgotten when a printer is registered
+    f.for_type(C, foo_printer)
+    nt.assert_is(f.lookup_by_type(C), foo_printer)
+    # so is a cached hit
+    f.for_type(A, foo_printer)
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+    f.for_type(B, bar_printer)
+    nt.assert_is(f.lookup_by_type(B), bar_printer)
+    f.pop(B)
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+    f.pop(A)
+    with nt.assert_raises(KeyError):
+        f.lookup_by_type(B)
+    f.for_type_by_name(A.__module__, 'A', bar_printer)
+    nt.assert_is(f.lookup_by_type(B), bar_printer)
+
+def test_lookup_by_type_cache_direct_changes():
+    f = PlainTextFormatter()
+    f.for_type(A, foo_printer)
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+    f.type_printers[B] = str
+    nt.assert_is(f.lookup_by_type(B), str)
+    f.type_printers[B] = repr
+    nt.assert_is(f.lookup_by_type(B), repr)
+    del f.type_printers[B]
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+    f.type_printers = {}
+    with nt.assert_raises(KeyError):
+        f.lookup_by_type(B)
+    f.deferred_printers[_mod_name_key(B)] = foo_printer
+    nt.assert_is(f.lookup_by_type(B), foo_printer)
+
 def test_in_formatter():
     f = PlainTextFormatter()
     f.for_type(C, foo_printer)
@@ -389,6 +431,29 @@ def test_pretty_max_seq_length():
     nt.assert_equal(len(lines), 1024)
 
 
+def test_pretty_max_chars():
+    f = PlainTextFormatter(max_chars=20)
+    text = f(list(range(100)))
+    nt.assert_equal(text, '[0, 1, 2, 3, 4, 5, 6...')
+    f.max_chars = 0
+    nt.assert_equal(f(list(range(100))), pretty.pretty(list(range(100))))
+
+
+def test_pretty_max_depth():
+    f = PlainTextFormatter(max_depth=1)
+    nt.assert_equal(f({'a': [1], 'b': 2}), "{'a': [...], 'b': 2}")
+
+
+def test_pretty_printer_class():
+    f = PlainTextFormatter(printer_class=pretty.IterativeRepresentationPrinter)
+    deep = []
+    for _ in range(5000):
+        deep = [deep]
+    text = f(deep)
+    nt.assert_equal(text, '[' * 5001 + ']' * 5001)
+    nt.assert_equal(f({'a': (1,)}), "{'a': (1,)}")
+
+
 def test_ipython_display_formatter():
     """Objects with _ipython_display_ defined bypass other formatters"""
     f = get_ipython().display_formatter
@@ -451,13 +516,13 @@ def _repr_png_(self):
         def _repr_html_(self):
             return '<b>hi!</b>'
     
-    f = get_ipython().display_formatter
-    html_f = f.formatters['text/html']
-    save_enabled = html_f.enabled
-    html_f.enabled = True
-    obj = HasReprMime()
-    d, md = f.format(obj)
-    html_f.enabled = save_enabled
+    with kernel_display_formatter(get_ipython()) as f:
+        html_f = f.formatters['text/html']
+        save_enabled = html_f.enabled
+        html_f.enabled = True
+        obj = HasReprMime()
+        d, md = f.format(obj)
+        html_f.enabled = save_enabled
     
     nt.assert_equal(sorted(d), ['application/json+test.v2',
                                 'image/png',
@@ -473,6 +538,84 @@ def _repr_html_(self):
 
 
 
+class ManyReprs(object):
+    def __init__(self):
+        self.calls = []
+
+    def __repr__(self):
+        self.calls.append('text/plain')
+        return 'ManyReprs()'
+
+    def _repr_html_(self):
+        self.calls.append('text/html')
+        return '<b>many</b>'
+
+    def _repr_latex_(self):
+        self.calls.append('text/latex')
+        return '$many$', {'key': 'value'}
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        self.calls.append('mimebundle')
+        return {'application/x-many': 'many', 'text/markdown': '**many**'}
+
+
+def test_consumers():
+    f = DisplayFormatter()
+    nt.assert_is(f.consumed_types, None)
+    obj = ManyReprs()
+    d, md = f.format(obj)
+    nt.assert_equal(sorted(d), ['application/x-many', 'text/html',
+                                'text/latex', 'text/markdown', 'text/plain'])
+
+    f.register_consumer('console', ['text/plain'])
+    f.register_consumer('viewer', ['text/html', 'text/plain'])
+    nt.assert_equal(f.consumed_types, {'text/html', 'text/plain'})
+    obj = ManyReprs()
+    d, md = f.format(obj)
+    nt.assert_equal(d, {'text/plain': 'ManyReprs()', 'text/html': '<b>many</b>'})
+    nt.assert_equal(md, {})
+    nt.assert_equal(sorted(obj.calls), ['mimebundle', 'text/html', 'text/plain'])
+    # include takes precedence
+    d, md = f.format(obj, include={'text/latex'})
+    nt.assert_equal(d, {'text/latex': '$many$'})
+    nt.assert_not_is_instance(d, LazyFormatDict)
+
+    f.unregister_consumer('viewer')
+    nt.assert_equal(f.consumed_types, {'text/plain'})
+    f.unregister_consumer('console')
+    nt.assert_is(f.consumed_types, None)
+
+
+def test_lazy_format_dict():
+    f = DisplayFormatter()
+    f.register_consumer('console', ['text/plain'])
+    obj = ManyReprs()
+    d, md = f.format(obj)
+    nt.assert_is_instance(d, LazyFormatDict)
+    nt.assert_equal(d, {'text/plain': 'ManyReprs()'})
+    del obj.calls[:]
+
+    nt.assert_is(d.compute(['text/latex', 'text/plain']), d)
+    nt.assert_equal(d['text/latex'], '$many$')
+    nt.assert_is(d.metadata, md)
+    nt.assert_equal(md, {'text/latex': {'key': 'value'}})
+    nt.assert_equal(obj.calls, ['mimebundle', 'text/latex'])
+    # Types are only computed once
+    d.compute(['text/latex'])
+    nt.assert_equal(obj.calls, ['mimebundle', 'text/latex'])
+
+    del obj.calls[:]
+    d.compute()
+    nt.assert_equal(sorted(d), ['application/x-many', 'text/html',
+                                'text/latex', 'text/markdown', 'text/plain'])
+    nt.assert_equal(sorted(obj.calls), ['mimebundle', 'text/html'])
+    d.compute()
+    nt.assert_equal(sorted(obj.calls), ['mimebundle', 'text/html'])
+
+    nt.assert_is(type(copy.copy(d)), dict)
+    nt.assert_equal(pickle.loads(pickle.dumps(d)), dict(d))
+
+
 def test_pass_correct_include_exclude():
     class Tester(object):
 
@@ -511,9 +654,9 @@ def _repr_mimebundle_(self, include=None, exclude=None):
             }
             return (data, metadata)
     
-    f = get_ipython().display_formatter
     obj = HasReprMimeMeta()
-    d, md = f.format(obj)
+    with kernel_display_formatter(get_ipython()) as f:
+        d, md = f.format(obj)
     nt.assert_equal(sorted(d), ['image/png', 'text/plain'])
     nt.assert_equal(md, {
         'image/png': {
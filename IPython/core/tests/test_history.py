@@ -10,7 +10,8 @@
 import os
 import sys
 import tempfile
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import sqlite3
 
 # third party
@@ -21,6 +22,7 @@
 from IPython.utils.tempdir import TemporaryDirectory
 from IPython.core.history import HistoryManager, extract_hist_ranges
 from IPython.testing.decorators import skipif
+from unittest import SkipTest
 
 def test_proper_default_encoding():
     nt.assert_equal(sys.getdefaultencoding(), "utf-8")
@@ -212,3 +214,359 @@ def test_histmanager_disabled():
 
     # hist_file should not be created
     nt.assert_false(os.path.exists(hist_file))
+
+
+def test_search_fts_index():
+    """Searching through the full-text index matches the GLOB table scan."""
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file, fts_index=True)
+        try:
+            if not hm._fts_available:
+                raise SkipTest("SQLite lacks FTS5 trigram support")
+            hist = [u'a=1', u'def f():\n    test = 1\n    return test',
+                    u"b='€Æ¾÷ß'", u'print(a)', u'TEST = 2', u'a=1']
+            for i, h in enumerate(hist, start=1):
+                hm.store_inputs(i, h)
+            hm.writeout_cache()
+
+            for kwargs in [dict(pattern="*test*"), dict(pattern="a=1*"),
+                           dict(pattern="*€Æ¾*"), dict(pattern="*a=1*", unique=True),
+                           dict(pattern="*est*", n=1), dict(pattern="*=*")]:
+                hm._fts_available = False
+                expected = list(hm.search(**kwargs))
+                hm._fts_available = True
+                nt.assert_equal(list(hm.search(**kwargs)), expected)
+
+            nt.assert_equal(list(hm.search("*test*")), [(1, 2, hist[1])])
+            nt.assert_equal(list(hm.search("*TEST*")), [(1, 5, hist[4])])
+
+            # The index follows deletions from the history table
+            with hm.db:
+                hm.db.execute("DELETE FROM history WHERE line == 2")
+            nt.assert_equal(list(hm.search("*test*")), [])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+    # An existing history is indexed when the index is first enabled
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        try:
+            hm.store_inputs(1, u'spam = "eggs"')
+            hm.writeout_cache()
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+        hm = HistoryManager(shell=ip, hist_file=hist_file, fts_index=True)
+        try:
+            nt.assert_equal(list(hm.search("*eggs*")), [(1, 1, u'spam = "eggs"')])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_wal_mode_and_cache_timeout():
+    """Cached history is written out after db_cache_timeout, in WAL mode."""
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file, db_wal_mode=True,
+                            db_synchronous='normal', db_cache_size=100,
+                            db_cache_timeout=20)
+        try:
+            mode, = hm.db.execute("PRAGMA journal_mode").fetchone()
+            nt.assert_equal(mode, 'wal')
+            hm.store_inputs(1, u'a = 1')
+            hm.store_inputs(2, u'b = 2')
+            reader = sqlite3.connect(hist_file)
+            try:
+                for _ in range(200):
+                    rows = reader.execute(
+                        "SELECT line, source_raw FROM history").fetchall()
+                    if rows:
+                        break
+                    time.sleep(0.01)
+            finally:
+                reader.close()
+            nt.assert_equal(rows, [(1, u'a = 1'), (2, u'b = 2')])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_compact_archives_sessions():
+    """Archived sessions can still be retrieved and searched."""
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        try:
+            sessions = [[u'a = %d' % s, u'b = %d' % s] for s in range(1, 5)]
+            for cells in sessions:
+                for i, cell in enumerate(cells, start=1):
+                    hm.store_inputs(i, cell)
+                hm.output_hist_reprs[2] = u'out'
+                hm.db_log_output = True
+                hm.store_output(2)
+                hm.reset()
+            hm.writeout_cache()
+            # sessions 1-4 are done, session 5 is the current one
+            nt.assert_equal(hm.session_number, 5)
+            expected_search = list(hm.search(u'a = *'))
+            expected_tail = list(hm.get_tail(5, include_latest=True))
+
+            archived = hm.compact(keep_sessions=2, batch_sessions=2)
+            nt.assert_equal(archived, 3)
+            names = sorted(os.listdir(hm._get_archive_dir()))
+            nt.assert_equal(names, ['history-1-2.sqlite', 'history-3-3.sqlite'])
+            remaining = hm.db.execute("SELECT DISTINCT session FROM history").fetchall()
+            nt.assert_equal(remaining, [(4,)])
+
+            nt.assert_equal(list(hm.get_range(2, output=True)),
+                            [(2, 1, (u'a = 2', None)), (2, 2, (u'b = 2', u'out'))])
+            nt.assert_equal(hm.get_session_info(-3)[0], 2)
+            nt.assert_equal(list(hm.search(u'a = *')), expected_search)
+            nt.assert_equal(list(hm.search(u'* = *', n=3)),
+                            [(3, 2, u'b = 3'), (4, 1, u'a = 4'), (4, 2, u'b = 4')])
+            nt.assert_equal(list(hm.get_tail(5, include_latest=True)),
+                            expected_tail)
+            nt.assert_equal(list(hm.get_tail(3, include_latest=True,
+                                             before=(4, 1))),
+                            [(2, 2, u'b = 2'), (3, 1, u'a = 3'), (3, 2, u'b = 3')])
+
+            # Nothing left to archive
+            nt.assert_equal(hm.compact(keep_sessions=2), 0)
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+            for db in hm._archive_dbs.values():
+                db.close()
+
+
+def test_compact_keeps_running_sessions():
+    """Sessions without an end, e.g. in other processes, aren't archived."""
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        try:
+            for s in range(1, 5):
+                hm.store_inputs(1, u'x = %d' % s)
+                hm.reset()
+            hm.writeout_cache()
+            # session 2 is still running elsewhere
+            with hm.db:
+                hm.db.execute("UPDATE sessions SET end = NULL WHERE session == 2")
+            expected_tail = list(hm.get_tail(4, include_latest=True))
+
+            nt.assert_equal(hm.compact(keep_sessions=1), 3)
+            nt.assert_equal(os.listdir(hm._get_archive_dir()),
+                            ['history-1-4.sqlite'])
+            nt.assert_equal(
+                hm.db.execute("SELECT session FROM sessions").fetchall(),
+                [(2,), (5,)])
+            # its later inputs are found with the others
+            hm.db.execute("INSERT INTO history VALUES (2, 2, 'y', 'y')")
+            nt.assert_equal(list(hm.get_range(2)),
+                            [(2, 1, u'x = 2'), (2, 2, u'y')])
+            nt.assert_equal(list(hm.get_range(3)), [(3, 1, u'x = 3')])
+            nt.assert_equal(list(hm.get_tail(4, include_latest=True)),
+                            expected_tail[1:2] + [(2, 2, u'y')] + expected_tail[2:])
+
+            # and it is archived once it has ended
+            with hm.db:
+                hm.db.execute("UPDATE sessions SET end = ? WHERE session == 2",
+                              (datetime.now(),))
+            nt.assert_equal(hm.compact(keep_sessions=1), 1)
+            nt.assert_equal(list(hm.get_range(2)),
+                            [(2, 1, u'x = 2'), (2, 2, u'y')])
+            nt.assert_equal(sorted(os.listdir(hm._get_archive_dir())),
+                            ['history-1-4.sqlite', 'history-2-2.sqlite'])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+            for db in hm._archive_dbs.values():
+                db.close()
+
+
+def test_compact_stale_sessions():
+    """Sessions with no end left by crashed processes are archived."""
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        try:
+            for s in range(1, 5):
+                hm.store_inputs(1, u'x = %d' % s)
+                hm.reset()
+            hm.writeout_cache()
+            old = datetime.now() - timedelta(days=30)
+            with hm.db:
+                # sessions 1 and 2 crashed a month ago, 3 runs elsewhere
+                hm.db.execute("""UPDATE sessions SET start = ?, end = NULL
+                              WHERE session <= 2""", (old,))
+                hm.db.execute("UPDATE sessions SET end = NULL WHERE session == 3")
+                # the current session started long ago too
+                hm.db.execute("UPDATE sessions SET start = ? WHERE session == 5",
+                              (old,))
+            # they are only taken to have ended once stale_days old
+            nt.assert_equal(hm.compact(keep_sessions=1, stale_days=100), 1)
+            nt.assert_equal(
+                hm.db.execute("SELECT session FROM sessions").fetchall(),
+                [(1,), (2,), (3,), (5,)])
+            # and are then dated by their start
+            nt.assert_equal(hm.compact(keep_days=10), 2)
+            nt.assert_equal(
+                hm.db.execute("SELECT session FROM sessions").fetchall(),
+                [(3,), (5,)])
+            nt.assert_equal(list(hm.get_range(1)), [(1, 1, u'x = 1')])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+            for db in hm._archive_dbs.values():
+                db.close()
+
+
+def test_trim_and_clear_archives():
+    from IPython.core.historyapp import HistoryClear, HistoryTrim
+    from IPython.core.profiledir import ProfileDir
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        for s in range(1, 5):
+            hm.store_inputs(1, u'x = %d' % s)
+            hm.reset()
+        hm.writeout_cache()
+        hm.compact(keep_sessions=1)
+        hm.save_thread.stop()
+        hm.db.close()
+        archive_dir = hm._get_archive_dir()
+        nt.assert_true(os.listdir(archive_dir))
+
+        profile_dir = ProfileDir(location=tmpdir)
+        trim = HistoryTrim(profile_dir=profile_dir, keep=2)
+        trim.start()
+        nt.assert_false(os.path.exists(archive_dir))
+        db = sqlite3.connect(hist_file)
+        try:
+            nt.assert_equal(db.execute(
+                "SELECT session, source_raw FROM history").fetchall(),
+                [(3, u'x = 3'), (4, u'x = 4')])
+        finally:
+            db.close()
+
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        hm.reset()
+        hm.compact(keep_sessions=1)
+        hm.save_thread.stop()
+        hm.db.close()
+        nt.assert_true(os.listdir(archive_dir))
+        HistoryClear(profile_dir=profile_dir, force=True).start()
+        nt.assert_false(os.path.exists(archive_dir))
+        db = sqlite3.connect(hist_file)
+        try:
+            nt.assert_equal(db.execute("SELECT * FROM history").fetchall(), [])
+        finally:
+            db.close()
+
+
+def test_retention_on_startup():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        for s in range(3):
+            hm = HistoryManager(shell=ip, hist_file=hist_file)
+            hm.store_inputs(1, u'x = %d' % s)
+            hm.end_session()
+            hm.save_thread.stop()
+            hm.db.close()
+        hm = HistoryManager(shell=ip, hist_file=hist_file, retain_sessions=2)
+        try:
+            hm.save_thread.stop()
+            nt.assert_equal(
+                hm.db.execute("SELECT session FROM sessions").fetchall(),
+                [(3,), (4,)])
+            nt.assert_equal(list(hm.get_range(1)), [(1, 1, u'x = 0')])
+        finally:
+            hm.db.close()
+            for db in hm._archive_dbs.values():
+                db.close()
+
+
+def test_output_compression_and_truncation():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file, db_log_output=True,
+                            db_compress_output=True, db_output_max_length=20)
+        try:
+            hm.store_inputs(1, u'x')
+            hm.store_output_repr(1, u'short €')
+            hm.store_output(1)
+            hm.store_inputs(2, u'y')
+            long_repr = u'a' * 10 + u'b' * 100 + u'c' * 10
+            hm.store_output_repr(2, long_repr)
+            hm.store_output(2)
+            hm.writeout_cache()
+
+            stored, = hm.db.execute(
+                "SELECT output FROM output_history WHERE line == 1").fetchone()
+            nt.assert_is_instance(stored, bytes)
+            hm.reset()
+            out = [o for _, _, (i, o) in hm.get_range(-1, output=True)]
+            nt.assert_equal(out[0], u'short €')
+            nt.assert_equal(out[1],
+                u'a' * 10 + u'\n...[100 characters truncated]...\n' + u'c' * 10)
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_output_hist_reprs_budget():
+    ip = get_ipython()
+    hm = HistoryManager(shell=ip, hist_file=':memory:')
+    one = sys.getsizeof(u'x' * 100)
+    hm.output_hist_reprs_max_bytes = 2 * one
+    for i in range(1, 6):
+        hm.store_output_repr(i, u'%d' % i * 100)
+    nt.assert_equal(list(hm.output_hist_reprs), [4, 5])
+    # the newest repr is always kept
+    hm.store_output_repr(6, u'6' * 1000)
+    nt.assert_equal(list(hm.output_hist_reprs), [6])
+
+
+def test_store_timings():
+    ip = get_ipython()
+    with TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, 'history.sqlite')
+        hm = HistoryManager(shell=ip, hist_file=hist_file)
+        try:
+            hm.store_timings(1, {'execute': 1.0})
+            hm.db_log_timings = True
+            hm.store_timings(2, {'transform': 0.5, 'execute': 2.0})
+            nt.assert_equal(list(hm.get_timings()),
+                [(hm.session_number, 2, {'transform': 0.5, 'execute': 2.0})])
+            nt.assert_equal(list(hm.get_timings(start=3)), [])
+        finally:
+            hm.save_thread.stop()
+            hm.db.close()
+
+
+def test_store_stats():
+    ip = get_ipython()
+    hm = HistoryManager(shell=ip, hist_file=':memory:')
+    hm.store_inputs(1, u'a', u'a')
+    hm.store_inputs(2, u'b', u'b')
+    hm.store_stats(1, {'wall': 1.0, 'cpu': 0.5})
+    hm.store_stats(2, {'wall': 0.5, 'cpu': 0.1, 'rss_delta': 1024})
+    nt.assert_equal([line for _, line, _, _ in hm.get_stats()], [1, 2])
+    nt.assert_equal(hm.get_stats('rss_delta'),
+        [(hm.session_number, 2, u'b', {'wall': 0.5, 'cpu': 0.1, 'rss_delta': 1024}),
+         (hm.session_number, 1, u'a', {'wall': 1.0, 'cpu': 0.5})])
+    nt.assert_equal(len(hm.get_stats(n=1, session=-1)), 0)
+    with nt.assert_raises(ValueError):
+        hm.get_stats('top_allocations')
@@ -335,3 +335,131 @@ def counter(lines):
     manager.line_transforms.insert(0, counter)
     assert manager.check_complete("b=1\n") == ('complete', None)
     assert count == 0
+
+
+def test_token_transforms_many_lines():
+    # More special lines than TRANSFORM_LOOP_LIMIT, each transformed once
+    lines = []
+    for i in range(ipt2.TRANSFORM_LOOP_LIMIT + 100):
+        lines.append("a%d = !ls\n" % i)
+        lines.append("%%time f(%d)\n" % i)
+    result = ipt2.TransformerManager().do_token_transforms(lines)
+    nt.assert_equal(len(result), len(lines))
+    nt.assert_equal(result[0], "a0 = get_ipython().getoutput('ls')\n")
+    nt.assert_equal(result[-1], "get_ipython().run_line_magic('time', 'f(%d)')\n"
+                                % (ipt2.TRANSFORM_LOOP_LIMIT + 99))
+
+
+def test_token_transforms_one_at_a_time():
+    # Transforming every site in one pass gives the same result as
+    # do_one_token_transform until nothing changes.
+    cell = dedent("""\
+        x = !ls
+        def f():
+            %time g(1, \\
+                    2)
+            y = %pwd
+        foo?
+        z = [1,
+             2]
+        !echo (
+        s = '''
+        !not a command
+        '''
+        obj.attr??
+        %%not_a_cell_magic
+        """)
+    manager = ipt2.TransformerManager()
+    lines = cell.splitlines(keepends=True)
+    expected = lines
+    while True:
+        changed, expected = manager.do_one_token_transform(expected)
+        if not changed:
+            break
+    nt.assert_equal(manager.do_token_transforms(lines), expected)
+
+
+PLAIN_CELLS = [
+    "x = 1",
+    "def f(a, b):\n    return a % b != 0\n",
+    "s = 'not a %magic or !cmd'\nprint(s)\n",
+    "x = [1,\n     2]\n",
+    "# comment\n\nfor i in range(3):\n    pass\n\n\n",
+    "a == b",
+]
+
+SPECIAL_CELLS = [
+    "",
+    "\n\nx = 1",
+    "   x = 1\n   y = 2",
+    "\xa0\nx = 1",
+    ">>> x = 1\n... y = 2",
+    "In [1]: x = 1\n   ...: y = 2",
+    "%%time\nx = 1",
+    "x = 1\n!ls",
+    "def f():\n    %time g()\n",
+    "x = %pwd",
+    "x = \\\n    %pwd",
+    "x =!ls",
+    "obj?",
+    "x = 1\n,f a b",
+    "x = 1\n;f a b",
+    "x = 1\n/f a",
+    "x = 1\r!ls",
+    "x = (1,\n% 2)",
+    "s = 'why?'",
+]
+
+def test_can_skip_transforms():
+    manager = ipt2.TransformerManager()
+    # Any other transformation forces the full path
+    full = ipt2.TransformerManager()
+    full.line_transforms.append(lambda lines: lines)
+    # including ones which can't be hashed
+    unhashable = ipt2.TransformerManager()
+    unhashable.cleanup_transforms.append(type('Unhashable', (), {
+        '__hash__': None, '__call__': lambda self, lines: lines})())
+    for cell in PLAIN_CELLS:
+        nt.assert_true(manager.can_skip_transforms(cell + '\n'), cell)
+        nt.assert_false(full.can_skip_transforms(cell + '\n'), cell)
+        nt.assert_false(unhashable.can_skip_transforms(cell + '\n'), cell)
+    for cell in SPECIAL_CELLS:
+        nt.assert_false(manager.can_skip_transforms(cell + '\n'), cell)
+    for cell in PLAIN_CELLS + SPECIAL_CELLS:
+        nt.assert_equal(manager.transform_cell(cell), full.transform_cell(cell),
+                        cell)
+
+
+def test_incremental_tokenizer():
+    cell = dedent("""\
+        class C:
+            def f(self, a,
+                  b):
+                '''doc
+                string'''
+                if a:  # comment
+
+                    return (a +
+                        b)
+            x = 1
+        2)
+        y = [1,
+        """)
+    lines = cell.splitlines(keepends=True)
+    tokenizer = ipt2.IncrementalTokenizer()
+    # Type the cell line by line, editing lines on the way
+    versions = [lines[:n] for n in range(1, len(lines) + 1)]
+    versions += [lines[:4] + ["        pass\n"] + lines[5:], lines[:3], lines]
+    for version in versions:
+        nt.assert_equal(tokenizer(version), make_tokens_by_line(version))
+
+
+def test_check_complete_incremental():
+    manager = ipt2.TransformerManager()
+    lines = ["def f(x):", "    if x:", "        y = !ls", "    return (x,",
+             "            1)", "", "f(1)", "a = 1 +\\", "  2"]
+    for n in range(1, len(lines) + 1):
+        for cell in ("\n".join(lines[:n]), "\n".join(lines[:n]) + "\n"):
+            nt.assert_equal(manager.check_complete(cell),
+                            ipt2.TransformerManager().check_complete(cell),
+                            cell)
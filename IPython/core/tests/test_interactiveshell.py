@@ -11,6 +11,7 @@
 
 import asyncio
 import ast
+import linecache
 import os
 import signal
 import shutil
@@ -494,6 +495,110 @@ def test_last_execution_result(self):
         self.assertFalse(ip.last_execution_result.success)
         self.assertIsInstance(ip.last_execution_result.error_in_exec, NameError)
 
+    @skipif(sys.version_info < (3, 8))
+    def test_code_cache(self):
+        """Running a cell again reuses its code, with the new cell name"""
+        cell = "def f_code_cache():\n    1/0\nf_code_cache\n"
+        ip.compile._code_cache.clear()
+        hits = ip.compile.code_cache_info().hits
+        ip.run_cell(cell, store_history=True)
+        self.assertEqual(ip.compile.code_cache_info().hits, hits)
+        res = ip.run_cell(cell, store_history=True)
+        self.assertEqual(ip.compile.code_cache_info().hits, hits + 1)
+        self.assertEqual(ip.compile.code_cache_info().currsize, 1)
+        self.assertIs(res.result, ip.user_ns["f_code_cache"])
+        self.assertEqual(ip.user_ns["_"], res.result)
+        # Tracebacks point to the cell which ran the code
+        name = ip.compile.cache(cell, ip.execution_count - 1)
+        self.assertEqual(res.result.__code__.co_filename, name)
+
+    @skipif(sys.version_info < (3, 8))
+    def test_code_cache_ast_transformers(self):
+        """AST transformers, even unhashable ones, run every time"""
+        class Rejecter(ast.NodeTransformer):
+            __hash__ = None
+            calls = 0
+
+            def visit_Name(self, node):
+                self.calls += 1
+                if node.id == 'rejected_code_cache':
+                    raise InputRejected()
+                return node
+
+        rejecter = Rejecter()
+        ip.ast_transformers.append(rejecter)
+        try:
+            hits = ip.compile.code_cache_info().hits
+            for calls in (1, 2):
+                res = ip.run_cell("rejected_code_cache")
+                self.assertIsInstance(res.error_before_exec, InputRejected)
+                self.assertEqual(rejecter.calls, calls)
+            self.assertEqual(ip.compile.code_cache_info().hits, hits)
+        finally:
+            ip.ast_transformers.remove(rejecter)
+
+    def test_unhashable_input_transformer(self):
+        """Unhashable input transformers don't prevent caching the transforms"""
+        class Upper(object):
+            __hash__ = None
+
+            def __call__(self, lines):
+                return [l.replace('lower_transform', 'LOWER_TRANSFORM')
+                        for l in lines]
+
+        cleanup = ip.input_transformer_manager.cleanup_transforms
+        cleanup.append(Upper())
+        try:
+            ip.run_cell("LOWER_TRANSFORM = 1")
+            for _ in range(2):
+                res = ip.run_cell("lower_transform")
+                self.assertIsNone(res.error_before_exec)
+                self.assertEqual(res.result, 1)
+        finally:
+            cleanup.pop()
+        res = ip.run_cell("lower_transform")
+        self.assertIsInstance(res.error_in_exec, NameError)
+
+    def test_code_cache_size(self):
+        ip.code_cache_size = 1
+        try:
+            ip.run_cell("a_code_cache = 1")
+            ip.run_cell("b_code_cache = 2")
+            self.assertEqual(ip.compile.code_cache_info().currsize, 1)
+            ip.code_cache_size = 0
+            ip.run_cell("a_code_cache = 1")
+            self.assertEqual(ip.compile.code_cache_info().currsize, 0)
+        finally:
+            ip.code_cache_size = 128
+
+    def test_traceback_evicted_cell(self):
+        """A cell evicted from linecache is read back from the history"""
+        ip.run_cell("def f_evicted():\n    raise ValueError('evicted')\n",
+                    store_history=True)
+        name = ip.user_ns['f_evicted'].__code__.co_filename
+        del linecache.cache[name], linecache._ipython_cache[name]
+        with tt.AssertPrints("raise ValueError('evicted')"):
+            ip.run_cell("f_evicted()")
+        self.assertIn(name, linecache.cache)
+
+    def test_execution_timings(self):
+        """post_run_cell callbacks see how long each phase took"""
+        seen = []
+        ip.events.register('post_run_cell', seen.append)
+        try:
+            ip.run_cell("import time; time.sleep(0.05); 1", store_history=True)
+        finally:
+            ip.events.unregister('post_run_cell', seen.append)
+        timings = seen[0].timings
+        self.assertEqual(list(timings), ['transform', 'history', 'parse',
+                                         'ast_transform', 'compile',
+                                         'execute', 'displayhook'])
+        self.assertGreaterEqual(timings['execute'], 0.05)
+
+        res = ip.run_cell("1/(")
+        self.assertNotIn('execute', res.timings)
+        self.assertIn('transform', res.timings)
+
     def test_reset_aliasing(self):
         """ Check that standard posix aliases work after %reset. """
         if os.name != 'posix':
@@ -1018,6 +1123,20 @@ def test_run_cell_async():
     assert result.result == 5
 
 
+def test_run_cell_async_stores_timings():
+    """Kernels calling run_cell_async directly get the timings stored"""
+    with mock.patch.object(ip.history_manager, 'store_timings') as store:
+        coro = ip.run_cell_async("1", store_history=True,
+                                 transformed_cell="1\n", transform_time=0.5)
+        result = interactiveshell._pseudo_sync_runner(coro)
+        nt.assert_equal(result.timings['transform'], 0.5)
+        store.assert_called_once_with(result.execution_count, result.timings)
+        # Also when the cell can't be compiled
+        result = ip.run_cell("1/(", store_history=True)
+        store.assert_called_with(result.execution_count, result.timings)
+        nt.assert_equal(store.call_count, 2)
+
+
 def test_should_run_async():
     assert not ip.should_run_async("a = 5")
     assert ip.should_run_async("await x")
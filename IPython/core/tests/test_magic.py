@@ -512,6 +512,37 @@ def test_xmode():
         _ip.magic("xmode")
     nt.assert_equal(_ip.InteractiveTB.mode, xmode)
     
+def test_completer_stats():
+    _ip.run_line_magic("completer_stats", "-r")
+    with tt.AssertPrints("No completions yet."):
+        _ip.run_line_magic("completer_stats", "")
+    _ip.complete("pri")
+    with tt.AssertPrints("IPCompleter.file_matches"):
+        _ip.run_line_magic("completer_stats", "")
+    _ip.run_line_magic("completer_stats", "-r")
+    nt.assert_equal(_ip.Completer.matcher_stats, {})
+
+def test_cellstats():
+    _ip.cell_stats.enabled = True
+    _ip.cell_stats.trace_malloc = True
+    try:
+        _ip.run_cell("import time; time.sleep(0.05)", store_history=True)
+        _ip.run_cell("x_cellstats = [0] * 10**6", store_history=True)
+        _ip.run_cell("x_cellstats = None", store_history=False)
+    finally:
+        _ip.cell_stats.enabled = False
+        _ip.cell_stats.trace_malloc = False
+    line = _ip.execution_count - 1
+    (_, line_alloc, src, stats), = _ip.history_manager.get_stats(
+        'malloc_peak', 1, session=0)
+    nt.assert_equal((line_alloc, src), (line, "x_cellstats = [0] * 10**6"))
+    nt.assert_greater(stats['malloc_peak'], 8 * 10**6)
+    nt.assert_in('<ipython-input-', stats['top_allocations'])
+    with tt.AssertPrints("%d %s" % (line - 1, " " * 8)):
+        _ip.run_line_magic("cellstats", "-c -n 1")
+    with tt.AssertPrints("    <ipython-input-"):
+        _ip.run_line_magic("cellstats", "-c -s malloc_peak -a")
+
 def test_reset_hard():
     monitor = []
     class A(object):
@@ -0,0 +1,82 @@
+# encoding: utf-8
+"""Tests for IPython.core.sourcecache"""
+
+import os
+
+import nose.tools as nt
+
+from IPython.core.sourcecache import HighlightCache
+from IPython.utils.tempdir import TemporaryDirectory
+
+
+def test_highlight_cache():
+    cache = HighlightCache()
+    calls = []
+
+    def highlight(text):
+        def f():
+            calls.append(text)
+            return text.upper()
+        return f
+
+    source = lambda: "a = 1\n"
+    nt.assert_equal(cache.get("<cell>", "s", 1, highlight("a"), source), "A")
+    nt.assert_equal(cache.get("<cell>", "s", 1, highlight("a"), source), "A")
+    nt.assert_equal(cache.get("<cell>", "other", 1, highlight("b"), source), "B")
+    nt.assert_equal(calls, ["a", "b"])
+    nt.assert_equal(cache.nbytes, 2)
+
+    # Without a file or its source, nothing is cached
+    cache.get("<nowhere>", "s", 1, highlight("c"))
+    cache.get("<nowhere>", "s", 1, highlight("c"))
+    nt.assert_equal(calls, ["a", "b", "c", "c"])
+
+
+def test_highlight_cache_new_version():
+    cache = HighlightCache()
+    with TemporaryDirectory() as td:
+        fname = os.path.join(td, "mod.py")
+        with open(fname, "w") as f:
+            f.write("x = 1\n")
+        nt.assert_equal(cache.get(fname, "s", 1, lambda: "old"), "old")
+        nt.assert_equal(cache.get(fname, "s", 1, lambda: "new"), "old")
+        st = os.stat(fname)
+        os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        nt.assert_equal(cache.get(fname, "s", 1, lambda: "new"), "new")
+        # The old version was dropped
+        nt.assert_equal(cache.nbytes, 3)
+
+
+def test_highlight_cache_max_bytes():
+    cache = HighlightCache(max_bytes=10)
+    for name in "abc":
+        cache.get("<%s>" % name, "s", 1, lambda: "x" * 4, source=lambda: name)
+    nt.assert_equal(cache.nbytes, 8)
+    # <a> was the least recently used
+    calls = []
+    cache.get("<b>", "s", 1, lambda: calls.append("b") or "", source=lambda: "b")
+    cache.get("<a>", "s", 1, lambda: calls.append("a") or "x" * 4,
+              source=lambda: "a")
+    nt.assert_equal(calls, ["a"])
+    # A file bigger than the limit is kept while in use
+    nt.assert_equal(cache.get("<d>", "s", 1, lambda: "x" * 20, source=lambda: "d"),
+                    "x" * 20)
+    nt.assert_equal(cache.nbytes, 20)
+
+
+def test_highlight_cache_version():
+    cache = HighlightCache()
+    sources = []
+
+    def source():
+        sources.append(1)
+        return "a\nb\n"
+
+    version = cache.version("<cell>", source)
+    for _ in range(2):
+        for line in "a\n", "b\n":
+            nt.assert_equal(cache.get("<cell>", "s", line, line.upper,
+                                      version=version), line.upper())
+    nt.assert_equal(len(sources), 1)
+    nt.assert_equal(cache.nbytes, 4)
+    nt.assert_is_none(cache.version("<nowhere>"))
@@ -10,6 +10,7 @@
 import traceback
 import unittest
 
+from IPython.core.sourcecache import highlight_cache
 from IPython.core.ultratb import ColorTB, VerboseTB
 
 
@@ -368,6 +369,73 @@ def test_recursion_three_frames(self):
             ip.run_cell("r3o2()")
 
 
+class DeepTracebackTest(unittest.TestCase):
+    DEFINITIONS = "".join(
+        "def d%d():\n    return d%d()\n" % (i, i + 1) for i in range(10)
+    ) + "def d10():\n    1/0\n"
+
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        fname = os.path.join(self.tmpdir.name, "deep.py")
+        with open(fname, "w") as f:
+            f.write(self.DEFINITIONS)
+        self.ns = {}
+        exec(compile(self.DEFINITIONS, fname, "exec"), self.ns)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def format(self, **limits):
+        handler = VerboseTB(color_scheme="NoColor", include_vars=False)
+        try:
+            self.ns["d0"]()
+        except ZeroDivisionError:
+            for name, value in limits.items():
+                setattr(handler, name, value)
+            return handler.text(*sys.exc_info())
+
+    def test_no_limit(self):
+        text = self.format(max_frames=0, max_render_time=0)
+        self.assertNotIn("shown briefly", text)
+        self.assertEqual(text.count("return d"), 10)
+
+    def test_max_frames(self):
+        text = self.format(max_frames=4, max_render_time=0)
+        self.assertIn("[... 8 frames shown briefly", text)
+        # This method and d0, d9 and d10 are rendered with their source
+        for i in (0, 9):
+            self.assertIn("return d%d()" % (i + 1), text)
+        self.assertIn("1/0", text)
+        for i in range(1, 9):
+            self.assertIn("in d%d, line %d" % (i, 2 * i + 2), text)
+            self.assertNotIn("return d%d()" % (i + 1), text)
+
+    def test_max_render_time(self):
+        text = self.format(max_frames=0, max_render_time=1e-9)
+        self.assertIn("[... 12 frames shown briefly", text)
+        self.assertNotIn("1/0", text)
+
+
+class HighlightCacheTest(unittest.TestCase):
+    def test_highlighted_source_reused(self):
+        def divide():
+            return 1/0
+
+        highlight_cache.clear()
+        handler = VerboseTB(color_scheme="Linux")
+        texts, sizes = [], []
+        for _ in range(2):
+            try:
+                divide()
+            except ZeroDivisionError:
+                texts.append(handler.text(*sys.exc_info()))
+            sizes.append(highlight_cache.nbytes)
+        self.assertEqual(texts[0], texts[1])
+        # Nothing was highlighted again
+        self.assertGreater(sizes[0], 0)
+        self.assertEqual(sizes[0], sizes[1])
+
+
 #----------------------------------------------------------------------------
 
 # module testing (minimal)
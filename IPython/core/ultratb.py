@@ -89,8 +89,10 @@
 #*****************************************************************************
 
 
+import functools
 import inspect
 import linecache
+import math
 import pydoc
 import sys
 import time
@@ -105,11 +107,13 @@
 from IPython.core import debugger
 from IPython.core.display_trap import DisplayTrap
 from IPython.core.excolors import exception_colors
+from IPython.core.sourcecache import highlight_cache
 from IPython.utils import path as util_path
 from IPython.utils import py3compat
 from IPython.utils.terminal import get_terminal_size
 
 import IPython.utils.colorable as colorable
+from traitlets import Float, Integer
 
 # Globals
 # amount of space to put line numbers before verbose tracebacks
@@ -124,6 +128,49 @@
 # ---------------------------------------------------------------------------
 # Code begins
 
+@functools.lru_cache()
+def _pygments_formatter():
+    """The formatter highlighting the source of frames in colored tracebacks.
+
+    Frames only highlight their source when it is rendered.
+    """
+    style = get_style_by_name('default')
+    style = stack_data.style_with_executing_node(style, 'bg:#00005f')
+    return Terminal256Formatter(style=style)
+
+
+try:
+    # Private to stack_data: without them, frames are highlighted uncached
+    from stack_data.utils import cached_property
+    _uncached_scope_lines = stack_data.FrameInfo._pygmented_scope_lines.func
+except (ImportError, AttributeError):
+    _uncached_scope_lines = None
+
+
+class _CachedFrameInfo(stack_data.FrameInfo):
+    """A stack_data FrameInfo which reuses the source highlighted for earlier
+    tracebacks, from :data:`IPython.core.sourcecache.highlight_cache`."""
+
+    if _uncached_scope_lines is not None:
+        @cached_property
+        def _pygmented_scope_lines(self):
+            highlight = functools.partial(_uncached_scope_lines, self)
+            scope, node = self.scope, self.executing.node
+            if scope is None:
+                return highlight()
+            formatter = self.options.pygments_formatter
+            # The executing node is highlighted too
+            region = (getattr(scope, 'lineno', 0),
+                      getattr(scope, 'end_lineno', None),
+                      node and (getattr(node, 'lineno', None),
+                                getattr(node, 'col_offset', None),
+                                getattr(node, 'end_lineno', None),
+                                getattr(node, 'end_col_offset', None)))
+            return highlight_cache.get(
+                self.filename, ('pygments', type(formatter), formatter.style),
+                region, highlight, source=lambda: self.source.text)
+
+
 # Helper function -- largely belongs to VerboseTB, but we need the same
 # functionality to produce a pseudo verbose TB for SyntaxErrors, so that they
 # can be recognized properly by ipython.el's py-traceback-line-re
@@ -547,7 +594,27 @@ class VerboseTB(TBTools):
 
     Modified version which optionally strips the topmost entries from the
     traceback, to be used with alternate interpreters (because their own code
-    would appear in the traceback)."""
+    would appear in the traceback).
+
+    Rendering the source and variables of each frame can be slow for very
+    deep tracebacks. Beyond :attr:`max_frames`, or once :attr:`max_render_time`
+    is spent, frames are only shown with their file, function and line
+    number."""
+
+    max_frames = Integer(100,
+        help="""Maximum number of frames of a traceback shown with their source
+        and variables: half of them from the start of the traceback, and the
+        others from its end. The frames in between are shown on one line each.
+        0 means no limit.
+        """
+    ).tag(config=True)
+
+    max_render_time = Float(2.0,
+        help="""Time in seconds after which the remaining frames of a traceback
+        are shown on one line each, without their source and variables. The
+        innermost and outermost frames are rendered first. 0 means no limit.
+        """
+    ).tag(config=True)
 
     def __init__(self, color_scheme='Linux', call_pdb=False, ostream=None,
                  tb_offset=0, long_header=False, include_vars=True,
@@ -644,6 +711,53 @@ def format_record(self, frame_info):
         result += ''.join(_format_traceback_lines(frame_info.lines, Colors, self.has_colors, lvals))
         return result
 
+    def format_record_brief(self, frame_info):
+        """Format a single stack frame on one line, without reading its
+        source"""
+        Colors = self.Colors
+        file = py3compat.cast_unicode(frame_info.filename, util_path.fs_encoding)
+        return '%s%s%s in %s%s%s, line %s\n' % (
+            Colors.filenameEm, util_path.compress_user(file), Colors.Normal,
+            Colors.vName, frame_info.code.co_name, Colors.Normal,
+            frame_info.lineno)
+
+    def format_records(self, records, deadline=math.inf):
+        """Format the frames of a traceback, within the frame and time limits
+
+        records can also contain strings, which are kept as they are.
+        """
+        formatted = list(records)
+        positions = [i for i, r in enumerate(records)
+                     if isinstance(r, stack_data.FrameInfo)]
+        if self.max_frames and len(positions) > self.max_frames:
+            head = self.max_frames // 2
+            positions = positions[:head] + positions[head - self.max_frames:]
+        # The innermost and outermost frames matter most
+        positions = positions[-1:] + positions[:-1]
+        for i in positions:
+            if time.perf_counter() > deadline:
+                break
+            formatted[i] = self.format_record(records[i])
+        result = []
+        brief = 0
+        for i, r in enumerate(formatted):
+            if isinstance(r, stack_data.RepeatedFrames):
+                r = self.format_record(r)
+            elif isinstance(r, stack_data.FrameInfo):
+                r = self.format_record_brief(r)
+                brief += 1
+                # Without blank lines between consecutive brief frames
+                if i and isinstance(formatted[i - 1], stack_data.FrameInfo):
+                    result[-1] += r
+                    continue
+            result.append(r)
+        if brief:
+            result.append(
+                "    %s[... %s frames shown briefly, see VerboseTB.max_frames "
+                "and VerboseTB.max_render_time]%s\n"
+                % (self.Colors.excName, brief, self.Colors.Normal))
+        return result
+
     def prepare_header(self, etype, long_version=False):
         colors = self.Colors  # just a shorthand + quicker name lookup
         colorsnormal = colors.Normal  # used a lot
@@ -680,12 +794,22 @@ def format_exception(self, etype, evalue):
         return ['%s%s%s: %s' % (colors.excName, etype_str,
                                 colorsnormal, py3compat.cast_unicode(evalue_str))]
 
-    def format_exception_as_a_whole(self, etype, evalue, etb, number_of_lines_of_context, tb_offset):
+    def _render_deadline(self):
+        if self.max_render_time:
+            return time.perf_counter() + self.max_render_time
+        return math.inf
+
+    def format_exception_as_a_whole(self, etype, evalue, etb, number_of_lines_of_context, tb_offset,
+                                    deadline=None):
         """Formats the header, traceback and exception message for a single exception.
 
         This may be called multiple times by Python 3 exception chaining
-        (PEP 3134).
+        (PEP 3134). Frames are rendered in full until the time given by
+        ``time.perf_counter()`` reaches deadline, by default
+        :attr:`max_render_time` from now.
         """
+        if deadline is None:
+            deadline = self._render_deadline()
         # some locals
         orig_etype = etype
         try:
@@ -712,7 +836,7 @@ def format_exception_as_a_whole(self, etype, evalue, etb, number_of_lines_of_con
                     % (Colors.excName, skipped, ColorsNormal)
                 )
                 skipped = 0
-            frames.append(self.format_record(r))
+            frames.append(r)
         if skipped:
             Colors = self.Colors  # just a shorthand + quicker name lookup
             ColorsNormal = Colors.Normal  # used a lot
@@ -720,6 +844,7 @@ def format_exception_as_a_whole(self, etype, evalue, etb, number_of_lines_of_con
                 "    %s[... skipping hidden %s frame]%s\n"
                 % (Colors.excName, skipped, ColorsNormal)
             )
+        frames = self.format_records(frames, deadline)
 
         formatted_exception = self.format_exception(etype, evalue)
         if records:
@@ -735,9 +860,7 @@ def get_records(self, etb, number_of_lines_of_context, tb_offset):
         after = context // 2
         before = context - after
         if self.has_colors:
-            style = get_style_by_name('default')
-            style = stack_data.style_with_executing_node(style, 'bg:#00005f')
-            formatter = Terminal256Formatter(style=style)
+            formatter = _pygments_formatter()
         else:
             formatter = None
         options = stack_data.Options(
@@ -745,14 +868,15 @@ def get_records(self, etb, number_of_lines_of_context, tb_offset):
             after=after,
             pygments_formatter=formatter,
         )
-        return list(stack_data.FrameInfo.stack_data(etb, options=options))[tb_offset:]
+        return list(_CachedFrameInfo.stack_data(etb, options=options))[tb_offset:]
 
     def structured_traceback(self, etype, evalue, etb, tb_offset=None,
                              number_of_lines_of_context=5):
         """Return a nice text document describing the traceback."""
-
+        # One time budget for the whole chain of exceptions
+        deadline = self._render_deadline()
         formatted_exception = self.format_exception_as_a_whole(etype, evalue, etb, number_of_lines_of_context,
-                                                               tb_offset)
+                                                               tb_offset, deadline)
 
         colors = self.Colors  # just a shorthand + quicker name lookup
         colorsnormal = colors.Normal  # used a lot
@@ -770,7 +894,7 @@ def structured_traceback(self, etype, evalue, etb, tb_offset=None,
         chained_exc_ids = set()
         while evalue:
             formatted_exceptions += self.format_exception_as_a_whole(etype, evalue, etb, lines_of_context,
-                                                                     chained_exceptions_tb_offset)
+                                                                     chained_exceptions_tb_offset, deadline)
             exception = self.get_parts_of_chained_exception(evalue)
 
             if exception and not id(exception[1]) in chained_exc_ids:
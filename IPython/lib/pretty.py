@@ -109,7 +109,8 @@ def _repr_pretty_(self, p, cycle):
 from IPython.utils.py3compat import PYPY
 
 __all__ = ['pretty', 'pprint', 'PrettyPrinter', 'RepresentationPrinter',
-    'for_type', 'for_type_by_name', 'RawText', 'RawStringLiteral', 'CallExpression']
+    'IterativeRepresentationPrinter', 'for_type', 'for_type_by_name', 'RawText',
+    'RawStringLiteral', 'CallExpression']
 
 
 MAX_SEQ_LENGTH = 1000
@@ -149,22 +150,26 @@ def _sorted_for_pprint(items):
         except Exception:
             return items
 
-def pretty(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+def pretty(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+           max_chars=0, max_depth=0):
     """
     Pretty print the object's representation.
     """
     stream = StringIO()
-    printer = RepresentationPrinter(stream, verbose, max_width, newline, max_seq_length=max_seq_length)
+    printer = RepresentationPrinter(stream, verbose, max_width, newline, max_seq_length=max_seq_length,
+                                    max_chars=max_chars, max_depth=max_depth)
     printer.pretty(obj)
     printer.flush()
     return stream.getvalue()
 
 
-def pprint(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+def pprint(obj, verbose=False, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+           max_chars=0, max_depth=0):
     """
     Like `pretty` but print to stdout.
     """
-    printer = RepresentationPrinter(sys.stdout, verbose, max_width, newline, max_seq_length=max_seq_length)
+    printer = RepresentationPrinter(sys.stdout, verbose, max_width, newline, max_seq_length=max_seq_length,
+                                    max_chars=max_chars, max_depth=max_depth)
     printer.pretty(obj)
     printer.flush()
     sys.stdout.write(newline)
@@ -196,13 +201,21 @@ class PrettyPrinter(_PrettyPrinterBase):
     generate pretty reprs of objects.  Contrary to the `RepresentationPrinter`
     this printer knows nothing about the default pprinters or the `_repr_pretty_`
     callback method.
+
+    When ``max_chars`` is set, the output stops after that many characters
+    with a ``...`` marker, and :attr:`truncated` becomes True: the text added
+    afterwards is ignored.
     """
 
-    def __init__(self, output, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH):
+    def __init__(self, output, max_width=79, newline='\n', max_seq_length=MAX_SEQ_LENGTH,
+                 max_chars=0):
         self.output = output
         self.max_width = max_width
         self.newline = newline
         self.max_seq_length = max_seq_length
+        self.max_chars = max_chars
+        self.chars = 0
+        self.truncated = False
         self.output_width = 0
         self.buffer_width = 0
         self.buffer = deque()
@@ -231,7 +244,14 @@ def _break_outer_groups(self):
 
     def text(self, obj):
         """Add literal text to the output."""
+        if self.truncated:
+            return
         width = len(obj)
+        if self.max_chars and self.chars + width > self.max_chars:
+            obj = obj[:max(self.max_chars - self.chars, 0)] + '...'
+            width = len(obj)
+            self.truncated = True
+        self.chars += width
         if self.buffer:
             text = self.buffer[-1]
             if not isinstance(text, Text):
@@ -250,7 +270,12 @@ def breakable(self, sep=' '):
         will automatically break here.  If no breaking on this position takes
         place the `sep` is inserted which default to one space.
         """
+        if self.truncated:
+            return
         width = len(sep)
+        if self.max_chars and self.chars + width > self.max_chars:
+            self.text(sep)
+            return
         group = self.group_stack[-1]
         if group.want_break:
             self.flush()
@@ -258,7 +283,9 @@ def breakable(self, sep=' '):
             self.output.write(' ' * self.indentation)
             self.output_width = self.indentation
             self.buffer_width = 0
+            self.chars += len(self.newline) + self.indentation
         else:
+            self.chars += width
             self.buffer.append(Breakable(sep, width, self))
             self.buffer_width += width
             self._break_outer_groups()
@@ -267,6 +294,8 @@ def break_(self):
         """
         Explicitly insert a newline into the output, maintaining correct indentation.
         """
+        if self.truncated:
+            return
         group = self.group_queue.deq()
         if group:
             self._break_one_group(group)
@@ -275,6 +304,7 @@ def break_(self):
         self.output.write(' ' * self.indentation)
         self.output_width = self.indentation
         self.buffer_width = 0
+        self.chars += len(self.newline) + self.indentation
 
 
     def begin_group(self, indent=0, open=''):
@@ -294,6 +324,8 @@ def begin_group(self, indent=0, open=''):
     def _enumerate(self, seq):
         """like enumerate, but with an upper limit on the number of items"""
         for idx, x in enumerate(seq):
+            if self.truncated:
+                return
             if self.max_seq_length and idx >= self.max_seq_length:
                 self.text(',')
                 self.breakable()
@@ -350,13 +382,19 @@ class RepresentationPrinter(PrettyPrinter):
     output.  For example the default instance repr prints all attributes and
     methods that are not prefixed by an underscore if the printer is in
     verbose mode.
+
+    Objects nested more than ``max_depth`` levels deep are printed as if they
+    were cycles, e.g. ``[...]``. Once ``max_chars`` are printed, the objects
+    left are not visited.
     """
 
     def __init__(self, output, verbose=False, max_width=79, newline='\n',
         singleton_pprinters=None, type_pprinters=None, deferred_pprinters=None,
-        max_seq_length=MAX_SEQ_LENGTH):
+        max_seq_length=MAX_SEQ_LENGTH, max_chars=0, max_depth=0):
 
-        PrettyPrinter.__init__(self, output, max_width, newline, max_seq_length=max_seq_length)
+        PrettyPrinter.__init__(self, output, max_width, newline, max_seq_length=max_seq_length,
+                               max_chars=max_chars)
+        self.max_depth = max_depth
         self.verbose = verbose
         self.stack = []
         if singleton_pprinters is None:
@@ -371,8 +409,11 @@ def __init__(self, output, verbose=False, max_width=79, newline='\n',
 
     def pretty(self, obj):
         """Pretty print the given object."""
+        if self.truncated:
+            return
         obj_id = id(obj)
-        cycle = obj_id in self.stack
+        cycle = obj_id in self.stack or (
+            self.max_depth > 0 and len(self.stack) >= self.max_depth)
         self.stack.append(obj_id)
         self.begin_group()
         try:
@@ -381,39 +422,41 @@ def pretty(self, obj):
             try:
                 printer = self.singleton_pprinters[obj_id]
             except (TypeError, KeyError):
-                pass
-            else:
-                return printer(obj, self, cycle)
-            # Next walk the mro and check for either:
-            #   1) a registered printer
-            #   2) a _repr_pretty_ method
-            for cls in _get_mro(obj_class):
-                if cls in self.type_pprinters:
-                    # printer registered in self.type_pprinters
-                    return self.type_pprinters[cls](obj, self, cycle)
-                else:
-                    # deferred printer
-                    printer = self._in_deferred_types(cls)
-                    if printer is not None:
-                        return printer(obj, self, cycle)
-                    else:
-                        # Finally look for special method names.
-                        # Some objects automatically create any requested
-                        # attribute. Try to ignore most of them by checking for
-                        # callability.
-                        if '_repr_pretty_' in cls.__dict__:
-                            meth = cls._repr_pretty_
-                            if callable(meth):
-                                return meth(obj, self, cycle)
-                        if cls is not object \
-                                and callable(cls.__dict__.get('__repr__')):
-                            return _repr_pprint(obj, self, cycle)
-
-            return _default_pprint(obj, self, cycle)
+                printer = self._class_printer(obj_class)
+            return printer(obj, self, cycle)
         finally:
             self.end_group()
             self.stack.pop()
 
+    def _class_printer(self, obj_class):
+        """Return the printer for instances of obj_class."""
+        # Walk the mro and check for either:
+        #   1) a registered printer
+        #   2) a _repr_pretty_ method
+        for cls in _get_mro(obj_class):
+            if cls in self.type_pprinters:
+                # printer registered in self.type_pprinters
+                return self.type_pprinters[cls]
+            else:
+                # deferred printer
+                printer = self._in_deferred_types(cls)
+                if printer is not None:
+                    return printer
+                else:
+                    # Finally look for special method names.
+                    # Some objects automatically create any requested
+                    # attribute. Try to ignore most of them by checking for
+                    # callability.
+                    if '_repr_pretty_' in cls.__dict__:
+                        meth = cls._repr_pretty_
+                        if callable(meth):
+                            return meth
+                    if cls is not object \
+                            and callable(cls.__dict__.get('__repr__')):
+                        return _repr_pprint
+
+        return _default_pprint
+
     def _in_deferred_types(self, cls):
         """
         Check if the given class is specified in the deferred type registry.
@@ -433,13 +476,111 @@ class is not in the registry. Successful matches will be moved to the
         return printer
 
 
+class IterativeRepresentationPrinter(RepresentationPrinter):
+    """
+    A `RepresentationPrinter` which prints nested lists, tuples, sets and
+    dicts without recursing.
+
+    The built-in printers for these types are written as generators, which
+    yield the items to print in between their own text. This printer keeps
+    them on an explicit stack, so deeply nested containers don't raise
+    `RecursionError`. It also remembers the printer found for each class, and
+    skips the empty groups around one-line reprs. Any other printer, including
+    `_repr_pretty_` methods, is called as usual, and its calls to `pretty`
+    print their argument in the same way. The output is the same as with
+    `RepresentationPrinter`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        RepresentationPrinter.__init__(self, *args, **kwargs)
+        # class -> (printer, steps generator function or None)
+        self._printers = {}
+        # Number of times each id is in self.stack
+        self._stack_ids = {}
+
+    def pretty(self, obj):
+        """Pretty print the given object."""
+        # The containers being printed, innermost last
+        containers = []
+        try:
+            while True:
+                steps = self._start(obj)
+                if steps is not None:
+                    containers.append(steps)
+                # Resume the innermost container with items left to print
+                while containers:
+                    try:
+                        obj = next(containers[-1])
+                    except StopIteration:
+                        containers.pop()
+                        self._finish()
+                    else:
+                        break
+                else:
+                    return
+        finally:
+            # Only left on errors
+            for steps in containers:
+                self._finish()
+
+    def _start(self, obj):
+        """Print obj, or return the generator printing it."""
+        if self.truncated:
+            return None
+        obj_id = id(obj)
+        obj_class = _safe_getattr(obj, '__class__', None) or type(obj)
+        try:
+            printer = self.singleton_pprinters[obj_id]
+            steps = None
+        except (TypeError, KeyError):
+            try:
+                printer, steps = self._printers[obj_class]
+            except (TypeError, KeyError):
+                printer = self._class_printer(obj_class)
+                steps = _steps_of(printer)
+                try:
+                    self._printers[obj_class] = printer, steps
+                except TypeError:
+                    pass
+        if printer is _repr_pprint:
+            lines = _repr_lines(obj, self)
+            if len(lines) == 1:
+                # Most objects: their groups would hold no breakable
+                self.text(lines[0])
+                return None
+            printer = lambda obj, p, cycle: _print_lines(lines, p)
+
+        count = self._stack_ids.get(obj_id, 0)
+        cycle = count > 0 or (self.max_depth > 0 and len(self.stack) >= self.max_depth)
+        self._stack_ids[obj_id] = count + 1
+        self.stack.append(obj_id)
+        self.begin_group()
+        try:
+            if steps is not None:
+                return steps(obj, self, cycle)
+            printer(obj, self, cycle)
+        except BaseException:
+            self._finish()
+            raise
+        self._finish()
+
+    def _finish(self):
+        self.end_group()
+        obj_id = self.stack.pop()
+        count = self._stack_ids.pop(obj_id)
+        if count > 1:
+            self._stack_ids[obj_id] = count - 1
+
+
 class Printable(object):
+    __slots__ = ()
 
     def output(self, stream, output_width):
         return output_width
 
 
 class Text(Printable):
+    __slots__ = ('objs', 'width')
 
     def __init__(self):
         self.objs = []
@@ -456,6 +597,7 @@ def add(self, obj, width):
 
 
 class Breakable(Printable):
+    __slots__ = ('obj', 'width', 'pretty', 'indentation', 'group')
 
     def __init__(self, seq, width, pretty):
         self.obj = seq
@@ -470,6 +612,8 @@ def output(self, stream, output_width):
         if self.group.want_break:
             stream.write(self.pretty.newline)
             stream.write(' ' * self.indentation)
+            # Counted as the separator when it was added
+            self.pretty.chars += len(self.pretty.newline) + self.indentation - self.width
             return self.indentation
         if not self.group.breakables:
             self.pretty.group_queue.remove(self.group)
@@ -478,6 +622,7 @@ def output(self, stream, output_width):
 
 
 class Group(Printable):
+    __slots__ = ('depth', 'breakables', 'want_break')
 
     def __init__(self, depth):
         self.depth = depth
@@ -623,35 +768,57 @@ def _default_pprint(obj, p, cycle):
     p.end_group(1, '>')
 
 
+def _pprinter_from_steps(steps):
+    """
+    Make a pprint function from a generator function, which prints an object
+    and yields the objects to pretty print in between.
+    `IterativeRepresentationPrinter` runs the generator itself.
+    """
+    def inner(obj, p, cycle):
+        for x in steps(obj, p, cycle):
+            p.pretty(x)
+    inner._steps = steps
+    return inner
+
+
+def _steps_of(printer):
+    """Return the generator function behind a printer, or None."""
+    if isinstance(printer, types.FunctionType):
+        return printer.__dict__.get('_steps')
+    return None
+
+
 def _seq_pprinter_factory(start, end):
     """
     Factory that returns a pprint function useful for sequences.  Used by
     the default pprint for tuples, dicts, and lists.
     """
-    def inner(obj, p, cycle):
+    def steps(obj, p, cycle):
         if cycle:
-            return p.text(start + '...' + end)
+            p.text(start + '...' + end)
+            return
         step = len(start)
         p.begin_group(step, start)
         for idx, x in p._enumerate(obj):
             if idx:
                 p.text(',')
                 p.breakable()
-            p.pretty(x)
+            yield x
         if len(obj) == 1 and isinstance(obj, tuple):
             # Special case for 1-item tuples.
             p.text(',')
         p.end_group(step, end)
-    return inner
+    return _pprinter_from_steps(steps)
 
 
 def _set_pprinter_factory(start, end):
     """
     Factory that returns a pprint function useful for sets and frozensets.
     """
-    def inner(obj, p, cycle):
+    def steps(obj, p, cycle):
         if cycle:
-            return p.text(start + '...' + end)
+            p.text(start + '...' + end)
+            return
         if len(obj) == 0:
             # Special case.
             p.text(type(obj).__name__ + '()')
@@ -667,9 +834,9 @@ def inner(obj, p, cycle):
                 if idx:
                     p.text(',')
                     p.breakable()
-                p.pretty(x)
+                yield x
             p.end_group(step, end)
-    return inner
+    return _pprinter_from_steps(steps)
 
 
 def _dict_pprinter_factory(start, end):
@@ -677,9 +844,10 @@ def _dict_pprinter_factory(start, end):
     Factory that returns a pprint function used by the default pprint of
     dicts and dict proxies.
     """
-    def inner(obj, p, cycle):
+    def steps(obj, p, cycle):
         if cycle:
-            return p.text('{...}')
+            p.text('{...}')
+            return
         step = len(start)
         p.begin_group(step, start)
         keys = obj.keys()
@@ -687,11 +855,11 @@ def inner(obj, p, cycle):
             if idx:
                 p.text(',')
                 p.breakable()
-            p.pretty(key)
+            yield key
             p.text(': ')
-            p.pretty(obj[key])
+            yield obj[key]
         p.end_group(step, end)
-    return inner
+    return _pprinter_from_steps(steps)
 
 
 def _super_pprint(obj, p, cycle):
@@ -774,14 +942,27 @@ def _type_pprint(obj, p, cycle):
 
 def _repr_pprint(obj, p, cycle):
     """A pprint that just redirects to the normal repr function."""
-    # Find newlines and replace them with p.break_()
-    output = repr(obj)
-    lines = output.splitlines()
-    with p.group():
+    _print_lines(_repr_lines(obj, p), p)
+
+
+def _repr_lines(obj, p):
+    """The lines of the repr of obj."""
+    if p.max_chars and type(obj) in (str, bytes):
+        # Don't copy a huge string only to truncate its repr
+        obj = obj[:p.max_chars - p.chars + 1]
+    return repr(obj).splitlines()
+
+
+def _print_lines(lines, p):
+    # Replace the newlines with p.break_()
+    p.begin_group()
+    try:
         for idx, output_line in enumerate(lines):
             if idx:
                 p.break_()
             p.text(output_line)
+    finally:
+        p.end_group()
 
 
 def _function_pprint(obj, p, cycle):
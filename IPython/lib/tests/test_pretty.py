@@ -7,6 +7,7 @@
 
 from collections import Counter, defaultdict, deque, OrderedDict
 import os
+import sys
 import types
 import string
 import unittest
@@ -470,3 +471,124 @@ def test_custom_repr():
     nt.assert_in("OrderedCounter(OrderedDict", pretty.pretty(oc))
 
     nt.assert_equal(pretty.pretty(MySet()), 'mine')
+
+
+class Counted(object):
+    calls = 0
+
+    def _repr_pretty_(self, p, cycle):
+        Counted.calls += 1
+        p.text('Counted()')
+
+
+def test_max_chars():
+    nested = {'a%d' % i: [list(range(10)), 'x' * 20] for i in range(1000)}
+    output = pretty.pretty(nested, max_chars=100)
+    nt.assert_true(output.endswith('...'))
+    # Line breaks may take a few more characters than spaces
+    nt.assert_less_equal(len(output), 110)
+    nt.assert_true(pretty.pretty(nested).startswith(output[:-3]))
+    # No truncation when the output fits
+    nt.assert_equal(pretty.pretty([1, 2], max_chars=6), '[1, 2]')
+    nt.assert_equal(pretty.pretty([1, 2], max_chars=5), '[1, 2...')
+    nt.assert_equal(pretty.pretty('y' * 10**6, max_chars=5), "'yyyy...")
+
+
+class ReprStr(str):
+    def __repr__(self):
+        return 'ReprStr<%d>' % len(self)
+
+
+class ReprBytes(bytes):
+    def __repr__(self):
+        return 'ReprBytes<%d>' % len(self)
+
+
+def test_max_chars_subclass_repr():
+    # Subclasses of str and bytes keep their own repr
+    for printer in (pretty.RepresentationPrinter,
+                    pretty.IterativeRepresentationPrinter):
+        for obj, expected in ((ReprStr('abc'), 'ReprStr<3>'),
+                              (ReprBytes(b'abc'), 'ReprBytes<3>')):
+            stream = StringIO()
+            p = printer(stream, max_chars=100)
+            p.pretty(obj)
+            p.flush()
+            nt.assert_equal(stream.getvalue(), expected)
+        stream = StringIO()
+        p = printer(stream, max_chars=5)
+        p.pretty(ReprStr('a' * 100))
+        p.flush()
+        nt.assert_equal(stream.getvalue(), 'ReprS...')
+
+
+def test_max_chars_stops_traversal():
+    Counted.calls = 0
+    pretty.pretty([Counted() for _ in range(10000)], max_chars=100,
+                  max_seq_length=0)
+    nt.assert_less(Counted.calls, 20)
+
+
+def test_max_depth():
+    nt.assert_equal(pretty.pretty([1, [2, [3, [4]]]], max_depth=2),
+                    '[1, [2, [...]]]')
+    nt.assert_equal(pretty.pretty({'a': {'b': {}}}, max_depth=1),
+                    "{'a': {...}}")
+    nt.assert_equal(pretty.pretty([1, [2, [3, [4]]]], max_depth=0),
+                    '[1, [2, [3, [4]]]]')
+
+
+class PrettyItems(object):
+    def __init__(self, *items):
+        self.items = items
+
+    def _repr_pretty_(self, p, cycle):
+        with p.group(13, 'PrettyItems(', ')'):
+            for idx, item in enumerate(self.items):
+                if idx:
+                    p.text(',')
+                    p.breakable()
+                p.pretty(item)
+
+
+class MultilineRepr(object):
+    def __repr__(self):
+        return 'first line\n  second line'
+
+
+def test_iterative_printer():
+    cyclic = [1, 2]
+    cyclic.append(cyclic)
+    objects = [
+        [1, (2,), {3}, frozenset(), {'a': [4.5, None, 'x' * 100]}],
+        {'key %d' % i: list(range(i)) for i in range(20)},
+        PrettyItems([1, 2], {'a': PrettyItems(cyclic)}, MultilineRepr()),
+        [MultilineRepr()] * 5,
+        OrderedDict([('a', deque([1, 2])), ('b', defaultdict(list, a=[3]))]),
+        cyclic,
+        [[[[1, [2]]]]],
+    ]
+    for obj in objects:
+        for kwargs in ({}, {'max_width': 20}, {'max_seq_length': 2},
+                       {'max_depth': 2}, {'max_chars': 40}):
+            outputs = []
+            for cls in (pretty.RepresentationPrinter,
+                        pretty.IterativeRepresentationPrinter):
+                stream = StringIO()
+                printer = cls(stream, **kwargs)
+                printer.pretty(obj)
+                printer.flush()
+                outputs.append(stream.getvalue())
+            nt.assert_equal(outputs[0], outputs[1])
+
+
+def test_iterative_printer_deep():
+    depth = 10 * sys.getrecursionlimit()
+    deep = []
+    for _ in range(depth):
+        deep = [{'a': deep}]
+    stream = StringIO()
+    printer = pretty.IterativeRepresentationPrinter(stream)
+    printer.pretty(deep)
+    printer.flush()
+    nt.assert_equal(stream.getvalue(), "[{'a': " * depth + "[]" + "}]" * depth)
@@ -19,7 +19,8 @@
 from prompt_toolkit.enums import DEFAULT_BUFFER, EditingMode
 from prompt_toolkit.filters import (HasFocus, Condition, IsDone)
 from prompt_toolkit.formatted_text import PygmentsTokens
-from prompt_toolkit.history import InMemoryHistory
+from prompt_toolkit.history import InMemoryHistory, ThreadedHistory
+from prompt_toolkit.key_binding import merge_key_bindings
 from prompt_toolkit.layout.processors import ConditionalProcessor, HighlightMatchingBracketProcessor
 from prompt_toolkit.output import ColorDepth
 from prompt_toolkit.patch_stdout import patch_stdout
@@ -36,7 +37,7 @@
 from .magics import TerminalMagics
 from .pt_inputhooks import get_inputhook_name_and_func
 from .prompts import Prompts, ClassicPrompts, RichPromptDisplayHook
-from .ptutils import IPythonPTCompleter, IPythonPTLexer
+from .ptutils import IPythonPTCompleter, IPythonPTHistory, IPythonPTLexer
 from .shortcuts import create_ipython_shortcuts
 
 DISPLAY_BANNER_DEPRECATED = object()
@@ -253,10 +254,34 @@ def _displayhook_class_default(self):
              "may be changed or removed in later releases."
     ).tag(config=True)
 
+    complete_in_thread = Bool(False,
+        help="""Compute tab completions in a background thread.
+
+        The prompt stays responsive while slow completions (e.g. Jedi
+        inference, or dictionary keys of large objects) are computed, and the
+        results of a completion request are discarded as soon as a newer
+        request starts. Completion latencies are logged at debug level.
+        """
+    ).tag(config=True)
+
     enable_history_search = Bool(True,
         help="Allows to enable/disable the prompt toolkit history search"
     ).tag(config=True)
 
+    lazy_history_load = Bool(False,
+        help="""Load the prompt history from the history database a page at
+        a time, newest entries first, as the up arrow reaches them, instead of
+        reading `history_load_length` entries at startup. Searches with Ctrl-R
+        or by prefix read the rest of the history.
+
+        Startup time then does not depend on the size of the history, and the
+        whole history, archived sessions included, can be reached with the up
+        arrow and history search. Requires an SQLite history file (not
+        `:memory:`). With prompt_toolkit 2, the history is read in a
+        background thread instead.
+        """
+    ).tag(config=True)
+
     prompt_includes_vi_mode = Bool(True,
         help="Display the current vi mode (when using vi editing mode)."
     ).tag(config=True)
@@ -276,11 +301,22 @@ def restore_term_title(self):
 
     def init_display_formatter(self):
         super(TerminalInteractiveShell, self).init_display_formatter()
-        # terminal only supports plain text
-        self.display_formatter.active_types = ['text/plain']
+        self._register_display_types()
         # disable `_ipython_display_`
         self.display_formatter.ipython_display_formatter.enabled = False
 
+    @observe('mime_renderers')
+    def _mime_renderers_changed(self, change):
+        if self.display_formatter is not None:
+            self._register_display_types()
+
+    def _register_display_types(self):
+        # terminal only supports plain text, and the types of mime_renderers
+        mime_types = ['text/plain']
+        mime_types.extend(t for t in self.mime_renderers if t != 'text/plain')
+        self.display_formatter.active_types = mime_types
+        self.display_formatter.register_consumer('terminal', mime_types)
+
     def init_prompt_toolkit_cli(self):
         if self.simple_prompt:
             # Fall back to plain non-interactive output for tests.
@@ -298,16 +334,24 @@ def prompt():
         # Set up keyboard shortcuts
         key_bindings = create_ipython_shortcuts(self)
 
-        # Pre-populate history from IPython's history database
-        history = InMemoryHistory()
-        last_cell = u""
-        for __, ___, cell in self.history_manager.get_tail(self.history_load_length,
-                                                        include_latest=True):
-            # Ignore blank lines and consecutive duplicates
-            cell = cell.rstrip()
-            if cell and (cell != last_cell):
-                history.append_string(cell)
-                last_cell = cell
+        hm = self.history_manager
+        lazy_history = None
+        if (self.lazy_history_load and hm.enabled
+                and hm.hist_file != ':memory:'):
+            lazy_history = IPythonPTHistory(hm)
+            # Pages are read as they are needed with prompt_toolkit 3
+            history = lazy_history if PTK3 else ThreadedHistory(lazy_history)
+        else:
+            # Pre-populate history from IPython's history database
+            history = InMemoryHistory()
+            last_cell = u""
+            for __, ___, cell in hm.get_tail(self.history_load_length,
+                                             include_latest=True):
+                # Ignore blank lines and consecutive duplicates
+                cell = cell.rstrip()
+                if cell and (cell != last_cell):
+                    history.append_string(cell)
+                    last_cell = cell
 
         self._style = self._make_style_from_name_or_cls(self.highlighting_style)
         self.style = DynamicStyle(lambda: self._style)
@@ -328,6 +372,9 @@ def prompt():
                             color_depth=self.color_depth,
                             tempfile_suffix=".py",
                             **self._extra_prompt_options())
+        if history is lazy_history:
+            self.pt_app.key_bindings = merge_key_bindings(
+                [key_bindings, lazy_history.attach(self.pt_app)])
 
     def _make_style_from_name_or_cls(self, name_or_cls):
         """
@@ -426,7 +473,7 @@ def get_message():
             get_message = get_message()
 
         options = {
-                'complete_in_thread': False,
+                'complete_in_thread': self.complete_in_thread,
                 'lexer':IPythonPTLexer(),
                 'reserve_space_for_menu':self.space_for_menu,
                 'message': get_message,
@@ -21,6 +21,7 @@
 from IPython.core.completer import IPCompleter
 from IPython.core.crashhandler import CrashHandler
 from IPython.core.formatters import PlainTextFormatter
+from IPython.core.cellstats import CellStatsRecorder
 from IPython.core.history import HistoryManager
 from IPython.core.application import (
     ProfileDir, BaseIPythonApplication, base_flags, base_aliases
@@ -200,6 +201,7 @@ def _classes_default(self):
             self.__class__,      # it will also affect subclasses (e.g. QtConsole)
             TerminalInteractiveShell,
             HistoryManager,
+            CellStatsRecorder,
             ProfileDir,
             PlainTextFormatter,
             IPCompleter,
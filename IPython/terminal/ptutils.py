@@ -13,15 +13,30 @@
 from IPython.core.completer import (
     provisionalcompleter, cursor_to_position,
     _deduplicate_completions)
+from IPython.core.history import _open_archive_db
+from prompt_toolkit.application.current import get_app
 from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.enums import DEFAULT_BUFFER
+from prompt_toolkit.filters import Condition, has_focus
+from prompt_toolkit.history import History
+from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.lexers import Lexer
 from prompt_toolkit.lexers import PygmentsLexer
 from prompt_toolkit.patch_stdout import patch_stdout
 
 import pygments.lexers as pygments_lexers
+import asyncio
+import inspect
+import itertools
 import os
+import sqlite3
 import sys
+import threading
+import time
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import pathname2url
 
 _completion_sentinel = object()
 
@@ -84,12 +99,27 @@ def _adjust_completion_text_based_on_context(text, body, offset):
 
 
 class IPythonPTCompleter(Completer):
-    """Adaptor to provide IPython completions to prompt_toolkit"""
+    """Adaptor to provide IPython completions to prompt_toolkit
+
+    prompt_toolkit may call :meth:`get_completions` from a background thread
+    (see ``TerminalInteractiveShell.complete_in_thread``). In that case the
+    completions of each matcher are produced as soon as it finishes, and a
+    request stops running matchers and producing completions as soon as a newer
+    one starts. The IPCompleter runs one matcher at a time, so a new request
+    waits at most for the matcher running for the previous one.
+
+    The latency of recent requests is kept in :attr:`latencies`, as
+    ``(first, total, count)`` tuples: the time in seconds from the request to
+    its first completion and to its last one, and the number of completions.
+    """
     def __init__(self, ipy_completer=None, shell=None):
         if shell is None and ipy_completer is None:
             raise TypeError("Please pass shell=an InteractiveShell instance.")
         self._ipy_completer = ipy_completer
         self.shell = shell
+        self._requests = itertools.count(1)
+        self._latest_request = 0
+        self.latencies = deque(maxlen=100)
 
     @property
     def ipy_completer(self):
@@ -101,10 +131,17 @@ def ipy_completer(self):
     def get_completions(self, document, complete_event):
         if not document.current_line.strip():
             return
+        # A newer request makes this one stale, even when running in another
+        # thread.
+        request = self._latest_request = next(self._requests)
+        is_stale = lambda: self._latest_request != request
+        started = time.perf_counter()
+        first = None
+        count = 0
+
         # Some bits of our completion system may print stuff (e.g. if a module
         # is imported). This context manager ensures that doesn't interfere with
         # the prompt.
-
         with patch_stdout(), provisionalcompleter():
             body = document.text
             cursor_row = document.cursor_position_row
@@ -112,7 +149,14 @@ def get_completions(self, document, complete_event):
             cursor_position = document.cursor_position
             offset = cursor_to_position(body, cursor_row, cursor_col)
             try:
-                yield from self._get_completions(body, offset, cursor_position, self.ipy_completer)
+                for c in self._get_completions(body, offset, cursor_position,
+                                               self.ipy_completer, is_stale=is_stale):
+                    if first is None:
+                        first = time.perf_counter() - started
+                    count += 1
+                    yield c
+                if not is_stale():
+                    self._record_latency(first, time.perf_counter() - started, count)
             except Exception as e:
                 try:
                     exc_type, exc_value, exc_tb = sys.exc_info()
@@ -120,15 +164,31 @@ def get_completions(self, document, complete_event):
                 except AttributeError:
                     print('Unrecoverable Error in completions')
 
+    def _record_latency(self, first, total, count):
+        self.latencies.append((first, total, count))
+        if self.shell is not None:
+            self.shell.log.debug(
+                "Completion: %d results, first after %.1f ms, all after %.1f ms",
+                count, (first or total) * 1000, total * 1000)
+
     @staticmethod
-    def _get_completions(body, offset, cursor_position, ipyc):
+    def _get_completions(body, offset, cursor_position, ipyc, is_stale=None):
         """
         Private equivalent of get_completions() use only for unit_testing.
+
+        If given, ``is_stale`` is called between matchers and between
+        completions, and no more completions are produced once it returns True.
         """
         debug = getattr(ipyc, 'debug', False)
-        completions = _deduplicate_completions(
-            body, ipyc.completions(body, offset))
+        if is_stale is not None:
+            completions = ipyc.completions(body, offset, is_stale=is_stale)
+            completions = itertools.takewhile(lambda c: not is_stale(), completions)
+        else:
+            completions = ipyc.completions(body, offset)
+        completions = _deduplicate_completions(body, completions)
         for c in completions:
+            if is_stale is not None and is_stale():
+                return
             if not c.text:
                 # Guard against completion machinery giving us an empty string.
                 continue
@@ -161,6 +221,223 @@ def _get_completions(body, offset, cursor_position, ipyc):
             else:
                 yield Completion(adjusted_text, start_position=c.start - offset, display=_elide(display_text,  body[c.start:c.end]), display_meta=c.type)
 
+# prompt_toolkit 3.0.19 made History.load an async generator. Before, it called
+# a callback with each item.
+_ASYNC_HISTORY_LOAD = inspect.isasyncgenfunction(getattr(History, 'load', None))
+
+
+class IPythonPTHistory(History):
+    """prompt_toolkit history backed by IPython's history database.
+
+    Inputs from previous sessions, archived ones included, are read newest
+    first, one page at a time. With prompt_toolkit 3, :meth:`load` reads the
+    first page, and the next ones as :meth:`load_more` asks for them, when
+    the user nears the oldest inputs read (see :meth:`attach`). Pages are read
+    on a separate thread, so the event loop keeps running. New inputs are
+    stored by the HistoryManager, not by this class.
+    """
+    def __init__(self, history_manager, page_size=1000):
+        super().__init__()
+        self.history_manager = history_manager
+        self.page_size = page_size
+        # Only previous sessions: ptk already keeps the current inputs.
+        # (session, line) of the oldest input read, None once all are read
+        self._next_key = (history_manager.session_number, 0)
+        self._last_cell = None
+        self._read_all = False
+        # SQLite connections can only be used by the thread which opened them
+        self._local = threading.local()
+        self._executor = None
+        # Events of the prompt's event loop, created there
+        self._wanted = None
+        self._done = None
+        # With prompt_toolkit < 3.0.19, the callbacks given to load, and the
+        # task reading more inputs for them
+        self._callbacks = []
+        self._reading = None
+
+    def _connection(self, path=None):
+        """Open this thread's read-only connection to the history database,
+        or to the archive shard at path."""
+        connections = self._local.__dict__.setdefault('connections', {})
+        db = connections.get(path)
+        if db is None:
+            if path is None:
+                hm = self.history_manager
+                db = sqlite3.connect('file:%s?mode=ro' % pathname2url(hm.hist_file),
+                                     uri=True, **hm.connection_options)
+            else:
+                db = _open_archive_db(path)
+            connections[path] = db
+        return db
+
+    def _read_page(self):
+        """Read the next page of older inputs, newest first.
+
+        It may run in a separate thread (ptk's ThreadedHistory, or the thread
+        reading pages for :meth:`load`), with connections of its own.
+        """
+        hm = self.history_manager
+        rows = []
+        if hm.enabled and hm.hist_file != ':memory:':
+            try:
+                rows = list(hm._get_tail(
+                    self.page_size, include_latest=True, before=self._next_key,
+                    db=self._connection(), get_archive_db=self._connection))
+            except sqlite3.Error as e:
+                # Not a reason to move the database away, as HistoryManager
+                # does: it still works for the shell.
+                hm.log.warning("Could not read the input history: %s", e)
+        rows.reverse()
+        self._next_key = rows[-1][:2] if len(rows) == self.page_size else None
+        if self._next_key is None:
+            for db in self._local.__dict__.pop('connections', {}).values():
+                db.close()
+        cells = []
+        for __, ___, cell in rows:
+            # Ignore blank lines and consecutive duplicates
+            cell = cell.rstrip()
+            if cell and (cell != self._last_cell):
+                cells.append(cell)
+                self._last_cell = cell
+        return cells
+
+    def _read_page_async(self):
+        """Read the next page on the history thread, letting the event loop
+        run meanwhile."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                1, thread_name_prefix='IPythonPTHistory')
+        return asyncio.get_event_loop().run_in_executor(self._executor,
+                                                        self._read_page)
+
+    def _set_done(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self._done is None:
+            self._done = asyncio.Event()
+        self._done.set()
+
+    def load_history_strings(self):
+        while self._next_key is not None:
+            yield from self._read_page()
+
+    async def _load_async(self):
+        if not self._loaded:
+            self._loaded_strings = await self._read_page_async()
+            self._loaded = True
+        i = 0
+        while True:
+            while i < len(self._loaded_strings):
+                yield self._loaded_strings[i]
+                i += 1
+            if self._next_key is None:
+                break
+            if not self._read_all:
+                if self._wanted is None:
+                    self._wanted = asyncio.Event()
+                await self._wanted.wait()
+                self._wanted.clear()
+            self._loaded_strings.extend(await self._read_page_async())
+        self._set_done()
+
+    def _load_with_callback(self, item_loaded_callback):
+        if not self._loaded:
+            self._loaded_strings = self._read_page()
+            self._loaded = True
+        self._callbacks.append(item_loaded_callback)
+        for item in self._loaded_strings:
+            item_loaded_callback(item)
+        if self._next_key is None:
+            self._set_done()
+
+    load = _load_async if _ASYNC_HISTORY_LOAD else _load_with_callback
+
+    async def _read_for_callbacks(self):
+        """Read the next page, or all of them, for the callbacks given to
+        :meth:`load` (prompt_toolkit < 3.0.19)."""
+        try:
+            while self._next_key is not None:
+                cells = await self._read_page_async()
+                self._loaded_strings.extend(cells)
+                for callback in self._callbacks:
+                    for cell in cells:
+                        callback(cell)
+                if not self._read_all:
+                    break
+        finally:
+            self._reading = None
+        if self._next_key is None:
+            self._set_done()
+
+    def load_more(self, everything=False):
+        """Have :meth:`load` read the next page of older inputs, or all of
+        them."""
+        self._read_all = self._read_all or everything
+        if self._wanted is not None:
+            self._wanted.set()
+        elif (self._callbacks and self._reading is None
+                and self._next_key is not None):
+            self._reading = asyncio.ensure_future(self._read_for_callbacks())
+
+    async def wait_loaded(self):
+        """Wait until :meth:`load` has returned all the inputs."""
+        if self._done is None:
+            self._done = asyncio.Event()
+        await self._done.wait()
+
+    def attach(self, session, page_ahead=100):
+        """Read older inputs as the user of a PromptSession reaches them.
+
+        The next page is read when the input shown is one of the page_ahead
+        oldest ones read. Searches need all the inputs: they are read when
+        Ctrl-R is used, or when the up arrow searches by prefix (with
+        ``enable_history_search``).
+
+        Returns key bindings, to be given to the session.
+        """
+        def on_text_changed(buffer):
+            if buffer.working_index < page_ahead:
+                self.load_more()
+
+        session.default_buffer.on_text_changed += on_text_changed
+        session.search_buffer.on_text_changed += (
+            lambda buffer: self.load_more(everything=True))
+
+        @Condition
+        def searching_unread():
+            buffer = get_app().current_buffer
+            if (self._next_key is None or buffer.complete_state
+                    or buffer.document.cursor_position_row > 0
+                    or not buffer.enable_history_search()):
+                return False
+            prefix = buffer.history_search_text
+            if prefix is None:
+                prefix = buffer.document.text_before_cursor
+            return bool(prefix)
+
+        kb = KeyBindings()
+
+        @kb.add('up', filter=has_focus(DEFAULT_BUFFER) & searching_unread)
+        @kb.add('c-p', filter=has_focus(DEFAULT_BUFFER) & searching_unread)
+        def _(event):
+            self.load_more(everything=True)
+            # Not an async handler, which older prompt_toolkits don't await
+            asyncio.ensure_future(search_when_loaded(event))
+
+        async def search_when_loaded(event):
+            try:
+                await asyncio.wait_for(self.wait_loaded(), 1)
+            except asyncio.TimeoutError:
+                pass
+            event.current_buffer.auto_up(count=event.arg)
+
+        return kb
+
+    def store_string(self, string):
+        pass
+
+
 class IPythonPTLexer(Lexer):
     """
     Wrapper around PythonLexer and BashLexer.
@@ -166,6 +166,33 @@ def _ipython_display_(self):
         self.assertEqual(data, {'text/plain': repr(obj)})
         assert captured.stdout == ''
 
+    def test_mime_renderers_consumed(self):
+        ip = get_ipython()
+        formatter = ip.display_formatter
+        consumers = formatter.consumers.copy()
+        rendered = []
+        try:
+            ip.mime_renderers = {'text/html': lambda data, md: rendered.append(data)}
+            self.assertEqual(formatter.active_types, ['text/plain', 'text/html'])
+            self.assertEqual(formatter.consumers['terminal'],
+                             {'text/plain', 'text/html'})
+
+            class Test(object):
+                def _repr_html_(self):
+                    return '<html>'
+
+                def _repr_latex_(self):
+                    raise AssertionError('LaTeX should not be computed')
+
+            data, _ = formatter.format(Test())
+            self.assertEqual(sorted(data), ['text/html', 'text/plain'])
+            ip.displayhook.write_format_data(data)
+            self.assertEqual(rendered, ['<html>'])
+        finally:
+            ip.mime_renderers = {}
+            formatter.consumers = consumers
+        self.assertEqual(formatter.active_types, ['text/plain'])
+
 def syntax_error_transformer(lines):
     """Transformer that throws SyntaxError if 'syntaxerror' is in the code."""
     for line in lines:
@@ -191,3 +218,180 @@ def test_paste_magics_blankline(self):
         tm.store_or_execute(s, name=None)
         
         self.assertEqual(ip.user_ns['pasted_func'](54), 55)
+
+
+class TestPTHistory(unittest.TestCase):
+
+    def test_load_history_strings(self):
+        from IPython.core.history import HistoryManager
+        from IPython.terminal.ptutils import IPythonPTHistory
+        from IPython.utils.tempdir import TemporaryDirectory
+
+        ip = get_ipython()
+        with TemporaryDirectory() as tmpdir:
+            hist_file = os.path.join(tmpdir, 'history.sqlite')
+            hm = HistoryManager(shell=ip, hist_file=hist_file)
+            try:
+                for i, cell in enumerate(['a = 1', 'b = 2', '', 'b = 2', 'c = 3  '], 1):
+                    hm.store_inputs(i, cell)
+                hm.reset()
+                hm.store_inputs(1, 'd = 4')
+                hm.store_inputs(2, 'e = 5')
+                hm.writeout_cache()
+
+                history = IPythonPTHistory(hm, page_size=2)
+                # newest first, current session excluded, duplicates dropped
+                nt.assert_equal(list(history.load_history_strings()),
+                                ['c = 3', 'b = 2', 'a = 1'])
+            finally:
+                hm.save_thread.stop()
+                hm.db.close()
+
+    def test_load_pages(self):
+        import asyncio
+        from IPython.core.history import HistoryManager
+        from IPython.terminal.ptutils import IPythonPTHistory
+        from IPython.utils.tempdir import TemporaryDirectory
+
+        ip = get_ipython()
+        with TemporaryDirectory() as tmpdir:
+            hist_file = os.path.join(tmpdir, 'history.sqlite')
+            hm = HistoryManager(shell=ip, hist_file=hist_file)
+            try:
+                for session in range(1, 5):
+                    hm.store_inputs(1, 'a = %d' % session)
+                    hm.store_inputs(2, 'b = %d' % session)
+                    hm.reset()
+                hm.writeout_cache()
+                hm.compact(keep_sessions=1)
+                history = IPythonPTHistory(hm, page_size=3)
+
+                async def load():
+                    strings = history.load()
+                    loaded = [await strings.__anext__() for _ in range(3)]
+                    # The next page is only read when asked for
+                    next_string = asyncio.ensure_future(strings.__anext__())
+                    await asyncio.sleep(0.01)
+                    nt.assert_false(next_string.done())
+                    history.load_more()
+                    loaded.append(await next_string)
+                    history.load_more(everything=True)
+                    loaded.extend([s async for s in strings])
+                    await asyncio.wait_for(history.wait_loaded(), 1)
+                    return loaded
+
+                loop = asyncio.new_event_loop()
+                try:
+                    loaded = loop.run_until_complete(load())
+                finally:
+                    loop.close()
+                # Archived sessions are included
+                nt.assert_equal(loaded, ['b = %d' % (i // 2) if i % 2 else
+                                         'a = %d' % (i // 2)
+                                         for i in range(9, 1, -1)])
+            finally:
+                hm.save_thread.stop()
+                hm.db.close()
+                for db in hm._archive_dbs.values():
+                    db.close()
+
+    def test_load_in_thread(self):
+        """ThreadedHistory loads it in another thread, without harming the
+        database (e.g. taking it for corrupt)"""
+        import threading
+        from IPython.core.history import HistoryManager
+        from IPython.terminal.ptutils import IPythonPTHistory
+        from IPython.utils.tempdir import TemporaryDirectory
+
+        ip = get_ipython()
+        with TemporaryDirectory() as tmpdir:
+            hist_file = os.path.join(tmpdir, 'history.sqlite')
+            hm = HistoryManager(shell=ip, hist_file=hist_file)
+            try:
+                for i in range(1, 6):
+                    hm.store_inputs(i, 'a = %d' % i)
+                hm.reset()
+                hm.writeout_cache()
+
+                history = IPythonPTHistory(hm, page_size=2)
+                loaded = []
+                thread = threading.Thread(target=lambda: loaded.extend(
+                    history.load_history_strings()))
+                thread.start()
+                thread.join(10)
+                nt.assert_equal(loaded, ['a = %d' % i for i in range(5, 0, -1)])
+                nt.assert_equal(os.listdir(tmpdir), ['history.sqlite'])
+                nt.assert_equal(len(list(hm.get_tail(10, include_latest=True))), 5)
+            finally:
+                hm.save_thread.stop()
+                hm.db.close()
+
+    def test_load_with_callback(self):
+        """The loading API of prompt_toolkit < 3.0.19"""
+        import asyncio
+        from IPython.core.history import HistoryManager
+        from IPython.terminal.ptutils import IPythonPTHistory
+        from IPython.utils.tempdir import TemporaryDirectory
+
+        ip = get_ipython()
+        with TemporaryDirectory() as tmpdir:
+            hist_file = os.path.join(tmpdir, 'history.sqlite')
+            hm = HistoryManager(shell=ip, hist_file=hist_file)
+            try:
+                for i in range(1, 8):
+                    hm.store_inputs(i, 'a = %d' % i)
+                hm.reset()
+                hm.writeout_cache()
+                history = IPythonPTHistory(hm, page_size=3)
+
+                async def load():
+                    loaded = []
+                    history._load_with_callback(loaded.append)
+                    nt.assert_equal(len(loaded), 3)
+                    history.load_more()
+                    await asyncio.sleep(0.1)
+                    nt.assert_equal(len(loaded), 6)
+                    history.load_more(everything=True)
+                    await asyncio.wait_for(history.wait_loaded(), 1)
+                    return loaded
+
+                loop = asyncio.new_event_loop()
+                try:
+                    loaded = loop.run_until_complete(load())
+                finally:
+                    loop.close()
+                nt.assert_equal(loaded, ['a = %d' % i for i in range(7, 0, -1)])
+            finally:
+                hm.save_thread.stop()
+                hm.db.close()
+
+
+class TestPTCompleter(unittest.TestCase):
+
+    def test_stale_request_stops(self):
+        from IPython.core.completer import Completion
+        from IPython.terminal.ptutils import IPythonPTCompleter
+        from prompt_toolkit.document import Document
+
+        class SlowCompleter:
+            def completions(self, text, offset, is_stale=None):
+                # Stale requests also stop running matchers
+                nt.assert_false(is_stale())
+                for name in ['aa', 'ab', 'ac']:
+                    yield Completion(start=0, end=offset, text=name)
+
+        ptc = IPythonPTCompleter(ipy_completer=SlowCompleter())
+        doc = Document('a')
+        nt.assert_equal([c.text for c in ptc.get_completions(doc, None)],
+                        ['aa', 'ab', 'ac'])
+        nt.assert_equal(len(ptc.latencies), 1)
+        nt.assert_equal(ptc.latencies[0][2], 3)
+
+        # A new request makes the first one stop, without recording latency
+        first = ptc.get_completions(doc, None)
+        nt.assert_equal(next(first).text, 'aa')
+        second = ptc.get_completions(doc, None)
+        nt.assert_equal(next(second).text, 'aa')
+        nt.assert_equal(list(first), [])
+        nt.assert_equal([c.text for c in second], ['ab', 'ac'])
+        nt.assert_equal(len(ptc.latencies), 2)
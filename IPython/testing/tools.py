@@ -428,6 +428,21 @@ def make_tempfile(name):
     finally:
         os.unlink(name)
 
+@contextmanager
+def kernel_display_formatter(shell):
+    """Format outputs as in a kernel for the duration of the context.
+
+    Kernels register no display consumer, so the test shell's formatter
+    computes every representation, not only those the terminal shows.
+    """
+    formatter = shell.display_formatter
+    consumers = formatter.consumers.copy()
+    formatter.consumers.clear()
+    try:
+        yield formatter
+    finally:
+        formatter.consumers = consumers
+
 def fake_input(inputs):
     """Temporarily replace the input() function to return the given values
 
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""Measure checking whether a long cell is complete after each new line.
+
+This is what the terminal does on each Enter while a function or class is
+typed or pasted. One TransformerManager reuses the tokens of the lines seen
+in the previous check; a new one for each check tokenizes everything::
+
+    python tools/benchmarks/check_complete.py [--methods 100]
+"""
+
+import argparse
+import time
+
+from IPython.core.inputtransformer2 import TransformerManager
+
+
+def make_lines(methods):
+    lines = ["class C:"]
+    for i in range(methods):
+        lines += ["    def f%d(self, x):" % i,
+                  "        if x %% %d:" % (i + 2),
+                  "            y = [x, %d]" % i,
+                  "        return x"]
+    return lines
+
+
+def type_lines(lines, get_manager):
+    times = []
+    for n in range(1, len(lines) + 1):
+        cell = "\n".join(lines[:n]) + "\n"
+        t0 = time.perf_counter()
+        get_manager().check_complete(cell)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--methods", type=int, default=100)
+    args = parser.parse_args()
+
+    lines = make_lines(args.methods)
+    manager = TransformerManager()
+    print("%d lines" % len(lines))
+    for label, get_manager in (("incremental", lambda: manager),
+                               ("from scratch", TransformerManager)):
+        times = type_lines(lines, get_manager)
+        print("%-14s total %8.1f ms   last line %6.2f ms" % (
+            label, sum(times) * 1000, times[-1] * 1000))
+
+
+if __name__ == "__main__":
+    main()
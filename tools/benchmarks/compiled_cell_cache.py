@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Measure running the same large cell again with and without the code cache.
+
+The cell has 5000 lines of simple statements, like generated code or a long
+notebook cell::
+
+    python tools/benchmarks/compiled_cell_cache.py [--lines 5000] [--repeat 20]
+"""
+
+import argparse
+import statistics
+import time
+
+from IPython.testing.globalipapp import start_ipython
+
+
+def make_cell(lines):
+    body = []
+    for i in range(lines // 5):
+        body.append("x%d = %d" % (i, i))
+        body.append("if x%d %% 3:" % i)
+        body.append("    y = [x%d * k for k in range(3)]" % i)
+        body.append("else:")
+        body.append("    y = {'k': x%d}" % i)
+    return "\n".join(body)
+
+
+def run(ip, cell, repeat, cache_size, label):
+    ip.code_cache_size = cache_size
+    ip.compile._code_cache.clear()
+    ip.run_cell(cell, silent=True)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ip.run_cell(cell, silent=True)
+        times.append(time.perf_counter() - t0)
+    print("%-12s median %7.1f ms   min %7.1f ms   %s" % (
+        label, statistics.median(times) * 1000, min(times) * 1000,
+        ip.compile.code_cache_info()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ip = start_ipython()
+    cell = make_cell(args.lines)
+    run(ip, cell, args.repeat, 0, "no cache")
+    run(ip, cell, args.repeat, 128, "code cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""Measure the time spent formatting outputs nobody displays.
+
+This times ``DisplayFormatter.format`` on objects with costly rich
+representations, when all the representations are computed, when only the
+formatters for text/plain are active (as the terminal used to do), and when the
+frontend registered that it only consumes text/plain::
+
+    python tools/benchmarks/display_negotiation.py [--objects 200] [--rows 200]
+"""
+
+import argparse
+import base64
+import time
+
+from IPython.core.formatters import DisplayFormatter
+
+
+class Table(object):
+    """Rich representations built with _repr_*_ methods."""
+
+    def __init__(self, rows):
+        self.rows = [(i, i * i, 'row %d' % i) for i in range(rows)]
+
+    def __repr__(self):
+        return '<Table with %d rows>' % len(self.rows)
+
+    def _repr_html_(self):
+        cells = ''.join('<tr>%s</tr>' % ''.join('<td>%s</td>' % v for v in row)
+                        for row in self.rows)
+        return '<table>%s</table>' % cells
+
+    def _repr_latex_(self):
+        lines = ' \\\\\n'.join(' & '.join(str(v) for v in row)
+                               for row in self.rows)
+        return '\\begin{tabular}{lll}\n%s\n\\end{tabular}' % lines
+
+    def _repr_png_(self):
+        return bytes(range(256)) * len(self.rows)
+
+
+class Chart(Table):
+    """Rich representations built with _repr_mimebundle_."""
+
+    def _repr_mimebundle_(self, include=None, exclude=None):
+        bundle = {}
+        if include is None or 'text/html' in include:
+            bundle['text/html'] = self._repr_html_()
+        if include is None or 'image/png' in include:
+            bundle['image/png'] = base64.b64encode(self._repr_png_()).decode()
+        return bundle
+
+
+def per_object(formatter, objects):
+    t0 = time.perf_counter()
+    for obj in objects:
+        formatter.format(obj)
+    return (time.perf_counter() - t0) / len(objects) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+
+    everything = DisplayFormatter()
+    plain_active = DisplayFormatter(active_types=['text/plain'])
+    negotiated = DisplayFormatter()
+    negotiated.register_consumer('terminal', ['text/plain'])
+
+    print("%-8s %16s %16s %16s" % ("object", "all types", "active_types",
+                                   "consumer"))
+    for cls in (Table, Chart):
+        objects = [cls(args.rows) for _ in range(args.objects)]
+        times = [per_object(f, objects)
+                 for f in (everything, plain_active, negotiated)]
+        print("%-8s %13.1f us %13.1f us %13.1f us" % ((cls.__name__,) + tuple(times)))
+
+
+if __name__ == "__main__":
+    main()
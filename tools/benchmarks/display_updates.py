@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Measure the cost of updating a display in a tight loop.
+
+This times ``update_display`` on an object with an HTML representation, with
+each update published, and with the updates coalesced by the display
+publisher at a few rates, and counts the updates published::
+
+    python tools/benchmarks/display_updates.py [--updates 20000]
+
+Updates are formatted when they are made, so the time per update mostly
+measures formatting here, where publishing is a print. In a kernel, each
+update published is also a message to send and render in the frontend.
+"""
+
+import argparse
+import io
+import time
+from contextlib import redirect_stdout
+
+from IPython.core.interactiveshell import InteractiveShell
+from IPython.display import display, update_display
+
+
+class Progress(object):
+
+    def __init__(self, done, total):
+        self.done = done
+        self.total = total
+
+    def __repr__(self):
+        return '%d/%d' % (self.done, self.total)
+
+    def _repr_html_(self):
+        return '<progress value="%d" max="%d"></progress>' % (self.done,
+                                                               self.total)
+
+
+def run(shell, updates):
+    pub = shell.display_pub
+    pub.updates_dropped = pub.updates_sent = 0
+    with redirect_stdout(io.StringIO()):
+        display(Progress(0, updates), display_id='progress')
+        t0 = time.perf_counter()
+        for i in range(updates):
+            update_display(Progress(i + 1, updates), display_id='progress')
+        pub.flush_updates()
+        elapsed = time.perf_counter() - t0
+    return elapsed / updates * 1e6, pub.updates_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=20000)
+    args = parser.parse_args()
+
+    shell = InteractiveShell.instance()
+    pub = shell.display_pub
+    print("%-20s %14s %10s" % ("mode", "per update", "published"))
+    per_update, sent = run(shell, args.updates)
+    print("%-20s %11.2f us %10d" % ("every update", per_update, sent))
+    pub.coalesce_updates = True
+    for rate in (100.0, 10.0, 0.0):
+        pub.max_update_rate = rate
+        per_update, sent = run(shell, args.updates)
+        print("%-20s %11.2f us %10d" % ("coalesced, %g/s" % rate,
+                                        per_update, sent))
+
+
+if __name__ == "__main__":
+    main()
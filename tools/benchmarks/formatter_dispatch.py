@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Measure the time formatters take to find the printer for an object.
+
+Formatters cache the printer they find for each type. This times
+``BaseFormatter.lookup`` and ``DisplayFormatter.format`` with the cache, and
+with it cleared before every call::
+
+    python tools/benchmarks/formatter_dispatch.py [--calls 20000]
+"""
+
+import argparse
+import collections
+import time
+
+from IPython.core.formatters import DisplayFormatter
+
+
+class Plain(object):
+    pass
+
+
+class Deep(collections.OrderedDict):
+    pass
+
+
+for _ in range(10):
+    Deep = type('Deep', (Deep,), {})
+
+
+OBJECTS = [
+    ("int", 1),
+    ("list", [1, 2]),
+    ("plain object", Plain()),
+    ("deep subclass", Deep()),
+]
+
+
+def per_call(func, obj, calls, clear):
+    if clear:
+        def call(obj):
+            clear()
+            func(obj)
+    else:
+        call = func
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        call(obj)
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    display = DisplayFormatter()
+    formatters = list(display.formatters.values())
+    plain = display.formatters['text/plain']
+
+    def lookup(obj):
+        try:
+            plain.lookup(obj)
+        except KeyError:
+            pass
+
+    def clear_all():
+        for f in formatters:
+            f._clear_type_cache()
+
+    print("%-14s %-10s %14s %14s" % ("object", "", "lookup", "format"))
+    for name, obj in OBJECTS:
+        for label, clear in (("cached", None), ("uncached", clear_all)):
+            t_lookup = per_call(lookup, obj, args.calls, clear)
+            t_format = per_call(display.format, obj, args.calls // 10, clear)
+            print("%-14s %-10s %11.2f us %11.2f us" % (name, label, t_lookup,
+                                                       t_format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Measure ``HistoryManager.store_inputs`` latency under write contention.
+
+A second process keeps writing to the same history file while the main thread
+stores inputs, as happens when several IPython sessions share a profile.
+Compares the default rollback-journal writer with the batched WAL writer::
+
+    python tools/benchmarks/history_writer.py [--n 2000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from traitlets.config import Config
+
+from IPython.core.history import HistoryManager
+
+
+def contend(hist_file, wal, stop):
+    """Hold frequent write transactions on the history file."""
+    db = sqlite3.connect(hist_file, timeout=30)
+    if wal:
+        db.execute("PRAGMA journal_mode=WAL")
+    line = 1
+    while not stop.is_set():
+        with db:
+            db.execute("INSERT INTO history VALUES (?, ?, ?, ?)",
+                       (-1, line, "x = 1", "x = 1"))
+        line += 1
+    db.close()
+
+
+def run(n, config, label):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        hist_file = os.path.join(tmpdir, "history.sqlite")
+        hm = HistoryManager(shell=None, hist_file=hist_file, config=config)
+        stop = multiprocessing.Event()
+        proc = multiprocessing.Process(
+            target=contend, args=(hist_file, config.HistoryManager.db_wal_mode, stop))
+        proc.start()
+        time.sleep(0.2)
+        latencies = []
+        try:
+            for i in range(1, n + 1):
+                t0 = time.perf_counter()
+                hm.store_inputs(i, "a = %d" % i)
+                latencies.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            hm.writeout_cache()
+            final = time.perf_counter() - t0
+        finally:
+            stop.set()
+            proc.join()
+            hm.save_thread.stop()
+            hm.db.close()
+    latencies.sort()
+    print("%-24s median %8.1f us  p99 %8.1f us  max %8.1f ms  final flush %6.1f ms" % (
+        label,
+        statistics.median(latencies) * 1e6,
+        latencies[int(len(latencies) * 0.99)] * 1e6,
+        latencies[-1] * 1e3,
+        final * 1e3,
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=2000, help="inputs to store")
+    args = parser.parse_args()
+
+    default = Config()
+    default.HistoryManager.db_wal_mode = False
+    run(args.n, default, "rollback journal")
+
+    batched = Config()
+    batched.HistoryManager.db_wal_mode = True
+    batched.HistoryManager.db_synchronous = "NORMAL"
+    batched.HistoryManager.db_cache_size = 100
+    batched.HistoryManager.db_cache_timeout = 500
+    run(args.n, batched, "WAL, batched")
+
+
+if __name__ == "__main__":
+    main()
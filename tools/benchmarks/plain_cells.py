@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Measure the overhead of transforming cells of plain Python code.
+
+Cells without IPython syntax skip the input transformations. This times
+``InteractiveShell.transform_cell`` and ``run_cell`` on distinct cells, with
+this fast path and with the full transformations::
+
+    python tools/benchmarks/plain_cells.py [--cells 2000] [--lines 1 10 100]
+"""
+
+import argparse
+import statistics
+import time
+
+from IPython.testing.globalipapp import start_ipython
+
+
+def make_cells(count, lines):
+    cells = []
+    for c in range(count):
+        body = ["x%d = %d" % (c, c)]
+        for i in range(1, lines):
+            if i % 4 == 1:
+                body.append("if x%d %% %d != 0:" % (c, i + 1))
+            else:
+                body.append("    y = {'k': [x%d, %d]}" % (c, i))
+        if body[-1].startswith("if"):
+            body.append("    pass")
+        cells.append("\n".join(body))
+    return cells
+
+
+def per_cell(func, cells):
+    times = []
+    for cell in cells:
+        t0 = time.perf_counter()
+        func(cell)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, default=2000)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    ip = start_ipython()
+    # Distinct cells would miss the cache anyway
+    ip.code_cache_size = 0
+    line_transforms = ip.input_transformer_manager.line_transforms
+    print("%6s %-16s %16s %16s" % ("lines", "", "transform_cell", "run_cell"))
+    for lines in args.lines:
+        for label, full in (("fast path", False), ("full transforms", True)):
+            if full:
+                # Any transformation IPython doesn't know disables the fast path
+                line_transforms.append(lambda lines: lines)
+            cells = make_cells(args.cells, lines)
+            transform = per_cell(ip.transform_cell, cells)
+            run = per_cell(lambda c: ip.run_cell(c, silent=True), cells)
+            if full:
+                line_transforms.pop()
+            print("%6d %-16s %13.1f us %13.1f us" % (lines, label, transform, run))
+
+
+if __name__ == "__main__":
+    main()
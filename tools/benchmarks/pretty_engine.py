@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Compare the throughput of the recursive and iterative pretty printers.
+
+This times ``RepresentationPrinter`` and ``IterativeRepresentationPrinter``
+on large nested lists and dicts, and checks that their outputs match::
+
+    python tools/benchmarks/pretty_engine.py [--size 20000] [--repeat 3]
+"""
+
+import argparse
+import time
+from io import StringIO
+
+from IPython.lib.pretty import (RepresentationPrinter,
+                                IterativeRepresentationPrinter)
+
+
+def make_payloads(size):
+    records = [{'id': i, 'name': 'item %d' % i, 'tags': ['a', 'b', 'c'],
+                'pos': (i, -i), 'meta': {'ok': i % 2 == 0, 'score': i / 3}}
+               for i in range(size // 10)]
+    matrix = [list(range(j, j + 10)) for j in range(size // 10)]
+    deep = []
+    node = deep
+    for _ in range(200):
+        child = [1, 2]
+        node.append(child)
+        node = child
+    return [
+        ("list of records", records),
+        ("list of lists", matrix),
+        ("dict of lists", {'row%d' % j: row for j, row in enumerate(matrix)}),
+        ("200 levels deep", [deep] * (size // 500)),
+    ]
+
+
+def render(cls, obj):
+    stream = StringIO()
+    printer = cls(stream, max_seq_length=0)
+    printer.pretty(obj)
+    printer.flush()
+    return stream.getvalue()
+
+
+def best_time(cls, obj, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        render(cls, obj)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("%-16s %10s %16s %16s" % ("payload", "output", "recursive",
+                                    "iterative"))
+    for name, obj in make_payloads(args.size):
+        output = render(RepresentationPrinter, obj)
+        assert render(IterativeRepresentationPrinter, obj) == output, name
+        mb = len(output) / 1e6
+        rates = [mb / best_time(cls, obj, args.repeat)
+                 for cls in (RepresentationPrinter,
+                             IterativeRepresentationPrinter)]
+        print("%-16s %7.2f MB %11.2f MB/s %11.2f MB/s" % ((name, mb) + tuple(rates)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Measure transforming large cells dense with IPython syntax.
+
+Compares ``TransformerManager.do_token_transforms``, which tokenizes the cell
+once, with calling ``do_one_token_transform`` until nothing changes, which
+tokenizes the whole cell again after each transformation::
+
+    python tools/benchmarks/token_transforms.py [--lines 10000] [--compare]
+"""
+
+import argparse
+import statistics
+import time
+
+from IPython.core.inputtransformer2 import TransformerManager
+
+
+def make_cell(lines, density):
+    """A cell where one line in *density* uses IPython syntax."""
+    special = [
+        "files = !ls -l {i}",
+        "%time f({i})",
+        "!echo {i}",
+        "here = %pwd",
+        "obj{i}?",
+        "    %timeit g({i})",
+    ]
+    body = []
+    for i in range(lines):
+        if i % density == 0:
+            line = special[(i // density) % len(special)]
+        else:
+            line = "    x{i} = [{i}, ({i} + 1)]" if i % 2 else "x{i} = {i}"
+        if line.startswith("    "):
+            body.append("if x:")
+        body.append(line.format(i=i))
+    return [l + "\n" for l in body[:lines]]
+
+
+def one_at_a_time(manager, lines):
+    while True:
+        changed, lines = manager.do_one_token_transform(lines)
+        if not changed:
+            return lines
+
+
+def run(label, func, lines, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(list(lines))
+        times.append(time.perf_counter() - t0)
+    print("%-24s median %9.1f ms   min %9.1f ms" % (
+        label, statistics.median(times) * 1000, min(times) * 1000))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compare", action="store_true",
+                        help="Also time do_one_token_transform, which takes "
+                             "minutes on 10000 lines.")
+    args = parser.parse_args()
+
+    manager = TransformerManager()
+    for density in (100, 10, 2):
+        lines = make_cell(args.lines, density)
+        print("%d lines, IPython syntax on 1 line in %d:" % (len(lines), density))
+        new = run("do_token_transforms", manager.do_token_transforms,
+                  lines, args.repeat)
+        if args.compare:
+            old = run("do_one_token_transform",
+                      lambda l: one_at_a_time(manager, l), lines, 1)
+            assert old == new, "results differ"
+
+
+if __name__ == "__main__":
+    main()